@@ -1,15 +1,20 @@
 import threading
+import time
 import uuid
+from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
 
-from sqlalchemy import insert, select, update
+from sqlalchemy import func, insert, select, update
 from sqlalchemy.engine import Connection
 from sqlalchemy.exc import IntegrityError
 
+from inbox_wait import WAIT_MAX_SECONDS, WAITERS, announce, poll_interval
 from storage_db import (
     a2a_agents,
     a2a_messages,
+    after_commit,
     get_engine,
+    next_sequence,
     row_to_dict,
     serialize_record,
     utc_now,
@@ -172,15 +177,70 @@ def register_agent(payload: Dict[str, Any]) -> Dict[str, Any]:
         return _serialize_agent(created)
 
 
-def list_messages(agent_id: str) -> List[Dict[str, Any]]:
-    query = (
-        select(a2a_messages)
-        .where(a2a_messages.c.to_agent == agent_id)
-        .order_by(a2a_messages.c.created_at.desc())
+class CursorError(ValueError):
+    """An inbox cursor that `list_messages` did not hand out."""
+
+
+def _parse_cursor(agent_id: str, cursor: str) -> int:
+    """The `seq` a cursor stands for. Cursors are the `seq` of the last
+    message read. One saved before messages were numbered -- "<created_at>|
+    <ids>" -- resumes just before that created_at, so the messages stamped
+    with it are read once more rather than possibly skipped."""
+    if cursor.isdigit():
+        return int(cursor)
+    created_at, separator, _ids = cursor.partition("|")
+    try:
+        if not separator:
+            raise ValueError("not a cursor")
+        timestamp = datetime.fromisoformat(created_at)
+    except ValueError as exc:
+        raise CursorError(f"Invalid cursor {cursor!r}") from exc
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    query = select(func.max(a2a_messages.c.seq)).where(
+        a2a_messages.c.to_agent == agent_id, a2a_messages.c.created_at < timestamp
     )
+    with read_connection() as conn:
+        return conn.execute(query).scalar() or 0
+
+
+def list_messages(
+    agent_id: str, after: Optional[str] = None, limit: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """An agent's inbox.
+
+    Without `after`, every message, newest first. With `after` -- "" for the
+    beginning, else a message's "cursor" -- only the messages past the
+    cursor, oldest first: a keyset read on `seq`, so a reader that keeps its
+    cursor costs the same however long the inbox's history grows. Each
+    message of such a read carries "cursor", the cursor just past it, so a
+    reader can record its progress message by message without knowing the
+    format. `limit` caps either read.
+
+    `seq` rather than created_at, because created_at is stamped before the
+    write and rows do not commit in its order: a message could become
+    visible behind a cursor already handed out, and never be read. `seq`
+    values become visible in order (storage_db.next_sequence).
+    """
+    query = select(a2a_messages).where(a2a_messages.c.to_agent == agent_id)
+    if after is None:
+        query = query.order_by(a2a_messages.c.created_at.desc())
+    else:
+        if after:
+            query = query.where(a2a_messages.c.seq > _parse_cursor(agent_id, after))
+        query = query.where(a2a_messages.c.seq.is_not(None)).order_by(a2a_messages.c.seq.asc())
+    if limit is not None:
+        query = query.limit(limit)
     with read_connection() as conn:
         rows = conn.execute(query).fetchall()
-    return [_serialize_message(row_to_dict(row)) for row in rows]
+    messages = []
+    for row in rows:
+        message = _serialize_message(row_to_dict(row))
+        seq = message.pop("seq", None)
+        if after is not None:
+            message["cursor"] = str(seq)
+        messages.append(message)
+    return messages
 
 
 def add_message(payload: Dict[str, Any], *, conn: Optional[Connection] = None) -> Dict[str, Any]:
@@ -198,10 +258,36 @@ def add_message(payload: Dict[str, Any], *, conn: Optional[Connection] = None) -
         "metadata": payload.get("metadata", {}),
         "created_at": utc_now(),
     }
-    statement = insert(a2a_messages).values(**message)
     if conn is not None:
-        conn.execute(statement)
+        _insert_message(conn, message)
     else:
         with write_connection() as own_conn:
-            own_conn.execute(statement)
+            _insert_message(own_conn, message)
     return _serialize_message(message)
+
+
+def _insert_message(conn: Connection, message: Dict[str, Any]) -> None:
+    # The sequence lock taken here is held until the caller's transaction
+    # ends; that is what keeps numbers in commit order.
+    seq = next_sequence(conn, a2a_messages.name)
+    conn.execute(insert(a2a_messages).values(**message, seq=seq))
+    to_agent = message["to_agent"]
+    # Wake the recipient's long-pollers only once the row is visible to them.
+    announce(conn, to_agent)
+    after_commit(conn, lambda: WAITERS.notify(to_agent))
+
+
+def wait_for_messages(
+    agent_id: str, after: str, limit: Optional[int] = None, timeout: float = 0.0
+) -> List[Dict[str, Any]]:
+    """`list_messages(agent_id, after=after)`, except that when nothing is
+    past the cursor it waits up to `timeout` seconds for a message to arrive
+    and returns it as soon as it does. An empty list means none came."""
+    deadline = time.monotonic() + min(timeout, WAIT_MAX_SECONDS)
+    while True:
+        seen = WAITERS.version(agent_id)
+        messages = list_messages(agent_id, after=after, limit=limit)
+        remaining = deadline - time.monotonic()
+        if messages or remaining <= 0:
+            return messages
+        WAITERS.wait(agent_id, seen, min(remaining, poll_interval()))
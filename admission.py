@@ -0,0 +1,115 @@
+"""Per-author admission control for the listener.
+
+One author tagging @Research fifty times a minute would otherwise take
+fifty Grok calls' worth of worker time from everyone else. Each author gets
+a token bucket per member kind -- agents (Grok-backed) are expensive and
+get a small budget, bots (deterministic) are cheap and get a large one. A
+mention that finds its bucket empty is not handed to the member: the
+listener answers the first one of a run with a short canned reply and
+drops the rest, or, on the SQL work queue, defers it until a token is due.
+
+Buckets live in an LRU map bounded by ADMISSION_MAX_AUTHORS. An author
+evicted for being idle comes back with a full bucket, which is what they
+would have refilled to anyway.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from agents.base import KIND_AGENT, KIND_BOT
+from reply_queue import TokenBucket
+
+
+def _limit(kind: str, burst: str, per_minute: str) -> Tuple[float, float]:
+    """(burst, tokens per second) for a member kind, from the environment."""
+    prefix = f"ADMISSION_{kind.upper()}"
+    return (
+        float(os.getenv(f"{prefix}_BURST", burst)),
+        # A bucket that never refills would divide by zero computing waits.
+        max(float(os.getenv(f"{prefix}_PER_MINUTE", per_minute)), 1e-6) / 60,
+    )
+
+
+ADMISSION_LIMITS: Dict[str, Tuple[float, float]] = {
+    KIND_AGENT: _limit(KIND_AGENT, "5", "2"),
+    KIND_BOT: _limit(KIND_BOT, "20", "30"),
+}
+ADMISSION_MAX_AUTHORS = max(1, int(os.getenv("ADMISSION_MAX_AUTHORS", "10000")))
+# "0" admits everything.
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1").strip() != "0"
+
+THROTTLED_REPLY = "You're sending requests faster than I can answer them. Try again in a few minutes."
+
+
+class Admission(NamedTuple):
+    # Seconds until this author's next token; 0 when admitted.
+    wait: float
+    # The first refusal since the author was last admitted -- the one worth
+    # telling them about.
+    notify: bool = False
+
+    @property
+    def admitted(self) -> bool:
+        return self.wait == 0
+
+
+class _Author:
+    def __init__(self) -> None:
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.refused: Dict[str, bool] = {}
+
+
+class AuthorAdmission:
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        max_authors: int = ADMISSION_MAX_AUTHORS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.limits = dict(ADMISSION_LIMITS if limits is None else limits)
+        self.max_authors = max(1, max_authors)
+        self._clock = clock
+        self._authors: "OrderedDict[Any, _Author]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def admit(self, author_id: Any, kind: str) -> Admission:
+        """Take a token from the author's bucket for members of `kind`."""
+        limit = self.limits.get(kind)
+        if author_id is None or limit is None:
+            return Admission(0.0)
+        burst, rate = limit
+        with self._lock:
+            author = self._authors.get(author_id)
+            if author is None:
+                author = self._authors[author_id] = _Author()
+                while len(self._authors) > self.max_authors:
+                    self._authors.popitem(last=False)
+            else:
+                self._authors.move_to_end(author_id)
+            bucket = author.buckets.get(kind)
+            if bucket is None:
+                bucket = author.buckets[kind] = TokenBucket(rate=rate, capacity=burst, clock=self._clock)
+            wait = bucket.take()
+            if wait == 0:
+                author.refused[kind] = False
+                return Admission(0.0)
+            notify = not author.refused.get(kind, False)
+            author.refused[kind] = True
+            return Admission(wait, notify)
+
+    def refund(self, author_id: Any, kind: str) -> None:
+        """Give back the token `admit` took for a mention that then did not
+        reach its member -- shed by a full bulkhead, or deferred because
+        another member it tags was throttled. The retry pays instead."""
+        with self._lock:
+            author = self._authors.get(author_id)
+            bucket = author.buckets.get(kind) if author is not None else None
+        if bucket is not None:
+            bucket.give_back()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._authors)
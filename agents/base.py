@@ -9,17 +9,50 @@ Team members are classified into two kinds:
   runs a function, returns output. No LLM, no autonomy.
 """
 
+import hashlib
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
 
 import requests
 
+from agents.cache import REQUESTS, TTLCache
 from cards import is_safe_url
+from timeline_client import get_timeline_client, timeline_headers  # noqa: F401 (re-export)
+from xai_client import get_grok_client
 
 KIND_AGENT = "agent"
 KIND_BOT = "bot"
 
+# Listener scheduling priorities (lane_queue.py), most urgent first.
+# Members pick one in their AgentProfile; unset, bots get PRIORITY_BOT and
+# agents PRIORITY_AGENT.
+PRIORITY_APPROVAL = 0  # approval-gated proposals: time-sensitive
+PRIORITY_BOT = 1  # deterministic and fast; cheap to get out of the way
+PRIORITY_AGENT = 2
+PRIORITY_GENERAL = 3  # untagged chit-chat
+
+# Threads for `AgentReply.after_card` follow-ups. These are Grok-bound, so
+# this also caps the enrichment calls running beside the listener's own.
+AFTER_CARD_WORKERS = max(1, int(os.getenv("AGENT_AFTER_CARD_WORKERS", "4")))
+# Least seconds between two streamed updates of one card (`stream_to_card`).
+CARD_STREAM_INTERVAL_SECONDS = float(os.getenv("CARD_STREAM_INTERVAL_SECONDS", "1.0"))
+_after_card_executor: Optional[ThreadPoolExecutor] = None
+_after_card_lock = threading.Lock()
+
+# A viral post brings many mentions with the same text, and so many copies
+# of the same prompt at once. Those share one Grok call, and its answer is
+# reused for GROK_CACHE_TTL_SECONDS to cover near-simultaneous arrivals
+# (0 keeps the sharing and drops the reuse).
+GROK_CACHE_TTL_SECONDS = float(os.getenv("GROK_CACHE_TTL_SECONDS", "10"))
+_grok_answers = TTLCache("grok_chat", GROK_CACHE_TTL_SECONDS, max_entries=512)
+# Streams in flight, by prompt key (`grok_stream`).
+_grok_streams: Dict[tuple, "_StreamFlight"] = {}
+_grok_streams_lock = threading.Lock()
+
 
 @dataclass
 class MentionContext:
@@ -29,20 +62,34 @@ class MentionContext:
     mention_id: Optional[int] = None
     author_id: Optional[int] = None
     conversation_id: Optional[int] = None
+    # The conversation's root and the replied-to parent, oldest first, as
+    # {"id", "author_id", "text"}; see thread_context.py. Empty when the
+    # mention starts its thread or the lookup failed.
+    thread: List[Dict[str, Any]] = field(default_factory=list)
 
 
 @dataclass
 class AgentReply:
     """What a team member wants done in response to a mention.
 
-    text: the reply to post on X (listener truncates to 280 chars).
+    text: the reply to post on X (listener truncates to 280 chars). May be
+          empty when `after_card` produces the reply instead.
     card: optional timeline card payload (title/body/actions/metadata)
           for the human approval feed. Metadata should carry agent_id so
           the dispatcher can route approvals back to the owning member.
+    after_card: optional follow-up, called with the created timeline item
+          once the card has landed; use `append_card_blocks` or
+          `stream_to_card` to add its output to the card. A string it
+          returns is posted as the X reply. With `text` set it is
+          enrichment: it runs on a background thread (`run_after_card`),
+          so a slow Grok call never delays the card or the reply. With
+          `text` empty it *is* the reply: it runs in the member's bulkhead,
+          and the mention is not finished until it has returned.
     """
 
     text: str
     card: Optional[Dict[str, Any]] = None
+    after_card: Optional[Callable[[Dict[str, Any]], Optional[str]]] = None
 
 
 @dataclass
@@ -53,6 +100,30 @@ class AgentProfile:
     description: str
     kind: str = KIND_AGENT
     tags: List[str] = field(default_factory=list)
+    # Bulkhead (agents/bulkhead.py): mentions handled at once, and further
+    # ones allowed to wait for a slot. None takes AGENT_MAX_CONCURRENCY /
+    # AGENT_QUEUE_DEPTH. Bots ignore both; they run inline.
+    max_concurrency: Optional[int] = None
+    queue_depth: Optional[int] = None
+    # Whether a burst of one author's mentions in a thread may reach this
+    # member as one (listener.coalesce_lane). Off for members where each
+    # mention is its own request -- an order, a purchase -- on for
+    # conversational ones, where the burst is one question.
+    coalesce: bool = False
+    # Where this member's mentions queue in the listener (PRIORITY_*).
+    priority: Optional[int] = None
+    # Whether near-duplicate mentions from other authors may reuse this
+    # member's reply (mention_dedupe). Only for members whose cards carry no
+    # approval actions: an approval belongs to the one author who asked.
+    share_replies: bool = False
+
+
+def member_priority(member: "TeamMember") -> int:
+    """The member's listener priority (PRIORITY_*)."""
+    priority = getattr(member.profile, "priority", None)
+    if priority is not None:
+        return priority
+    return PRIORITY_BOT if member.profile.kind == KIND_BOT else PRIORITY_AGENT
 
 
 class TeamMember:
@@ -85,6 +156,19 @@ def wrap_untrusted(text: str) -> str:
     )
 
 
+def thread_prompt(mention: MentionContext) -> str:
+    """The mention's earlier thread posts framed for a prompt, ending where
+    the mention itself should follow; empty for a standalone post."""
+    if not mention.thread:
+        return ""
+    posts = "\n".join(f"[{post.get('author_id') or 'unknown'}] {post['text']}" for post in mention.thread)
+    return (
+        "Earlier posts in the conversation, oldest first:\n"
+        f"{wrap_untrusted(posts)}\n\n"
+        "The post you were mentioned in:\n"
+    )
+
+
 def truncate_for_reply(
     text: str, limit: int = 270, suffix: str = "… Full detail on your timeline."
 ) -> str:
@@ -98,6 +182,24 @@ def truncate_for_reply(
     return prefix + suffix
 
 
+def merge_replies(texts: Sequence[str], limit: int = 280, separator: str = "\n\n") -> str:
+    """Several members' replies to one mention as one X reply, in order.
+
+    When they don't fit in `limit`, the longest are shortened first: each
+    reply gets an equal share of what the shorter ones leave over."""
+    texts = [text for text in texts if text]
+    if len(texts) <= 1:
+        return texts[0] if texts else ""
+    remaining = limit - len(separator) * (len(texts) - 1)
+    shares: Dict[int, int] = {}
+    for index in sorted(range(len(texts)), key=lambda i: len(texts[i])):
+        shares[index] = min(len(texts[index]), remaining // (len(texts) - len(shares)))
+        remaining -= shares[index]
+    return separator.join(
+        truncate_for_reply(text, shares[index], suffix="…") for index, text in enumerate(texts)
+    )
+
+
 def text_block(text: str, label: Optional[str] = None) -> Dict[str, Any]:
     """A prose section of a card."""
     return {"type": "text", "label": label, "text": text}
@@ -180,37 +282,213 @@ def build_card(
     }
 
 
-def timeline_headers() -> Dict[str, str]:
-    """Auth header for internal calls to the timeline/A2A API.
+def _prompt_key(client: Any, prompt: str) -> tuple:
+    # Whitespace and case differences between copies of a mention don't
+    # change the answer.
+    normalized = " ".join(prompt.split()).casefold()
+    digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    return (client.model, client.server_url, digest)
 
-    Empty when TIMELINE_API_TOKEN is unset, which keeps local development
-    working against an unauthenticated server."""
-    token = os.getenv("TIMELINE_API_TOKEN", "").strip()
-    return {"Authorization": f"Bearer {token}"} if token else {}
 
+def grok_chat(prompt: str, cache: bool = True) -> str:
+    """One-shot Grok call with MCP tools over the process's warm channel.
 
-def grok_chat(prompt: str) -> str:
-    """One-shot Grok call with MCP tools (same wiring as the listener)."""
-    api_key = os.getenv("XAI_API_KEY", "").strip()
-    if not api_key:
+    Identical prompts share one call while it runs, and its answer for
+    GROK_CACHE_TTL_SECONDS after. Calls made for their side effects (e.g.
+    executing an approved action) pass `cache=False`: every one of them
+    must reach Grok, and a stale status must never stand in for a new run."""
+    client = get_grok_client()
+    if client is None:
         return ""
-    from xai_sdk import Client
-    from xai_sdk.chat import user
-    from xai_sdk.tools import mcp
+    if not cache:
+        return client.chat(prompt)
+    return _grok_answers.get_or_compute(_prompt_key(client, prompt), lambda: client.chat(prompt))
+
+
+class _StreamFlight:
+    """One Grok stream in flight, replayed to every caller that asks for
+    the same prompt while it runs."""
+
+    def __init__(self) -> None:
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = threading.Condition()
+
+
+def grok_stream(prompt: str) -> Optional[Iterator[str]]:
+    """`grok_chat`, chunk by chunk as Grok produces them. None when Grok
+    is not configured. The call starts on the first iteration.
+
+    A cached answer to the same prompt is returned as one chunk, and a
+    completed stream is cached for `grok_chat` and later streams. A caller
+    that asks while the same prompt is streaming joins that stream: it
+    gets the chunks produced so far at once, then each new one as the
+    first caller reads it. If the first caller stops early or the stream
+    fails, the others raise rather than end on a truncated answer."""
+    client = get_grok_client()
+    if client is None:
+        return None
+    key = _prompt_key(client, prompt)
+    cached = _grok_answers.peek(key)
+    if cached:
+        return iter([cached])
+
+    def follow(flight: _StreamFlight) -> Iterator[str]:
+        seen = 0
+        while True:
+            with flight.changed:
+                flight.changed.wait_for(lambda: flight.done or len(flight.chunks) > seen)
+                fresh = flight.chunks[seen:]
+                done, error = flight.done, flight.error
+            seen += len(fresh)
+            yield from fresh
+            if done and seen == len(flight.chunks):
+                if error is not None:
+                    raise RuntimeError(f"Shared Grok stream failed: {error!r}")
+                return
+
+    def stream() -> Iterator[str]:
+        with _grok_streams_lock:
+            flight = _grok_streams.get(key)
+            leader = flight is None
+            if leader:
+                flight = _grok_streams[key] = _StreamFlight()
+        REQUESTS.inc(cache=_grok_answers.name, result="miss" if leader else "coalesced")
+        if not leader:
+            yield from follow(flight)
+            return
+        try:
+            for chunk in client.stream(prompt):
+                with flight.changed:
+                    flight.chunks.append(chunk)
+                    flight.changed.notify_all()
+                yield chunk
+        except BaseException as exc:
+            # GeneratorExit too: a reader that stops early leaves the
+            # followers without the rest of the answer.
+            flight.error = exc
+            raise
+        finally:
+            # Cached before the flight is dropped, so a caller arriving in
+            # between finds one or the other.
+            if flight.error is None:
+                _grok_answers.put(key, "".join(flight.chunks).strip())
+            with _grok_streams_lock:
+                _grok_streams.pop(key, None)
+            with flight.changed:
+                flight.done = True
+                flight.changed.notify_all()
+
+    return stream()
+
+
+def run_after_card(
+    reply: AgentReply,
+    item: Dict[str, Any],
+    post_reply: Optional[Callable[[str], None]] = None,
+    settled: Optional[Callable[[], None]] = None,
+) -> bool:
+    """Schedule `reply.after_card` for the card just pushed as `item`;
+    `post_reply` posts the reply text it returns, and `settled` is called
+    once it has finished, whatever the outcome. False when there is nothing
+    to schedule (and neither callback will run).
+
+    Fire-and-forget: the mention is already complete, so a failing
+    follow-up is logged and the card simply stays as first pushed."""
+    global _after_card_executor
+    if reply.after_card is None or not item.get("id"):
+        return False
+    with _after_card_lock:
+        if _after_card_executor is None:
+            _after_card_executor = ThreadPoolExecutor(
+                max_workers=AFTER_CARD_WORKERS, thread_name_prefix="after-card"
+            )
+
+    def follow_up() -> None:
+        try:
+            text = reply.after_card(item)
+            if text and post_reply is not None:
+                post_reply(text)
+        except Exception as exc:
+            print(f"Follow-up for timeline card {item.get('id')} failed: {exc}", flush=True)
+        finally:
+            if settled is not None:
+                settled()
+
+    _after_card_executor.submit(follow_up)
+    return True
+
+
+def append_card_blocks(item: Dict[str, Any], blocks: List[Dict[str, Any]]) -> bool:
+    """Add `blocks` to the end of a pushed card.
+
+    The PATCH replaces the card's block list, so `item` must be the card as
+    pushed by the caller, which is the only writer of its blocks. Returns
+    False (instead of raising) on timeline-server failures, like
+    `send_a2a_message`."""
+    try:
+        response = get_timeline_client().patch(
+            f"/v1/timeline/items/{item['id']}",
+            op="append_card_blocks",
+            json={"blocks": list(item.get("blocks") or []) + blocks},
+        )
+        response.raise_for_status()
+        return True
+    except requests.RequestException as exc:
+        print(f"Could not update timeline card {item.get('id')}: {exc}", flush=True)
+        return False
 
-    model = os.getenv("XAI_MODEL", "grok-4-1-fast")
-    server_url = os.getenv("MCP_SERVER_URL", "http://127.0.0.1:8000/mcp")
-    # Hard deadline so one stalled call can't pin the mention loop.
-    timeout = float(os.getenv("XAI_TIMEOUT_SECONDS", "120"))
-    client = Client(api_key=api_key, timeout=timeout)
-    chat = client.chat.create(model=model, tools=[mcp(server_url=server_url)])
-    chat.append(user(prompt))
 
-    response_text = ""
-    for _, chunk in chat.stream():
-        if chunk.content:
-            response_text += chunk.content
-    return response_text.strip()
+def stream_to_card(
+    item: Dict[str, Any],
+    block: int,
+    chunks: Iterable[str],
+    interval: Optional[float] = None,
+    clock: Callable[[], float] = time.monotonic,
+) -> str:
+    """Append `chunks` to text block `block` of a pushed card as they
+    arrive, at most one update per `interval` seconds, and return the full
+    text.
+
+    Each update sends only the text since the last one, with the length it
+    expects the block to have; the server applies it once even if a retry
+    repeats it. A failed update is folded into the next one, so the card
+    catches up rather than losing text."""
+    interval = CARD_STREAM_INTERVAL_SECONDS if interval is None else interval
+    parts: List[str] = []
+    sent = 0  # characters the card already has
+    pending = ""
+    last_flush = clock()
+
+    def flush() -> None:
+        nonlocal sent, pending, last_flush
+        last_flush = clock()
+        if not pending:
+            return
+        try:
+            response = get_timeline_client().post(
+                f"/v1/timeline/items/{item['id']}/blocks/{block}/append",
+                op="append_card_text",
+                json={"text": pending, "offset": sent},
+            )
+            response.raise_for_status()
+        except requests.RequestException as exc:
+            print(f"Could not stream to timeline card {item.get('id')}: {exc}", flush=True)
+            return
+        sent += len(pending)
+        pending = ""
+
+    try:
+        for chunk in chunks:
+            parts.append(chunk)
+            pending += chunk
+            if clock() - last_flush >= interval:
+                flush()
+    finally:
+        # Also when the stream breaks off: the card keeps what arrived.
+        flush()
+    return "".join(parts)
 
 
 def send_a2a_message(
@@ -224,10 +502,10 @@ def send_a2a_message(
 
     Returns False (instead of raising) on timeline-server failures so a
     bus hiccup can't kill mention processing mid-flight."""
-    timeline_url = os.getenv("TIMELINE_API_URL", "http://127.0.0.1:8080")
     try:
-        response = requests.post(
-            f"{timeline_url}/v1/a2a/messages",
+        response = get_timeline_client().post(
+            "/v1/a2a/messages",
+            op="send_a2a_message",
             json={
                 "from": from_agent,
                 "to": to,
@@ -235,8 +513,6 @@ def send_a2a_message(
                 "content": content,
                 "metadata": metadata or {},
             },
-            headers=timeline_headers(),
-            timeout=10,
         )
         # requests doesn't raise on 4xx/5xx; a rejected message is a failure.
         response.raise_for_status()
@@ -0,0 +1,161 @@
+"""Bulkheads: each team member's `handle_mention` on its own bounded lane.
+
+Without them every member shares the listener's mention threads, so a
+burst of slow Research calls (30-90s of Grok each) holds all of them and a
+TickerBot mention that would take microseconds waits behind it. Now:
+
+- kind="bot" members run inline on the calling thread. They are
+  deterministic and cheap; giving them a pool would only add a hand-off.
+- every other member gets its own executor of `max_concurrency` threads
+  and takes at most `queue_depth` further calls waiting for one. A call
+  beyond that raises `BulkheadFull` straight away rather than queueing --
+  the listener retries the mention later -- so one member's backlog never
+  grows without bound or spills into the others' capacity.
+
+Limits come from the member's `AgentProfile` (`max_concurrency`,
+`queue_depth`), defaulting to AGENT_MAX_CONCURRENCY / AGENT_QUEUE_DEPTH.
+"""
+
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from agents.base import KIND_BOT, AgentReply, MentionContext, TeamMember
+from metrics import collected, counter
+
+AGENT_MAX_CONCURRENCY = max(1, int(os.getenv("AGENT_MAX_CONCURRENCY", "2")))
+AGENT_QUEUE_DEPTH = max(0, int(os.getenv("AGENT_QUEUE_DEPTH", "4")))
+
+
+class BulkheadFull(RuntimeError):
+    """The member already has `max_concurrency + queue_depth` calls."""
+
+
+class Bulkhead:
+    def __init__(self, name: str, max_concurrency: int, queue_depth: int):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_depth = max(0, queue_depth)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix=f"member-{name}")
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self.rejected = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_concurrency + self.queue_depth
+
+    def in_flight(self) -> int:
+        """Calls running or waiting for a thread."""
+        with self._lock:
+            return self._admitted
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        with self._lock:
+            if self._admitted >= self.capacity:
+                self.rejected += 1
+                REJECTED.inc(member=self.name)
+                raise BulkheadFull(f"{self.name} is at capacity ({self.capacity} calls)")
+            self._admitted += 1
+        return self._start(fn, *args)
+
+    def follow(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """Run the rest of a call this bulkhead already admitted.
+
+        Never refused: its mention was accepted and its card is already up,
+        so shedding it now would strand that card. It still runs on the
+        member's threads and counts as in flight, so new mentions are shed
+        while it runs rather than the work escaping the bulkhead."""
+        with self._lock:
+            self._admitted += 1
+        return self._start(fn, *args)
+
+    def _start(self, fn: Callable[..., Any], *args: Any) -> Future:
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future: Optional[Future]) -> None:
+        with self._lock:
+            self._admitted -= 1
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+_BULKHEADS: Dict[str, Bulkhead] = {}
+_BULKHEADS_LOCK = threading.Lock()
+
+
+def bulkhead_for(member: TeamMember) -> Optional[Bulkhead]:
+    """The member's bulkhead, or None for the inline bot lane."""
+    profile = member.profile
+    if profile.kind == KIND_BOT:
+        return None
+    with _BULKHEADS_LOCK:
+        bulkhead = _BULKHEADS.get(profile.id)
+        if bulkhead is None:
+            max_concurrency = getattr(profile, "max_concurrency", None)
+            queue_depth = getattr(profile, "queue_depth", None)
+            bulkhead = _BULKHEADS[profile.id] = Bulkhead(
+                profile.id,
+                AGENT_MAX_CONCURRENCY if max_concurrency is None else max_concurrency,
+                AGENT_QUEUE_DEPTH if queue_depth is None else queue_depth,
+            )
+        return bulkhead
+
+
+def submit_mention(member: TeamMember, mention: MentionContext) -> Future:
+    """Start `member.handle_mention` in its lane. A bot's runs before this
+    returns; raises BulkheadFull when the member is at capacity."""
+    bulkhead = bulkhead_for(member)
+    if bulkhead is not None:
+        return bulkhead.submit(member.handle_mention, mention)
+    future: Future = Future()
+    try:
+        future.set_result(member.handle_mention(mention))
+    except Exception as exc:
+        future.set_exception(exc)
+    return future
+
+
+def follow_in_lane(member: TeamMember, fn: Callable[..., Any], *args: Any) -> Future:
+    """Continue a mention `submit_mention` started, in the same lane (see
+    `Bulkhead.follow`). A bot's runs before this returns."""
+    bulkhead = bulkhead_for(member)
+    if bulkhead is not None:
+        return bulkhead.follow(fn, *args)
+    future: Future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as exc:
+        future.set_exception(exc)
+    return future
+
+
+def handle_in_lane(member: TeamMember, mention: MentionContext) -> AgentReply:
+    """`member.handle_mention`, run in the member's lane, waited for."""
+    return submit_mention(member, mention).result()
+
+
+def team_capacity(members: List[TeamMember]) -> int:
+    """Calls the team's bulkheads can hold at once."""
+    return sum(bulkhead.capacity for bulkhead in filter(None, map(bulkhead_for, members)))
+
+
+def _in_flight() -> List[Tuple[Dict[str, object], float]]:
+    with _BULKHEADS_LOCK:
+        bulkheads = sorted(_BULKHEADS.items())
+    return [({"member": name}, bulkhead.in_flight()) for name, bulkhead in bulkheads]
+
+
+REJECTED = counter(
+    "member_bulkhead_rejected_total",
+    "Mentions turned away because the member's bulkhead was full, by member.",
+)
+collected("member_bulkhead_in_flight", "Mentions running or queued in each member's bulkhead.", _in_flight)
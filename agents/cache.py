@@ -0,0 +1,135 @@
+"""In-process TTL cache with single-flight, for expensive team-member calls.
+
+The roster is built once per process (`registry.get_team`), so a cache held
+by a member is shared by every listener worker thread. `get_or_compute`
+coalesces concurrent misses: the first caller for a key computes it, and
+callers arriving meanwhile wait for that result instead of making the same
+Grok call again.
+
+Hits, misses and coalesced waits are counted per cache in
+`agent_cache_requests_total` on /metrics.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from metrics import counter
+
+REQUESTS = counter(
+    "agent_cache_requests_total",
+    "Team-member cache lookups, by cache and result (hit, miss, coalesced).",
+)
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class TTLCache:
+    """`ttl` seconds per entry (0: single-flight only), at most
+    `max_entries` (least recently used evicted first). `cache_if` decides whether a computed value is kept --
+    e.g. not an empty answer from a failed call, which would otherwise be
+    served for the whole TTL."""
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        *,
+        max_entries: int = 1024,
+        cache_if: Callable[[Any], bool] = bool,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.cache_if = cache_if
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self._counts = {"hit": 0, "miss": 0, "coalesced": 0}
+
+    def _count(self, result: str) -> None:
+        # Called under self._lock.
+        self._counts[result] += 1
+        REQUESTS.inc(cache=self.name, result=result)
+
+    def peek(self, key: Hashable) -> Any:
+        """The fresh cached value for `key`, or None. Never computes."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self._clock():
+                return None
+            self._entries.move_to_end(key)
+            self._count("hit")
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store a value computed outside `get_or_compute`."""
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        # Called under self._lock.
+        if self.ttl <= 0 or not self.cache_if(value):
+            return
+        self._entries[key] = (self._clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """The cached value for `key`, or `compute()`'s, shared with every
+        caller that asks while it runs. With `ttl` 0 nothing is kept, but
+        concurrent callers still share the one computation."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self._clock():
+                self._entries.move_to_end(key)
+                self._count("hit")
+                return entry[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._count("miss")
+            else:
+                self._count("coalesced")
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                if flight.error is None:
+                    self._store(key, flight.value)
+            flight.done.set()
+        return flight.value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self._counts["hit"],
+                "misses": self._counts["miss"],
+                "coalesced": self._counts["coalesced"],
+            }
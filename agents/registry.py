@@ -1,14 +1,16 @@
 """Team roster, @handle routing, and A2A registration."""
 
-import os
 import threading
 import time
 from typing import List, Optional
 
 import requests
 
-from agents.base import MentionContext, TeamMember, timeline_headers
-from agents.router import find_target
+from agents.base import MentionContext, TeamMember
+from agents.router import find_targets
+from timeline_client import get_timeline_client
+
+REGISTER_ATTEMPTS = 3
 
 
 def build_team() -> List[TeamMember]:
@@ -35,14 +37,15 @@ def get_team() -> List[TeamMember]:
     return _TEAM
 
 
-def route_mention(mention: MentionContext) -> TeamMember:
-    """Route to the earliest-tagged member; fall back to the member with an
-    empty handle (the general agent), regardless of roster order."""
+def route_mention(mention: MentionContext) -> List[TeamMember]:
+    """Every tagged member, earliest-tagged first; when none is tagged, the
+    member with an empty handle (the general agent), regardless of roster
+    order."""
     team = get_team()
-    target = find_target(mention.text, team)
-    if target:
-        return target
-    return next(m for m in team if not m.profile.handle)
+    targets = find_targets(mention.text, team)
+    if targets:
+        return targets
+    return [next(m for m in team if not m.profile.handle)]
 
 
 def find_member(agent_id: Optional[str]) -> Optional[TeamMember]:
@@ -56,7 +59,7 @@ def find_member(agent_id: Optional[str]) -> Optional[TeamMember]:
 
 def register_team() -> None:
     """Register every team member in the timeline server's A2A registry."""
-    timeline_url = os.getenv("TIMELINE_API_URL", "http://127.0.0.1:8080")
+    client = get_timeline_client()
     for member in get_team():
         profile = member.profile
         payload = {
@@ -70,19 +73,16 @@ def register_team() -> None:
         }
         # The timeline server may still be booting (compose/k8s startup
         # order is not guaranteed), so retry with backoff before giving up.
-        for attempt in range(3):
+        # Wider than the client's own retries: a booting server can answer
+        # 404 or 500 before its routes and database are up, and registering
+        # is idempotent, so any 4xx/5xx is worth another try here.
+        for attempt in range(REGISTER_ATTEMPTS):
             try:
-                response = requests.post(
-                    f"{timeline_url}/v1/a2a/agents",
-                    json=payload,
-                    headers=timeline_headers(),
-                    timeout=10,
-                )
-                # 4xx/5xx (e.g. server still booting) must retry too.
+                response = client.post("/v1/a2a/agents", op="register_agent", json=payload, attempts=1)
                 response.raise_for_status()
                 break
             except requests.RequestException as exc:
-                if attempt == 2:
+                if attempt == REGISTER_ATTEMPTS - 1:
                     print(f"Could not register agent {profile.id}: {exc}", flush=True)
                 else:
                     time.sleep(2**attempt)
@@ -1,28 +1,34 @@
-"""Route an inbound mention to a team member by @handle."""
+"""Route an inbound mention to the team members it tags by @handle."""
 
 import re
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from agents.base import TeamMember
 
 
-def find_target(text: str, team: List[TeamMember]) -> Optional[TeamMember]:
-    """Return the team member whose @handle appears earliest in the text.
+def find_targets(text: str, team: List[TeamMember]) -> List[TeamMember]:
+    """Return every team member whose @handle appears in the text, in the
+    order they were first tagged.
 
     Matching is case-insensitive and word-bounded, so @Tradedesk matches
-    "@tradedesk $TSLA buy" but not "@TradedeskFanClub". When several
-    members are tagged, the one tagged first wins (user intent, not roster
-    order). Members with an empty handle (the fallback agent) are never
-    matched here.
+    "@tradedesk $TSLA buy" but not "@TradedeskFanClub". Members with an
+    empty handle (the fallback agent) are never matched here.
     """
     lowered = text.lower()
-    best_member: Optional[TeamMember] = None
-    best_pos: Optional[int] = None
-    for member in team:
+    tagged: List[Tuple[int, int, TeamMember]] = []
+    for order, member in enumerate(team):
         handle = member.profile.handle.lower()
         if not handle:
             continue
         match = re.search(r"@" + re.escape(handle) + r"\b", lowered)
-        if match and (best_pos is None or match.start() < best_pos):
-            best_member, best_pos = member, match.start()
-    return best_member
+        if match:
+            tagged.append((match.start(), order, member))
+    return [member for _pos, _order, member in sorted(tagged, key=lambda entry: entry[:2])]
+
+
+def find_target(text: str, team: List[TeamMember]) -> Optional[TeamMember]:
+    """Return the team member whose @handle appears earliest in the text.
+    When several members are tagged, the one tagged first wins (user
+    intent, not roster order)."""
+    targets = find_targets(text, team)
+    return targets[0] if targets else None
@@ -9,11 +9,13 @@ from typing import Any, Dict, Optional
 
 from agents.base import (
     KIND_AGENT,
+    PRIORITY_GENERAL,
     AgentProfile,
     AgentReply,
     MentionContext,
     TeamMember,
     grok_chat,
+    thread_prompt,
     wrap_untrusted,
 )
 
@@ -28,6 +30,10 @@ class GeneralAgent(TeamMember):
                 description="Handles @mentions and X actions.",
                 kind=KIND_AGENT,
                 tags=["x", "social"],
+                max_concurrency=2,
+                queue_depth=4,
+                coalesce=True,
+                priority=PRIORITY_GENERAL,
             )
         )
 
@@ -36,7 +42,7 @@ class GeneralAgent(TeamMember):
             "You are an autonomous X agent bot. You were mentioned in the post below.\n"
             "Analyze the request/intent. Use available tools to respond helpfully.\n"
             "Always reply directly to the mentioning post. Be concise and actionable.\n\n"
-            f"{wrap_untrusted(mention.text)}"
+            f"{thread_prompt(mention)}{wrap_untrusted(mention.text)}"
         )
         if not reply:
             reply = "Thinking..."
@@ -65,6 +71,7 @@ class GeneralAgent(TeamMember):
             f"timeline item {item.get('id', '?')} titled "
             f"'{item.get('title', '')}'.\n"
             "Use MCP tools to execute any required external steps. "
-            "Return a concise status update."
+            "Return a concise status update.",
+            cache=False,
         )
         return result or f"Acknowledged '{action}' (no executor output)."
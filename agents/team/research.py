@@ -2,11 +2,15 @@
 
 Usage on X:  @Research what's driving the $NVDA selloff today?
 
-Sends the question to Grok (with MCP tools for live X data), posts a
-short reply, and files the full brief on the timeline.
+Sends the question to Grok (with MCP tools for live X data) and files the
+brief on the timeline as it is written: the card goes up at once and the
+brief streams into it, so the approval UI shows the first words within
+about a second rather than after the whole 30-90s answer. The short X
+reply is posted once the brief is complete.
 """
 
 import os
+from typing import Any, Dict, Optional
 
 from agents.base import (
     KIND_AGENT,
@@ -15,12 +19,17 @@ from agents.base import (
     MentionContext,
     TeamMember,
     build_card,
-    grok_chat,
+    grok_stream,
+    stream_to_card,
     text_block,
+    thread_prompt,
     truncate_for_reply,
     wrap_untrusted,
 )
 
+# Index of the "Brief" block on the card, which the answer streams into.
+BRIEF_BLOCK = 1
+
 
 class ResearchAgent(TeamMember):
     def __init__(self):
@@ -32,24 +41,27 @@ class ResearchAgent(TeamMember):
                 description="Answers questions with Grok + live X context; files full briefs on the timeline.",
                 kind=KIND_AGENT,
                 tags=["research", "analysis"],
+                max_concurrency=2,
+                queue_depth=6,
+                coalesce=True,
+                share_replies=True,
             )
         )
 
     def handle_mention(self, mention: MentionContext) -> AgentReply:
-        brief = grok_chat(
+        chunks = grok_stream(
             "You are a research agent on X. Answer the question below concisely "
             "and factually, using available tools for live context.\n\n"
-            f"{wrap_untrusted(mention.text)}"
+            f"{thread_prompt(mention)}{wrap_untrusted(mention.text)}"
         )
-        if not brief:
+        if chunks is None:
             return AgentReply(text="Research agent is offline (no XAI_API_KEY configured).")
 
-        reply = truncate_for_reply(brief, suffix="… Full brief on your timeline.")
         card = build_card(
             title="Research brief",
             blocks=[
                 text_block(mention.text, label="Question"),
-                text_block(brief, label="Brief"),
+                text_block("", label="Brief"),
             ],
             metadata={
                 "agent_id": self.profile.id,
@@ -57,4 +69,16 @@ class ResearchAgent(TeamMember):
                 "mention_id": mention.mention_id,
             },
         )
-        return AgentReply(text=reply, card=card)
+
+        def write_brief(item: Dict[str, Any]) -> Optional[str]:
+            try:
+                brief = stream_to_card(item, BRIEF_BLOCK, chunks).strip()
+            except Exception as exc:
+                print(f"Research brief for mention {mention.mention_id} failed: {exc}", flush=True)
+                brief = ""
+            if not brief:
+                return "Sorry, I couldn't put a brief together for that one."
+            return truncate_for_reply(brief, suffix="… Full brief on your timeline.")
+
+        # The reply waits for the finished brief; the card does not.
+        return AgentReply(text="", card=card, after_card=write_brief)
@@ -13,6 +13,7 @@ from typing import Any, Dict, Optional
 
 from agents.base import (
     KIND_AGENT,
+    PRIORITY_APPROVAL,
     AgentProfile,
     AgentReply,
     MentionContext,
@@ -38,6 +39,9 @@ class ShoppingAgent(TeamMember):
                 description="Finds products; purchases are approval-gated intents.",
                 kind=KIND_AGENT,
                 tags=["shopping", "commerce"],
+                max_concurrency=2,
+                queue_depth=4,
+                priority=PRIORITY_APPROVAL,
             )
         )
 
@@ -2,9 +2,10 @@
 
 Usage on X:  @Tradedesk $TSLA buy 100   (or: @Tradedesk buy $TSLA 100)
 
-Flow: parse the command deterministically, optionally enrich with Grok
-market context, then log a trade *proposal* to the approval timeline.
-Nothing executes until a human approves the card, and execution goes to
+Flow: parse the command deterministically and log a trade *proposal* to
+the approval timeline straight away; Grok market context, when enabled,
+is added to the card afterwards so the approval gate never waits on the
+model. Nothing executes until a human approves the card, and execution goes to
 the paper broker unless a real adapter is wired in.
 """
 
@@ -15,10 +16,12 @@ from typing import Any, Dict, Optional
 
 from agents.base import (
     KIND_AGENT,
+    PRIORITY_APPROVAL,
     AgentProfile,
     AgentReply,
     MentionContext,
     TeamMember,
+    append_card_blocks,
     approve_reject,
     build_card,
     facts_block,
@@ -26,6 +29,7 @@ from agents.base import (
     text_block,
 )
 from agents.broker import PaperBroker
+from agents.cache import TTLCache
 
 # "$TSLA buy 100" — ticker first
 _TICKER_FIRST = re.compile(
@@ -38,6 +42,11 @@ _SIDE_FIRST = re.compile(
     re.IGNORECASE,
 )
 
+# Market context is per ticker and side, not per mention, and a burst of
+# "$TSLA buy" mentions would otherwise make one identical Grok call each.
+# 0 disables the cache.
+CONTEXT_TTL_SECONDS = float(os.getenv("TRADEDESK_CONTEXT_TTL_SECONDS", "60"))
+
 USAGE = "Format: @Tradedesk $TICKER buy|sell [quantity] — e.g. @Tradedesk $TSLA buy 100"
 
 
@@ -57,6 +66,10 @@ def parse_trade_command(text: str) -> Optional[Dict[str, Any]]:
     }
 
 
+def context_block(context: str) -> Dict[str, Any]:
+    return text_block(context, label="Market context (Grok)")
+
+
 class TradeDeskAgent(TeamMember):
     def __init__(self, broker: Optional[PaperBroker] = None):
         super().__init__(
@@ -67,9 +80,27 @@ class TradeDeskAgent(TeamMember):
                 description="Turns tagged trade commands into approval-gated proposals.",
                 kind=KIND_AGENT,
                 tags=["trading", "finance"],
+                max_concurrency=4,
+                queue_depth=8,
+                priority=PRIORITY_APPROVAL,
             )
         )
         self.broker = broker or PaperBroker()
+        self.context_cache = TTLCache("tradedesk_context", CONTEXT_TTL_SECONDS)
+
+    def market_context(self, ticker: str, side: str) -> str:
+        """Grok market context for a validated ticker/side, shared across
+        mentions for CONTEXT_TTL_SECONDS. An empty answer (Grok failed) is
+        not cached, so the next mention tries again."""
+        # Only the parsed, validated ticker/side reach the prompt — the
+        # raw mention text never does.
+        return self.context_cache.get_or_compute(
+            (ticker, side),
+            lambda: grok_chat(
+                f"In under 80 words, give current market context for ${ticker} "
+                f"relevant to a proposed {side} order. Facts only, no advice."
+            ),
+        )
 
     def handle_mention(self, mention: MentionContext) -> AgentReply:
         trade = parse_trade_command(mention.text)
@@ -77,14 +108,10 @@ class TradeDeskAgent(TeamMember):
             return AgentReply(text=f"Couldn't parse a trade. {USAGE}")
 
         summary = f"{trade['side'].upper()} {trade['quantity']:g} ${trade['ticker']}"
-        context = ""
-        if os.getenv("TRADEDESK_USE_GROK", "1") == "1":
-            # Only the parsed, validated ticker/side reach the prompt — the
-            # raw mention text never does.
-            context = grok_chat(
-                f"In under 80 words, give current market context for ${trade['ticker']} "
-                f"relevant to a proposed {trade['side']} order. Facts only, no advice."
-            )
+        use_grok = os.getenv("TRADEDESK_USE_GROK", "1") == "1"
+        # A context still cached from an earlier mention goes on the card
+        # now; otherwise it is fetched once the card is up (`enrich_card`).
+        context = self.context_cache.peek((trade["ticker"], trade["side"])) if use_grok else None
 
         blocks = [
             facts_block(
@@ -102,7 +129,7 @@ class TradeDeskAgent(TeamMember):
             ),
         ]
         if context:
-            blocks.append(text_block(context, label="Market context (Grok)"))
+            blocks.append(context_block(context))
 
         card = build_card(
             title=f"Trade proposal: {summary}",
@@ -123,7 +150,20 @@ class TradeDeskAgent(TeamMember):
             f"📋 Trade proposal logged: {summary}. Pending human approval on the "
             f"timeline. (Paper trading — no live orders.)"
         )
-        return AgentReply(text=reply, card=card)
+        after_card = None
+        if use_grok and not context:
+            def after_card(item: Dict[str, Any]) -> None:
+                self.enrich_card(item, trade["ticker"], trade["side"])
+
+        return AgentReply(text=reply, card=card, after_card=after_card)
+
+    def enrich_card(self, item: Dict[str, Any], ticker: str, side: str) -> None:
+        """Add Grok market context to a proposal card already on the
+        timeline. Runs after the mention is done; if Grok has nothing, the
+        card stays as pushed."""
+        context = self.market_context(ticker, side)
+        if context:
+            append_card_blocks(item, [context_block(context)])
 
     def execute_action(self, item: Dict[str, Any], action: str) -> Optional[str]:
         metadata = item.get("metadata") or {}
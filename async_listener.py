@@ -0,0 +1,478 @@
+"""Asyncio mode of the listener (LISTENER_MODE=async).
+
+The threaded listener holds one thread per mention in flight, and each of
+those threads mostly waits: on X, on the timeline server, on Grok. Here one
+event loop does the waiting instead. X is read and written through
+tweepy's AsyncClient, the timeline through `httpx.AsyncClient`
+(`AsyncTimelineClient`), and only the agents' `handle_mention` --
+synchronous, Grok-bound code -- runs on a thread, in the member's bulkhead
+(agents/bulkhead.py); bots run inline on the loop. While one mention's
+card push and reply are awaiting the network, the next mention's Grok call
+is already running.
+
+Semantics match the threaded listener: one lane per conversation, the
+watermark committed over the contiguous completed prefix of each page, a
+failed card push holding it, agent errors dead-lettered as cards, and
+replies posted from a rate-limited queue (`AsyncReplyPoster`).
+
+This mode polls only; the stream, webhook and SQL-queue modes are built on
+the threaded listener.
+"""
+
+import asyncio
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from tweepy.errors import HTTPException as TweepyHTTPException
+
+from agents.base import run_after_card
+from agents.registry import register_team
+from listener import (
+    CATCHUP_MAX_PAGES,
+    LISTENER_QUEUE,
+    MentionCursor,
+    MergedReply,
+    _conversation_key,
+    admit_members,
+    agent_error_card,
+    card_payload,
+    claim_duplicate,
+    coalesce_lane,
+    failed_reply_card,
+    follow_duplicate,
+    lane_priority,
+    lane_results,
+    last_seen_path,
+    load_accounts,
+    mention_context,
+    mention_query,
+    record_answered,
+    route_members,
+    settle_duplicate,
+    settle_page,
+    split_page,
+    start_members,
+    start_reply_follow_up,
+)
+from mention_dedupe import DuplicateGroup
+from mention_sources import PAYMENT_REQUIRED_BACKOFF_SECONDS, POLL_SECONDS, BatchResult
+from metrics import STAGE_ERRORS, timed
+from poll_scheduler import PollScheduler
+from reply_queue import AsyncReplyPoster, Reply, TokenBucket
+from thread_context import prefetch_async
+from timeline_client import AsyncTimelineClient, size_timeline_pools
+
+# Mentions in flight at once across every account. Waiting on the network
+# costs a coroutine, not a thread, so this can sit well above the members'
+# bulkheads, which still bound concurrent Grok calls.
+ASYNC_MAX_IN_FLIGHT = max(1, int(os.getenv("LISTENER_ASYNC_MAX_IN_FLIGHT", "64")))
+
+
+def build_async_client(account: Optional[Dict[str, str]] = None) -> Any:
+    """`listener.build_client`, as a tweepy AsyncClient."""
+    # Imported here: tweepy.asynchronous needs the tweepy[async] extras,
+    # which only this mode uses.
+    from tweepy.asynchronous import AsyncClient
+
+    account = account or {}
+    return AsyncClient(
+        bearer_token=account.get("bearer_token") or os.getenv("X_BEARER_TOKEN"),
+        consumer_key=account.get("api_key") or os.getenv("X_API_KEY"),
+        consumer_secret=account.get("api_secret") or os.getenv("X_API_SECRET"),
+        access_token=account.get("access_token")
+        or os.getenv("X_ACCESS_TOKEN")
+        or os.getenv("X_OAUTH_ACCESS_TOKEN"),
+        access_token_secret=account.get("access_secret")
+        or os.getenv("X_ACCESS_SECRET")
+        or os.getenv("X_OAUTH_ACCESS_TOKEN_SECRET"),
+        wait_on_rate_limit=True,
+    )
+
+
+def rate_limit_trace(scheduler: PollScheduler, bucket: TokenBucket) -> Any:
+    """An aiohttp trace that reads X's rate-limit headers off every
+    response: mention reads for `scheduler`, posts for `bucket`. What
+    `PollScheduler.attach` and `TokenBucket.attach` do for the threaded
+    listener's requests session, which AsyncClient has no hooks for."""
+    import aiohttp
+
+    async def on_request_end(_session: Any, _context: Any, params: Any) -> None:
+        path = params.url.path.rstrip("/")
+        if "/mentions" in path:
+            scheduler.observe_rate_limit(params.response.headers)
+        elif params.method == "POST" and path.endswith("/2/tweets"):
+            bucket.observe_rate_limit(params.response.headers)
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_end.append(on_request_end)
+    return trace
+
+
+async def authenticated_user(client: Any) -> Any:
+    me = (await client.get_me()).data
+    if not me:
+        raise RuntimeError("Could not resolve authenticated X user for listener")
+    return me
+
+
+def _status(exc: TweepyHTTPException) -> Optional[int]:
+    # aiohttp responses carry `status`, requests ones `status_code`.
+    response = getattr(exc, "response", None)
+    return getattr(response, "status", None) or getattr(response, "status_code", None)
+
+
+async def fetch_mention_pages_async(
+    client: Any,
+    bot_id: Any,
+    *,
+    start_time: Any,
+    since_id: Optional[Any] = None,
+    max_pages: int = CATCHUP_MAX_PAGES,
+) -> Tuple[List[List[Any]], bool]:
+    """`listener.fetch_mention_pages` over the AsyncClient."""
+    params = mention_query(bot_id, start_time, since_id)
+    pages: List[List[Any]] = []
+    truncated = False
+    token: Optional[str] = None
+    while True:
+        with timed("fetch"):
+            response = await client.get_users_mentions(**params, pagination_token=token)
+        if response.data:
+            if len(pages) == max_pages:
+                truncated = True
+                pages.pop(0)
+            pages.append(list(response.data))
+        token = (response.meta or {}).get("next_token")
+        if not token:
+            break
+    return list(reversed(pages)), truncated
+
+
+class AsyncPipeline:
+    """Processes mentions for every account on one event loop."""
+
+    def __init__(self, timeline: AsyncTimelineClient, max_in_flight: int = ASYNC_MAX_IN_FLIGHT):
+        self.timeline = timeline
+        self._slots = asyncio.Semaphore(max_in_flight)
+        # Followers processing on their own, kept so they are not collected.
+        self._followers: set = set()
+
+    async def push_card(self, card: dict, posted_by: str) -> Dict[str, Any]:
+        response = await self.timeline.post(
+            "/v1/timeline/items", op="push_card", json=card_payload(card, posted_by)
+        )
+        # As in listener.push_timeline_card: a lost card must hold the watermark.
+        response.raise_for_status()
+        return response.json()
+
+    def reply_sender(self, poster: AsyncReplyPoster, mention: Any, member_id: str):
+        """`listener.reply_sender`, onto the async poster. Call on the loop."""
+
+        def post_reply(text: str) -> None:
+            async def report_failed_reply(exc: BaseException) -> None:
+                await self.push_card(failed_reply_card(member_id, mention.id, text, exc), member_id)
+
+            poster.submit(text[:280], mention.id, on_failure=report_failed_reply, member=member_id)
+
+        return post_reply
+
+    async def report_lost_reply(self, reply: Reply, exc: BaseException) -> None:
+        """`listener.report_lost_reply`, awaited."""
+        card = failed_reply_card(reply.member, reply.in_reply_to_tweet_id, reply.text, exc)
+        await self.push_card(card, reply.member)
+
+    async def answer_member(self, mention: Any, member: Any, future: Any, merged: MergedReply) -> bool:
+        """`listener.answer_member`, with the member awaited and the card
+        push on the network."""
+        member_id = member.profile.id
+        try:
+            reply = await asyncio.wrap_future(future)
+        except Exception as exc:
+            merged.skip(member_id)
+            print(f"Error from agent {member_id} for mention {mention.id}: {exc}", flush=True)
+            try:
+                await self.push_card(agent_error_card(member_id, mention, exc), member_id)
+                return True
+            except Exception:
+                return False
+
+        item = None
+        if reply.card:
+            try:
+                with timed("push_card", member_id):
+                    item = await self.push_card(reply.card, member_id)
+            except Exception as exc:
+                print(f"Error pushing timeline card for mention {mention.id}: {exc}; will retry", flush=True)
+                merged.skip(member_id)
+                return False
+        if reply.text:
+            merged.add(member_id, reply.text)
+        follow_up = start_reply_follow_up(member, reply, item)
+        if follow_up is not None:
+            merged.add(member_id, await asyncio.wrap_future(follow_up))
+            return True
+        followed = item is not None and run_after_card(
+            reply, item, lambda text: merged.add(member_id, text), lambda: merged.skip(member_id)
+        )
+        if not reply.text and not followed:
+            merged.skip(member_id)
+        return True
+
+    def follow_later(self, poster: AsyncReplyPoster, mention: Any, group: DuplicateGroup) -> None:
+        """`listener.follow_later`, back onto the loop: the group settles on
+        whichever thread its leader or deadline timer is running."""
+        loop = asyncio.get_running_loop()
+
+        async def process_alone() -> None:
+            try:
+                async with self._slots:
+                    if not await self.process_mention(poster, mention, collapse=False):
+                        print(f"Mention {mention.id}, a follower of {group.leader_id}, failed", flush=True)
+            except Exception as exc:
+                print(f"Unexpected error processing mention {mention.id}: {exc}", flush=True)
+
+        def settled(shared: Optional[Tuple[str, Any]]) -> None:
+            def sender_for(member_id: str):
+                return self._on_loop(loop, self.reply_sender(poster, mention, member_id))
+
+            if follow_duplicate(shared, group, sender_for):
+                print(f"Mention {mention.id} answered as a duplicate of {group.leader_id}", flush=True)
+                return
+            task = loop.create_task(process_alone())
+            self._followers.add(task)
+            task.add_done_callback(self._followers.discard)
+
+        group.when_settled(lambda shared: loop.call_soon_threadsafe(settled, shared))
+
+    @staticmethod
+    def _on_loop(loop: asyncio.AbstractEventLoop, post_reply):
+        # Deferred replies arrive on a follow-up thread.
+        return lambda text: loop.call_soon_threadsafe(post_reply, text)
+
+    async def process_mention(self, poster: AsyncReplyPoster, mention: Any, collapse: bool = True) -> bool:
+        """`listener.process_mention`, with Grok in each member's bulkhead
+        and the network awaited."""
+        loop = asyncio.get_running_loop()
+
+        def on_loop(post_reply):
+            return self._on_loop(loop, post_reply)
+
+        context = mention_context(mention)
+        routed = route_members(poster, mention, context)
+        group, leader = claim_duplicate(mention, routed) if collapse else (None, True)
+        if not leader:
+            if not group.settled:
+                # Answered when the leader settles; nothing waits for it here.
+                self.follow_later(poster, mention, group)
+                return True
+            if follow_duplicate(
+                group.shared, group, lambda member_id: on_loop(self.reply_sender(poster, mention, member_id))
+            ):
+                print(f"Mention {mention.id} answered as a duplicate of {group.leader_id}", flush=True)
+                return True
+            group = None
+
+        solo: Tuple[str, Any] = ("", None)
+        try:
+            members = admit_members(
+                mention, routed, lambda member_id: self.reply_sender(poster, mention, member_id)
+            )
+            if not members:
+                return True
+            send = self.reply_sender(poster, mention, members[0].profile.id)
+
+            def post_reply(text: str) -> None:
+                send(text)
+                if group is not None:
+                    group.publish_text(text)
+
+            merged = MergedReply(on_loop(post_reply), [member.profile.id for member in members])
+            # A bot runs inline, on the loop; an agent in its bulkhead.
+            started = start_members(mention, members, context)
+            for member, future in started:
+                if future is None:
+                    merged.skip(member.profile.id)
+            running = [(member, future) for member, future in started if future is not None]
+            # Each card lands as soon as its member is done.
+            outcomes = await asyncio.gather(
+                *(self.answer_member(mention, member, future, merged) for member, future in running)
+            )
+            answered = [member.profile.id for (member, _future), ok in zip(running, outcomes) if ok]
+            incomplete = len(answered) < len(members)
+            if len(members) == 1 and answered:
+                (_member, only), = running
+                if only.exception() is None:
+                    solo = (answered[0], only.result())
+            if incomplete:
+                record_answered(poster, mention, answered)
+            return not incomplete
+        finally:
+            settle_duplicate(group, *solo)
+
+    async def _run_lane(self, poster: AsyncReplyPoster, lane: Sequence[Any]) -> Dict[Any, bool]:
+        results: Dict[Any, bool] = {}
+        for mention in coalesce_lane(lane):
+            try:
+                async with self._slots:
+                    with timed("mention"):
+                        ok = await self.process_mention(poster, mention)
+                if not ok:
+                    STAGE_ERRORS.inc(stage="mention", member="")
+            except Exception as exc:
+                print(f"Unexpected error processing mention {mention.id}: {exc}", flush=True)
+                ok = False
+            results.update(lane_results(mention, ok))
+            if not ok:
+                break
+        return results
+
+    async def process_page(
+        self, poster: AsyncReplyPoster, page: Sequence[Any], completed: Dict[Any, Any]
+    ) -> Tuple[Optional[Any], BatchResult]:
+        """`listener.process_page`: conversations concurrently, each in order."""
+        ordered, pending = split_page(page, completed)
+        lanes: Dict[Any, List[Any]] = {}
+        for mention in pending.values():
+            lanes.setdefault(_conversation_key(mention), []).append(mention)
+        results: Dict[Any, bool] = {}
+        # Lanes take in-flight slots in the order they ask for them, so
+        # asking most urgent first gives lane_queue's priority order. A page's
+        # lanes all ask at once; there is no later arrival to age against.
+        ordered_lanes = sorted(lanes.values(), key=lane_priority)
+        for lane_results in await asyncio.gather(*(self._run_lane(poster, lane) for lane in ordered_lanes)):
+            results.update(lane_results)
+        return settle_page(ordered, pending, results, completed)
+
+
+async def poll_account(
+    pipeline: AsyncPipeline,
+    client: Any,
+    cursor: MentionCursor,
+    *,
+    scheduler: Optional[PollScheduler] = None,
+    poster: Optional[AsyncReplyPoster] = None,
+    account: Optional[str] = None,
+    me: Any = None,
+    stop: Optional[asyncio.Event] = None,
+) -> None:
+    """The polling loop of `mention_sources.PollingSource`, for one account.
+
+    `me` is the account's X user, looked up when not given. A tweepy
+    AsyncClient without a session of its own gets one traced for X's
+    rate-limit headers (`rate_limit_trace`), closed when the loop ends."""
+    me = me or await authenticated_user(client)
+    scheduler = scheduler or PollScheduler()
+    # As listener.Account: with an `account`, replies persist under its name.
+    if poster is None:
+        poster = AsyncReplyPoster(client, account=account, on_failure=pipeline.report_lost_reply).start()
+    stop = stop or asyncio.Event()
+    session = None
+    if getattr(client, "session", False) is None:
+        import aiohttp
+
+        session = aiohttp.ClientSession(trace_configs=[rate_limit_trace(scheduler, poster.bucket)])
+        client.session = session
+    try:
+        await _poll(pipeline, client, cursor, me, scheduler, poster, stop)
+    finally:
+        if session is not None:
+            client.session = None
+            await session.close()
+
+
+async def _poll(
+    pipeline: AsyncPipeline,
+    client: Any,
+    cursor: MentionCursor,
+    me: Any,
+    scheduler: PollScheduler,
+    poster: AsyncReplyPoster,
+    stop: asyncio.Event,
+) -> None:
+
+    async def wait(seconds: float) -> None:
+        try:
+            await asyncio.wait_for(stop.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    while not stop.is_set():
+        try:
+            pages, _truncated = await fetch_mention_pages_async(
+                client, me.id, start_time=cursor.start_time, since_id=cursor.since_id
+            )
+        except TweepyHTTPException as exc:
+            if _status(exc) == 402:
+                print(
+                    f"X API returned 402 Payment Required. Backing off for {PAYMENT_REQUIRED_BACKOFF_SECONDS}s.",
+                    flush=True,
+                )
+                await wait(PAYMENT_REQUIRED_BACKOFF_SECONDS)
+            else:
+                print(f"X API error fetching mentions: {exc}", flush=True)
+                await wait(POLL_SECONDS)
+            continue
+        except Exception as exc:
+            print(f"Unexpected error fetching mentions: {exc}", flush=True)
+            await wait(POLL_SECONDS)
+            continue
+
+        worked = 0
+        for page in pages:
+            await prefetch_async(client, [m for m in page if m.id not in cursor.completed])
+            mark, result = await pipeline.process_page(poster, page, cursor.completed)
+            if mark is not None:
+                cursor.advance(mark)
+            worked += result.worked
+            if not result.done:
+                break
+        scheduler.record_poll(worked)
+        await wait(scheduler.next_delay())
+
+
+async def run(credentials: Sequence[Dict[str, str]]) -> None:
+    register_team()
+    # Every mention in flight may be pushing a card at once.
+    size_timeline_pools(ASYNC_MAX_IN_FLIGHT)
+    timeline = AsyncTimelineClient()
+    pipeline = AsyncPipeline(timeline)
+
+    started: List[str] = []
+
+    async def serve(account: Dict[str, str]) -> None:
+        # As listener.start_accounts: an account that cannot start is
+        # logged and left out, and the others keep running. So do they
+        # when one stops later, as an account thread does.
+        name = account.get("name", "")
+        try:
+            client = build_async_client(account)
+            me = await authenticated_user(client)
+        except Exception as exc:
+            print(f"Listener account {name!r} could not start: {exc}; skipping it", flush=True)
+            raise
+        started.append(name)
+        try:
+            cursor = MentionCursor.load(last_seen_path(name))
+            await poll_account(pipeline, client, cursor, account=name, me=me)
+        except Exception as exc:
+            print(f"Listener account {name!r} stopped: {exc}", flush=True)
+            raise
+
+    try:
+        results = await asyncio.gather(*(serve(account) for account in credentials), return_exceptions=True)
+        failures = [result for result in results if isinstance(result, Exception)]
+        if not started:
+            raise RuntimeError("No listener account could start") from failures[0]
+        if len(failures) == len(results):
+            raise RuntimeError("Every listener account stopped") from failures[-1]
+    finally:
+        await timeline.aclose()
+
+
+def main() -> None:
+    """Entry point from `listener.main` when LISTENER_MODE=async."""
+    if LISTENER_QUEUE:
+        raise RuntimeError("LISTENER_MODE=async does not support LISTENER_QUEUE")
+    if os.getenv("LISTENER_SOURCE", "poll").strip().lower() != "poll":
+        raise RuntimeError("LISTENER_MODE=async needs LISTENER_SOURCE=poll")
+    asyncio.run(run(load_accounts()))
@@ -0,0 +1,160 @@
+"""Wake A2A inbox readers when a message lands, instead of having them poll.
+
+The dispatcher used to sleep five seconds between inbox reads, so an
+approval waited up to five seconds before it executed and an idle inbox
+still cost the database a query every five seconds. A reader can now
+long-poll (`a2a_store.wait_for_messages`): it reads, and when nothing is
+past its cursor it blocks here until `add_message` reports a message for
+that agent or its timeout runs out.
+
+Two wakeup paths:
+
+- In-process: `add_message` calls `WAITERS.notify` once its transaction
+  commits, which covers a single timeline server on any backend.
+- Across processes: on Postgres, `add_message` also sends a NOTIFY on
+  `CHANNEL` inside its transaction (Postgres delivers it on commit), and a
+  LISTEN thread per process turns each one into a local `notify`. SQLite has
+  no such channel, so a waiter there re-reads every A2A_WAIT_POLL_SECONDS
+  to pick up messages written by other processes.
+
+A wakeup only says "look again"; the reader always re-reads the inbox, so a
+spurious or early wakeup costs one query, never a wrong answer.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import Connection, Engine
+
+from storage_db import get_engine
+
+# Upper bound on one long-poll request; longer waits are clamped.
+WAIT_MAX_SECONDS = max(0.0, float(os.getenv("A2A_WAIT_MAX_SECONDS", "30")))
+# How often a waiter re-reads when cross-process wakeups are unavailable
+# (SQLite, or Postgres while the LISTEN connection is down).
+WAIT_POLL_SECONDS = max(0.05, float(os.getenv("A2A_WAIT_POLL_SECONDS", "1")))
+CHANNEL = "a2a_inbox"
+_RECONNECT_MAX_SECONDS = 30.0
+
+
+class InboxWaiters:
+    """Threads blocked on an agent's inbox.
+
+    Each agent has a counter that every `notify` bumps. A reader takes the
+    counter (`version`) *before* it reads the inbox and waits for it to
+    move, so a message that lands between the read and the wait still wakes
+    it instead of being missed until the timeout.
+    """
+
+    def __init__(self) -> None:
+        self._versions: Dict[str, int] = {}
+        self._changed = threading.Condition()
+
+    def version(self, agent_id: str) -> int:
+        with self._changed:
+            # Registered even before its first message, so notify_all reaches it.
+            return self._versions.setdefault(agent_id, 0)
+
+    def notify(self, agent_id: str) -> None:
+        with self._changed:
+            self._versions[agent_id] = self._versions.get(agent_id, 0) + 1
+            self._changed.notify_all()
+
+    def notify_all(self) -> None:
+        """Wake every waiter, e.g. after wakeups may have been lost."""
+        with self._changed:
+            for agent_id in self._versions:
+                self._versions[agent_id] += 1
+            self._changed.notify_all()
+
+    def wait(self, agent_id: str, seen: int, timeout: float) -> bool:
+        """Block until `agent_id`'s version moves past `seen` or `timeout`
+        seconds pass. Whether it moved."""
+        with self._changed:
+            moved = lambda: self._versions.get(agent_id, 0) != seen  # noqa: E731
+            return self._changed.wait_for(moved, max(0.0, timeout))
+
+
+WAITERS = InboxWaiters()
+
+
+def announce(conn: Connection, agent_id: str) -> None:
+    """Tell other processes that `agent_id` has mail, as part of `conn`'s
+    transaction. Postgres holds the NOTIFY until commit and drops it on
+    rollback; other backends have no channel, and their waiters poll."""
+    if conn.dialect.name == "postgresql":
+        conn.execute(select(func.pg_notify(CHANNEL, agent_id)))
+
+
+class InboxListener(threading.Thread):
+    """LISTENs on `CHANNEL` and turns each NOTIFY into a local wakeup.
+
+    Runs on its own connection, detached from the pool so it never holds a
+    slot other queries need. When the connection drops it reconnects with
+    backoff. It wakes every waiter both when it drops and when it is back:
+    NOTIFYs sent meanwhile are gone, and only a re-read finds their messages.
+    """
+
+    def __init__(self, engine: Engine, waiters: InboxWaiters):
+        super().__init__(name="a2a-inbox-listener", daemon=True)
+        self.engine = engine
+        self.waiters = waiters
+        self.connected = threading.Event()
+
+    def run(self) -> None:
+        delay = 1.0
+        while True:
+            raw = None
+            try:
+                raw = self.engine.raw_connection()
+                raw.detach()
+                driver = raw.driver_connection
+                driver.autocommit = True
+                driver.execute(f"LISTEN {CHANNEL}")
+                self.connected.set()
+                self.waiters.notify_all()
+                delay = 1.0
+                for notification in driver.notifies():
+                    self.waiters.notify(notification.payload)
+            except Exception as exc:
+                print(f"A2A inbox listener disconnected: {exc}", flush=True)
+            finally:
+                # Waiters parked on the strength of this connection fall back
+                # to short polling until it is back.
+                self.connected.clear()
+                self.waiters.notify_all()
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+            time.sleep(delay)
+            delay = min(delay * 2, _RECONNECT_MAX_SECONDS)
+
+
+_LISTENER: Optional[InboxListener] = None
+_LISTENER_LOCK = threading.Lock()
+
+
+def poll_interval() -> float:
+    """How long a waiter may sleep before it must re-read on its own.
+
+    Starts the LISTEN thread on first use against Postgres. While it is
+    connected every commit reaches this process as a wakeup, so only the
+    request's own timeout bounds the wait; otherwise this is the short-poll
+    interval.
+    """
+    global _LISTENER
+
+    engine = get_engine()
+    if engine.dialect.name != "postgresql":
+        return WAIT_POLL_SECONDS
+    with _LISTENER_LOCK:
+        if _LISTENER is None or _LISTENER.engine is not engine:
+            _LISTENER = InboxListener(engine, WAITERS)
+            _LISTENER.start()
+        listener = _LISTENER
+    return WAIT_MAX_SECONDS if listener.connected.is_set() else WAIT_POLL_SECONDS
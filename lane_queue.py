@@ -0,0 +1,89 @@
+"""Priority order for the threaded listener's conversation lanes.
+
+Lanes used to reach the mention threads in `created_at` order, so during a
+backlog a trade proposal waited behind every chit-chat mention fetched
+before it. `process_batch` now puts its lanes here, ranked after routing
+(see agents.base PRIORITY_*: approval-gated members first, bots next,
+general chit-chat last), and each mention thread takes the most urgent
+lane waiting. One queue serves every account in the process.
+
+Aging keeps low priorities moving: a lane's rank improves by one level for
+every LISTENER_PRIORITY_AGING_SECONDS it has waited, so under sustained
+approval traffic a general lane still runs within a bounded delay, while a
+fresh trade proposal never waits for more than the lanes already running.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from agents.base import PRIORITY_AGENT, PRIORITY_APPROVAL, PRIORITY_BOT, PRIORITY_GENERAL
+from metrics import collected, histogram
+
+PRIORITY_AGING_SECONDS = max(0.001, float(os.getenv("LISTENER_PRIORITY_AGING_SECONDS", "30")))
+
+PRIORITY_LABELS = {
+    PRIORITY_APPROVAL: "approval",
+    PRIORITY_BOT: "bot",
+    PRIORITY_AGENT: "agent",
+    PRIORITY_GENERAL: "general",
+}
+
+
+def priority_label(priority: int) -> str:
+    return PRIORITY_LABELS.get(priority, str(priority))
+
+
+class LaneQueue:
+    """FIFO per priority level; `get` takes the head with the best aged rank."""
+
+    def __init__(
+        self, aging_seconds: float = PRIORITY_AGING_SECONDS, clock: Callable[[], float] = time.monotonic
+    ):
+        self.aging_seconds = max(0.001, aging_seconds)
+        self._clock = clock
+        self._levels: Dict[int, Deque[Tuple[float, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def put(self, priority: int, task: Any) -> None:
+        with self._lock:
+            self._levels.setdefault(priority, deque()).append((self._clock(), task))
+
+    def get(self) -> Optional[Any]:
+        """The next task, or None when nothing is waiting."""
+        with self._lock:
+            now = self._clock()
+            best: Optional[Tuple[float, int]] = None
+            for priority, waiting in self._levels.items():
+                if waiting:
+                    rank = (priority - (now - waiting[0][0]) / self.aging_seconds, priority)
+                    if best is None or rank < best:
+                        best = rank
+            if best is None:
+                return None
+            priority = best[1]
+            queued_at, task = self._levels[priority].popleft()
+        WAIT_SECONDS.observe(now - queued_at, priority=priority_label(priority))
+        return task
+
+    def depths(self) -> Dict[int, int]:
+        with self._lock:
+            return {priority: len(waiting) for priority, waiting in self._levels.items()}
+
+
+LANES = LaneQueue()
+
+
+def _depths() -> List[Tuple[Dict[str, object], float]]:
+    depths = dict.fromkeys(PRIORITY_LABELS, 0)
+    depths.update(LANES.depths())
+    return [({"priority": priority_label(priority)}, count) for priority, count in sorted(depths.items())]
+
+
+WAIT_SECONDS = histogram(
+    "listener_lane_wait_seconds",
+    "Time a conversation lane waited for a mention thread, by priority.",
+)
+collected("listener_lanes_queued", "Conversation lanes waiting for a mention thread, by priority.", _depths)
@@ -1,20 +1,105 @@
+import json
 import os
+import socket
+import threading
 import time
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Deque, Dict, List, Mapping, Optional, Sequence, Tuple
 
-import requests
 import tweepy
 from dotenv import load_dotenv
-from tweepy.errors import HTTPException as TweepyHTTPException
 
-from agents.base import MentionContext, build_card, text_block, timeline_headers
-from agents.registry import register_team, route_mention
+from admission import ADMISSION_ENABLED, THROTTLED_REPLY, AuthorAdmission
+from agents.base import MentionContext, build_card, member_priority, merge_replies, run_after_card, text_block
+from agents.bulkhead import BulkheadFull, follow_in_lane, submit_mention, team_capacity
+from agents.cache import TTLCache
+from agents.registry import get_team, register_team, route_mention
+from lane_queue import LANES
+from mention_dedupe import DEDUPE_WINDOW_SECONDS, DuplicateGroup, NearDuplicateIndex
+from mention_sources import BatchResult, build_mention_source
+from mention_store import (
+    claim_mentions,
+    complete_mention,
+    defer_mention,
+    hold_lease,
+    record_mention,
+    release_mention,
+)
+from metrics import STAGE_ERRORS, STAGE_SECONDS, counter, timed
+from poll_scheduler import PollScheduler
+from reply_queue import get_reply_poster
+from thread_context import prefetch, thread_for
+from timeline_client import get_timeline_client, size_timeline_pools
 
 LAST_SEEN_PATH = Path(os.getenv("XMCP_LAST_SEEN_PATH", "~/.xmcp/last_seen.txt")).expanduser()
-POLL_SECONDS = int(os.getenv("POLL_INTERVAL_SECONDS", "60"))
-PAYMENT_REQUIRED_BACKOFF_SECONDS = int(os.getenv("X_PAYMENT_REQUIRED_BACKOFF_SECONDS", "900"))
+# Mention threads beyond what the members' bulkheads can hold
+# (agents/bulkhead.py): agent calls never occupy these, so bots and card and
+# reply work always have them. Grok concurrency is bounded per member.
+LISTENER_WORKERS = max(1, int(os.getenv("LISTENER_WORKERS", "4")))
+# Delay before a mention shed by a full bulkhead is claimed again (queue mode).
+BULKHEAD_RETRY_SECONDS = float(os.getenv("BULKHEAD_RETRY_SECONDS", "5"))
+# The mentions endpoint's page-size ceiling. Every poll asks for a full page,
+# so a backlog is visible as a next_token rather than silently truncated.
+MENTIONS_PAGE_SIZE = 100
+# Pages held while catching up. X only serves the ~800 most recent mentions,
+# so the default holds everything it will return; a lower value trades
+# memory for re-walking the newest pages on the next cycle.
+CATCHUP_MAX_PAGES = max(1, int(os.getenv("CATCHUP_MAX_PAGES", "8")))
+MENTION_TWEET_FIELDS = ["conversation_id", "created_at", "author_id", "text", "referenced_tweets"]
+# "sql" hands mentions to the durable work queue in the `mentions` table
+# (see mention_store) so several listener replicas can share them; empty
+# processes them in this process, as before.
+LISTENER_QUEUE = os.getenv("LISTENER_QUEUE", "").strip().lower()
+# With the queue on, "0" makes this replica a pure worker that only claims
+# from the queue, leaving the X mention source to another replica.
+LISTENER_INGEST = os.getenv("LISTENER_INGEST", "1").strip() != "0"
+# How long an idle queue worker waits before claiming again.
+QUEUE_IDLE_SECONDS = float(os.getenv("LISTENER_QUEUE_IDLE_SECONDS", "1"))
+# Near-duplicate mentions from different authors collapse into one member
+# call (see mention_dedupe). Shared by every account this process serves.
+DUPLICATES: Optional[NearDuplicateIndex] = NearDuplicateIndex() if DEDUPE_WINDOW_SECONDS > 0 else None
+# How soon a queued follower whose leader is still running is claimed
+# again; it is never held on a worker thread meanwhile.
+DEDUPE_RECHECK_SECONDS = 2.0
+DUPLICATES_COLLAPSED = counter(
+    "listener_duplicates_collapsed_total",
+    "Mentions answered with a near-duplicate's reply instead of a member call.",
+)
+# Per-author token buckets, by member kind (see admission).
+ADMISSION: Optional[AuthorAdmission] = AuthorAdmission() if ADMISSION_ENABLED else None
+THROTTLED = counter(
+    "listener_throttled_total",
+    "Mentions refused by per-author admission control, by member kind and outcome.",
+)
+# Mentions one author sends in a thread within this many seconds of each
+# other's first, tagging the same members, reach them as one (see
+# coalesce_lane). 0 answers every mention on its own.
+COALESCE_WINDOW_SECONDS = float(os.getenv("LISTENER_COALESCE_SECONDS", "10"))
+COALESCED = counter(
+    "listener_mentions_coalesced_total",
+    "Mentions answered together with an earlier one in their conversation, by member.",
+)
+# Members that already answered a mention whose other members must be
+# retried, so the retry doesn't push their cards twice. Keyed by (client,
+# mention id): one post can mention several of our accounts. In-process, so
+# a retry claimed by another queue replica runs every member again.
+ANSWERED = TTLCache("answered_members", 3600, max_entries=4096)
+
+
+class MentionDeferred(Exception):
+    """Raised by `process_mention(defer_throttled=True)` for a mention whose
+    author is over budget, whose member is at capacity, or whose
+    near-duplicate leader is still running; retry it after `delay` seconds."""
+
+    def __init__(self, delay: float, reason: str = "author rate limited"):
+        super().__init__(f"{reason} for {delay:.0f}s")
+        self.delay = delay
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
 
 
 def load_env() -> None:
@@ -23,35 +108,82 @@ def load_env() -> None:
         load_dotenv(env_path)
 
 
-def save_last_seen(value: str) -> None:
-    LAST_SEEN_PATH.parent.mkdir(parents=True, exist_ok=True)
-    LAST_SEEN_PATH.write_text(value, encoding="utf-8")
+def save_last_seen(value: str, path: Path = LAST_SEEN_PATH) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(value, encoding="utf-8")
 
 
-def load_last_seen() -> Optional[str]:
-    if not LAST_SEEN_PATH.exists():
+def load_last_seen(path: Path = LAST_SEEN_PATH) -> Optional[str]:
+    if not path.exists():
         return None
-    return LAST_SEEN_PATH.read_text(encoding="utf-8").strip() or None
+    return path.read_text(encoding="utf-8").strip() or None
+
+
+def last_seen_path(account: str = "") -> Path:
+    """Each account's watermark file, beside the default one."""
+    if not account:
+        return LAST_SEEN_PATH
+    return LAST_SEEN_PATH.with_name(f"{LAST_SEEN_PATH.stem}.{account}{LAST_SEEN_PATH.suffix}")
 
 
-def build_client() -> tweepy.Client:
-    access_token = os.getenv("X_ACCESS_TOKEN") or os.getenv("X_OAUTH_ACCESS_TOKEN")
-    access_secret = os.getenv("X_ACCESS_SECRET") or os.getenv("X_OAUTH_ACCESS_TOKEN_SECRET")
+def load_accounts() -> List[Dict[str, str]]:
+    """The bot accounts to serve, as credential sets.
+
+    X_ACCOUNTS_FILE (a path) or X_ACCOUNTS holds a JSON list of objects with
+    a unique `name` and the account's `access_token` / `access_secret`.
+    `api_key`, `api_secret` and `bearer_token` default to X_API_KEY,
+    X_API_SECRET and X_BEARER_TOKEN -- accounts authorized through one app
+    share those. Without either variable this is the single account the
+    X_* variables describe, under the empty name.
+    """
+    raw = os.getenv("X_ACCOUNTS", "").strip()
+    accounts_file = os.getenv("X_ACCOUNTS_FILE", "").strip()
+    if accounts_file:
+        raw = Path(accounts_file).expanduser().read_text(encoding="utf-8")
+    if not raw:
+        return [{"name": ""}]
+    try:
+        accounts = json.loads(raw)
+    except ValueError as exc:
+        raise RuntimeError(f"X_ACCOUNTS is not valid JSON: {exc}") from exc
+    if not isinstance(accounts, list) or not accounts:
+        raise RuntimeError("X_ACCOUNTS must be a non-empty JSON list of credential sets")
+    names = set()
+    for account in accounts:
+        name = str(account.get("name", "")).strip() if isinstance(account, dict) else ""
+        if not name or "/" in name or name in names:
+            raise RuntimeError("Every X_ACCOUNTS entry needs a unique `name` without '/'")
+        if not account.get("access_token") or not account.get("access_secret"):
+            raise RuntimeError(f"X_ACCOUNTS entry {name!r} needs access_token and access_secret")
+        names.add(name)
+        account["name"] = name
+    return accounts
+
+
+def build_client(account: Optional[Dict[str, str]] = None) -> tweepy.Client:
+    account = account or {}
+    access_token = (
+        account.get("access_token") or os.getenv("X_ACCESS_TOKEN") or os.getenv("X_OAUTH_ACCESS_TOKEN")
+    )
+    access_secret = (
+        account.get("access_secret")
+        or os.getenv("X_ACCESS_SECRET")
+        or os.getenv("X_OAUTH_ACCESS_TOKEN_SECRET")
+    )
     return tweepy.Client(
-        bearer_token=os.getenv("X_BEARER_TOKEN"),
-        consumer_key=os.getenv("X_API_KEY"),
-        consumer_secret=os.getenv("X_API_SECRET"),
+        bearer_token=account.get("bearer_token") or os.getenv("X_BEARER_TOKEN"),
+        consumer_key=account.get("api_key") or os.getenv("X_API_KEY"),
+        consumer_secret=account.get("api_secret") or os.getenv("X_API_SECRET"),
         access_token=access_token,
         access_token_secret=access_secret,
         wait_on_rate_limit=True,
     )
 
 
-def push_timeline_card(card: dict, posted_by: str) -> None:
-    timeline_url = os.getenv("TIMELINE_API_URL", "http://127.0.0.1:8080")
-    user_id = os.getenv("TIMELINE_USER_ID", "default")
-    payload = {
-        "user_id": user_id,
+def card_payload(card: dict, posted_by: str) -> Dict[str, Any]:
+    """The timeline API body that pushes `card`."""
+    return {
+        "user_id": os.getenv("TIMELINE_USER_ID", "default"),
         "title": card.get("title", "Untitled"),
         "body": card.get("body", ""),
         "blocks": card.get("blocks", []),
@@ -59,170 +191,1002 @@ def push_timeline_card(card: dict, posted_by: str) -> None:
         "actions": card.get("actions", []),
         "metadata": card.get("metadata", {}),
     }
-    response = requests.post(
-        f"{timeline_url}/v1/timeline/items",
-        json=payload,
-        headers=timeline_headers(),
-        timeout=10,
+
+
+def push_timeline_card(card: dict, posted_by: str) -> Dict[str, Any]:
+    """Push `card`, returning the created timeline item."""
+    response = get_timeline_client().post(
+        "/v1/timeline/items", op="push_card", json=card_payload(card, posted_by)
     )
     # Surface 4xx/5xx as failures so the caller holds the watermark and
     # retries — a lost card would silently defeat the approval gate.
     response.raise_for_status()
+    return response.json()
 
 
-def process_mention(client: tweepy.Client, mention) -> bool:
-    """Route one mention to its team member and deliver the results.
-
-    Returns False when the approval card could not be pushed — the caller
-    must then NOT advance the last-seen watermark, so the mention is
-    retried next poll instead of its approval-gated proposal being lost.
-    The card is pushed before the X reply for the same reason: the card is
-    the safety-critical artifact.
-    """
-    context = MentionContext(
+def mention_context(mention) -> MentionContext:
+    return MentionContext(
         text=mention.text,
         mention_id=mention.id,
         author_id=mention.author_id,
         conversation_id=mention.conversation_id,
+        thread=thread_for(mention),
     )
-    member = route_mention(context)
-    print(
-        f"Mention {mention.id} routed to {member.profile.id} ({member.profile.kind})",
-        flush=True,
+
+
+def agent_error_card(member_id: str, mention, exc: BaseException) -> dict:
+    return build_card(
+        title=f"Agent error on mention {mention.id}",
+        blocks=[
+            text_block(f"{member_id} failed: {exc}", label="Error"),
+            text_block(mention.text, label="Mention"),
+        ],
+        metadata={"agent_id": member_id, "mention_id": mention.id, "error": str(exc)},
     )
+
+
+def failed_reply_card(member_id: str, mention_id: Any, reply_text: str, exc: BaseException) -> dict:
+    return build_card(
+        title=f"Failed to post reply to mention {mention_id}",
+        blocks=[
+            text_block(reply_text, label="Intended reply"),
+            text_block(str(exc), label="Error"),
+        ],
+        metadata={"agent_id": member_id, "mention_id": mention_id, "error": str(exc)},
+    )
+
+
+def reply_sender(client: tweepy.Client, mention, member_id: str) -> Callable[[str], None]:
+    """Queue a reply to `mention`, reporting a dropped one on the timeline."""
+
+    def post_reply(text: str) -> None:
+        def report_failed_reply(exc: BaseException) -> None:
+            # Surface the dropped reply on the timeline so an operator can
+            # recover it. The mention is not retried — its card (and any side
+            # effects) already landed, and a reply-only mention was accepted
+            # the moment it was queued (and persisted; see reply_store).
+            push_timeline_card(failed_reply_card(member_id, mention.id, text, exc), posted_by=member_id)
+
+        # Posting runs on its own rate-limited queue, so a posting 429 no longer
+        # stalls routing and card pushes for every other mention.
+        get_reply_poster(client).submit(text[:280], mention.id, on_failure=report_failed_reply, member=member_id)
+
+    return post_reply
+
+
+def report_lost_reply(reply: Any, exc: BaseException) -> None:
+    """The failed-reply card for a reply adopted from a stopped listener,
+    which has lost its own hook."""
+    card = failed_reply_card(reply.member, reply.in_reply_to_tweet_id, reply.text, exc)
+    push_timeline_card(card, posted_by=reply.member)
+
+
+def claim_duplicate(mention, members: Sequence[Any]) -> Tuple[Optional[DuplicateGroup], bool]:
+    """The near-duplicate group `mention` joins, and whether it leads it.
+
+    Only a mention routed to one member whose reply may be shared
+    (`AgentProfile.share_replies`) takes part: anything else would fail its
+    group, leaving every follower to wait on it and then make its own call
+    anyway. (None, True) otherwise, and with collapsing off."""
+    if DUPLICATES is None or len(members) != 1 or not getattr(members[0].profile, "share_replies", False):
+        return None, True
+    return DUPLICATES.claim(mention.text or "", mention.author_id, mention.id)
+
+
+def follow_duplicate(shared: Optional[Tuple[str, Any]], group: DuplicateGroup, post_reply_for) -> bool:
+    """Answer a follower with its leader's shared reply. False when there is
+    none and the follower must be processed on its own."""
+    if shared is None:
+        return False
+    member_id, reply = shared
+    post_reply = post_reply_for(member_id)
+    if reply.text:
+        post_reply(reply.text)
+    elif reply.after_card is not None:
+        group.on_text(post_reply)
+    DUPLICATES_COLLAPSED.inc(member=member_id)
+    return True
+
+
+# Followers whose leader failed or ran out of time, processed on their own
+# off the thread that settled the group. Created on first use.
+_FOLLOWERS: Optional[ThreadPoolExecutor] = None
+_FOLLOWERS_LOCK = threading.Lock()
+
+
+def _follower_pool() -> ThreadPoolExecutor:
+    global _FOLLOWERS
+    with _FOLLOWERS_LOCK:
+        if _FOLLOWERS is None:
+            _FOLLOWERS = ThreadPoolExecutor(max_workers=LISTENER_WORKERS, thread_name_prefix="follower")
+        return _FOLLOWERS
+
+
+def follow_later(client: tweepy.Client, mention, group: DuplicateGroup) -> None:
+    """Answer a follower once its group settles, holding no thread until
+    then: with the leader's reply, or else by processing it on its own on
+    the follower pool."""
+
+    def process_alone() -> None:
+        try:
+            if not process_mention(client, mention, collapse=False):
+                print(f"Mention {mention.id}, a follower of {group.leader_id}, failed", flush=True)
+        except Exception as exc:
+            print(f"Unexpected error processing mention {mention.id}: {exc}", flush=True)
+
+    def settled(shared: Optional[Tuple[str, Any]]) -> None:
+        if follow_duplicate(shared, group, lambda member_id: reply_sender(client, mention, member_id)):
+            print(f"Mention {mention.id} answered as a duplicate of {group.leader_id}", flush=True)
+        else:
+            _follower_pool().submit(process_alone)
+
+    group.when_settled(settled)
+
+
+def settle_duplicate(group: Optional[DuplicateGroup], member_id: str, reply) -> None:
+    """Offer a leader's reply to its followers. A card with actions is an
+    approval gate for one author's request, so those are never shared."""
+    if group is None:
+        return
+    if reply is not None and not (reply.card and reply.card.get("actions")):
+        group.share(member_id, reply)
+    else:
+        group.fail()
+
+
+def throttle(mention, member, post_reply: Callable[[str], None], defer: bool = False) -> bool:
+    """Apply per-author admission to a routed mention. True when it was
+    refused (and answered, deferred or dropped) and must not reach the
+    member."""
+    if ADMISSION is None:
+        return False
+    admission = ADMISSION.admit(mention.author_id, member.profile.kind)
+    if admission.admitted:
+        return False
+    if defer:
+        THROTTLED.inc(kind=member.profile.kind, outcome="deferred")
+        raise MentionDeferred(admission.wait)
+    print(f"Mention {mention.id} from author {mention.author_id} throttled", flush=True)
+    # One canned reply per run of refusals; answering every one would spend
+    # our posting limit on the author who is flooding us.
+    if admission.notify:
+        THROTTLED.inc(kind=member.profile.kind, outcome="replied")
+        post_reply(THROTTLED_REPLY)
+    else:
+        THROTTLED.inc(kind=member.profile.kind, outcome="dropped")
+    return True
+
+
+class MergedReply:
+    """The one X reply for every member answering a mention.
+
+    Each member reports once, with `add` (its reply text, possibly produced
+    by after-card work finishing later) or `skip` (it has none). The merged
+    reply is posted when the last member has reported; text arriving after
+    that is posted on its own, as a lone member's late reply always was.
+    """
+
+    def __init__(self, post: Callable[[str], None], member_ids: Sequence[str]):
+        self._post = post
+        self._order = list(member_ids)
+        self._parts: Dict[str, Optional[str]] = {}
+        self._posted = False
+        self._lock = threading.Lock()
+
+    def add(self, member_id: str, text: Optional[str]) -> None:
+        with self._lock:
+            if self._posted or member_id in self._parts:
+                message = text
+            else:
+                self._parts[member_id] = text
+                if len(self._parts) < len(self._order):
+                    return
+                self._posted = True
+                message = merge_replies([self._parts[m] or "" for m in self._order])
+        if message:
+            self._post(message)
+
+    def skip(self, member_id: str) -> None:
+        self.add(member_id, None)
+
+
+def _answered_key(client: Any, mention) -> Tuple[int, Any]:
+    # Clients live as long as the process, one per account.
+    return id(client), mention.id
+
+
+def route_members(client: Any, mention, context: MentionContext) -> List[Any]:
+    """The members that still have to answer `mention`: every one it tags,
+    less those that answered an earlier attempt."""
+    answered = ANSWERED.peek(_answered_key(client, mention)) or frozenset()
+    with timed("route") as labels:
+        members = [member for member in route_mention(context) if member.profile.id not in answered]
+        labels["member"] = members[0].profile.id if members else ""
+    for member in members:
+        print(f"Mention {mention.id} routed to {member.profile.id} ({member.profile.kind})", flush=True)
+    return members
+
+
+def admit_members(mention, members: Sequence[Any], sender_for, defer: bool = False) -> List[Any]:
+    """The routed members its author has admission budget left for.
+    `sender_for(member_id)` posts a canned throttle reply."""
+    admitted: List[Any] = []
+    try:
+        for member in members:
+            if not throttle(mention, member, sender_for(member.profile.id), defer):
+                admitted.append(member)
+    except MentionDeferred:
+        # Nobody runs this attempt, so the members admitted so far must not
+        # have charged the author for it.
+        refund_admission(mention, admitted)
+        raise
+    return admitted
+
+
+def refund_admission(mention, members: Sequence[Any]) -> None:
+    """Return the admission tokens `members` took for a `mention` they did
+    not get to handle."""
+    if ADMISSION is None:
+        return
+    for member in members:
+        ADMISSION.refund(mention.author_id, member.profile.kind)
+
+
+def start_members(
+    mention, members: Sequence[Any], context: MentionContext
+) -> List[Tuple[Any, Optional[Future]]]:
+    """Start every member's `handle_mention` in its own lane at once, so the
+    mention takes as long as its slowest member. A member whose bulkhead is
+    full gets no future: it is shed, to be retried later."""
+    started = []
+    for member in members:
+        member_id = member.profile.id
+        began = time.monotonic()
+        try:
+            future = submit_mention(member, context)
+        except BulkheadFull as exc:
+            print(f"Mention {mention.id}: {exc}; will retry", flush=True)
+            STAGE_ERRORS.inc(stage="handle", member=member_id)
+            # The retry is charged instead; a mention shed on every poll
+            # must not use up its author's budget without ever running.
+            refund_admission(mention, [member])
+            started.append((member, None))
+            continue
+
+        def observe(done: Future, member_id: str = member_id, began: float = began) -> None:
+            # The "handle" stage, timed from submission as it always was.
+            STAGE_SECONDS.observe(time.monotonic() - began, stage="handle", member=member_id)
+            if done.exception() is not None:
+                STAGE_ERRORS.inc(stage="handle", member=member_id)
+
+        future.add_done_callback(observe)
+        started.append((member, future))
+    return started
+
+
+def record_answered(client: Any, mention, answered: Sequence[str]) -> None:
+    """Remember the members that answered a mention due for a retry."""
+    if answered:
+        key = _answered_key(client, mention)
+        ANSWERED.put(key, frozenset(answered) | (ANSWERED.peek(key) or frozenset()))
+
+
+def start_reply_follow_up(member, reply, item: Optional[Dict[str, Any]]) -> Optional[Future]:
+    """Start the follow-up that writes `member`'s reply (an `after_card`
+    with no reply text), in the member's own lane; it resolves to the reply
+    text, or None if it failed. None when the reply has no such follow-up.
+
+    The caller waits for it, once every member's card is pushed: the
+    mention is finished only once its reply is queued, so a crash mid-brief
+    retries the mention instead of losing the reply."""
+    if item is None or not item.get("id") or reply.text or reply.after_card is None:
+        return None
+    member_id = member.profile.id
+    began = time.monotonic()
+
+    def follow_up() -> Optional[str]:
+        try:
+            return reply.after_card(item)
+        except Exception as exc:
+            print(f"Follow-up for timeline card {item.get('id')} failed: {exc}", flush=True)
+            STAGE_ERRORS.inc(stage="after_card", member=member_id)
+            return None
+        finally:
+            STAGE_SECONDS.observe(time.monotonic() - began, stage="after_card", member=member_id)
+
+    return follow_in_lane(member, follow_up)
+
+
+def answer_member(
+    mention, member, future: Future, merged: MergedReply, follow_ups: List[Tuple[str, Future]]
+) -> bool:
+    """Deliver one member's answer: its card (or the agent error card), then
+    its part of the merged reply. A reply still being written after the card
+    is appended to `follow_ups` as (member id, future) rather than waited
+    for here, so it never holds up another member's card. False when no card
+    could be pushed and the member must be retried."""
+    member_id = member.profile.id
     try:
-        reply = member.handle_mention(context)
+        reply = future.result()
     except Exception as exc:
-        print(
-            f"Error from agent {member.profile.id} for mention {mention.id}: {exc}",
-            flush=True,
-        )
+        merged.skip(member_id)
+        print(f"Error from agent {member_id} for mention {mention.id}: {exc}", flush=True)
         # Dead-letter: surface the failure on the timeline so the mention
         # isn't silently dropped, without poison-pilling the poll loop.
         # Only if even the dead-letter card can't land do we hold the
         # watermark and retry the mention next poll.
         try:
-            push_timeline_card(
-                build_card(
-                    title=f"Agent error on mention {mention.id}",
-                    blocks=[
-                        text_block(f"{member.profile.id} failed: {exc}", label="Error"),
-                        text_block(mention.text, label="Mention"),
-                    ],
-                    metadata={
-                        "agent_id": member.profile.id,
-                        "mention_id": mention.id,
-                        "error": str(exc),
-                    },
-                ),
-                posted_by=member.profile.id,
-            )
+            push_timeline_card(agent_error_card(member_id, mention, exc), posted_by=member_id)
             return True
         except Exception:
             return False
 
+    item = None
     if reply.card:
         try:
-            push_timeline_card(reply.card, posted_by=member.profile.id)
+            with timed("push_card", member_id):
+                item = push_timeline_card(reply.card, posted_by=member_id)
         except Exception as exc:
-            print(
-                f"Error pushing timeline card for mention {mention.id}: {exc}; will retry",
-                flush=True,
-            )
+            print(f"Error pushing timeline card for mention {mention.id}: {exc}; will retry", flush=True)
+            merged.skip(member_id)
             return False
+    if reply.text:
+        merged.add(member_id, reply.text)
+    follow_up = start_reply_follow_up(member, reply, item)
+    if follow_up is not None:
+        follow_ups.append((member_id, follow_up))
+        return True
+    # Enrichment the member deferred until its card was up; its reply is out.
+    followed = item is not None and run_after_card(
+        reply, item, lambda text: merged.add(member_id, text), lambda: merged.skip(member_id)
+    )
+    if not reply.text and not followed:
+        merged.skip(member_id)
+    return True
 
+
+def process_mention(
+    client: tweepy.Client, mention, defer_throttled: bool = False, collapse: bool = True
+) -> bool:
+    """Route one mention to every member it tags and deliver the results.
+
+    The members run concurrently, each in its own lane; each pushes its own
+    card as soon as it is done, and their X replies go out as one post.
+
+    Returns False when a card could not be pushed (or a member was shed by
+    its bulkhead) — the caller must then NOT advance the last-seen
+    watermark, so the mention is retried next poll instead of its
+    approval-gated proposal being lost. A retry only runs the members that
+    did not answer. A card is pushed before its reply is queued for the
+    same reason: the card is the safety-critical artifact.
+
+    A near-duplicate of a mention being handled for another author posts
+    that one's reply too (see mention_dedupe). It never waits here for it:
+    it returns True and is answered once the leader settles
+    (`follow_later`), or with `defer_throttled` raises MentionDeferred to
+    go back on the queue. `collapse=False` skips that, for a follower
+    processed on its own. A mention from an author over their admission
+    budget gets a canned reply instead of a member call, or with
+    `defer_throttled` raises MentionDeferred.
+    """
+    context = mention_context(mention)
+    routed = route_members(client, mention, context)
+    # Routed first: only a shareable reply is worth waiting for.
+    group, leader = claim_duplicate(mention, routed) if collapse else (None, True)
+    if not leader:
+        if not group.settled:
+            if defer_throttled:
+                delay = min(group.remaining(), DEDUPE_RECHECK_SECONDS)
+                raise MentionDeferred(delay, f"waiting on near-duplicate {group.leader_id}")
+            follow_later(client, mention, group)
+            return True
+        if follow_duplicate(group.shared, group, lambda member_id: reply_sender(client, mention, member_id)):
+            print(f"Mention {mention.id} answered as a duplicate of {group.leader_id}", flush=True)
+            return True
+        group = None
+
+    # Only a lone member's reply is offered to near-duplicates.
+    solo: Tuple[str, Any] = ("", None)
     try:
-        client.create_tweet(
-            text=reply.text[:280],
-            in_reply_to_tweet_id=mention.id,
+        members = admit_members(
+            mention, routed, lambda member_id: reply_sender(client, mention, member_id), defer_throttled
         )
-    except Exception as exc:
-        print(f"Error replying to mention {mention.id}: {exc}", flush=True)
-        # Best-effort: surface the dropped reply on the timeline so an
-        # operator can recover it. The mention is not retried — its card
-        # (and any side effects) already landed.
+        if not members:
+            return True
+        send = reply_sender(client, mention, members[0].profile.id)
+
+        def post_reply(text: str) -> None:
+            send(text)
+            if group is not None:
+                group.publish_text(text)
+
+        merged = MergedReply(post_reply, [member.profile.id for member in members])
+        started = start_members(mention, members, context)
+        answered: List[str] = []
+        shed = []
+        failed = False
+        futures = {}
+        follow_ups: List[Tuple[str, Future]] = []
+        for member, future in started:
+            if future is None:
+                merged.skip(member.profile.id)
+                shed.append(member)
+            else:
+                futures[future] = member
+        # Each card lands as soon as its member is done.
+        for future in as_completed(futures):
+            member = futures[future]
+            if answer_member(mention, member, future, merged, follow_ups):
+                answered.append(member.profile.id)
+            else:
+                failed = True
+        # Every card is out; now wait for the replies written after theirs.
+        for member_id, follow_up in follow_ups:
+            merged.add(member_id, follow_up.result())
+        if len(members) == 1 and answered:
+            (only,) = futures
+            if only.exception() is None:
+                solo = (answered[0], only.result())
+        if failed or shed:
+            record_answered(client, mention, answered)
+        if shed and not failed and defer_throttled:
+            # Shed, not failed: the member is busy, so try again later
+            # rather than wait here holding a mention thread.
+            raise MentionDeferred(BULKHEAD_RETRY_SECONDS)
+        return not (failed or shed)
+    finally:
+        settle_duplicate(group, *solo)
+
+
+def _conversation_key(mention) -> Any:
+    # A mention without a conversation id is its own thread.
+    return mention.conversation_id or ("mention", mention.id)
+
+
+class CoalescedMention:
+    """A run of one author's mentions in a thread, answered as one.
+
+    Members see the texts in order as one mention; the reply goes to the
+    newest, which is also where the thread now is."""
+
+    def __init__(self, parts: Sequence[Any]):
+        self.parts = list(parts)
+        newest = self.parts[-1]
+        self.id = newest.id
+        self.author_id = newest.author_id
+        self.conversation_id = newest.conversation_id
+        self.created_at = newest.created_at
+        self.referenced_tweets = getattr(newest, "referenced_tweets", None)
+        self.text = "\n".join(part.text for part in self.parts)
+
+
+def _coalesce_key(mention) -> Optional[Tuple[Any, Tuple[str, ...]]]:
+    if mention.created_at is None:
+        return None
+    members = route_mention(MentionContext(text=mention.text))
+    if not all(getattr(member.profile, "coalesce", False) for member in members):
+        return None
+    return mention.author_id, tuple(member.profile.id for member in members)
+
+
+def coalesce_lane(lane: Sequence[Any], window: Optional[float] = None) -> List[Any]:
+    """One conversation's mentions, oldest first, with each burst merged.
+
+    A burst is consecutive mentions from one author that tag the same
+    members, all of which allow it, each within `window` seconds of the
+    burst's first. It becomes a CoalescedMention: one member call, one card
+    and one reply instead of one per mention.
+    """
+    window = COALESCE_WINDOW_SECONDS if window is None else window
+    if window <= 0 or len(lane) < 2:
+        return list(lane)
+    runs: List[List[Any]] = []
+    keys: List[Any] = []
+    for mention in lane:
+        key = _coalesce_key(mention)
+        if (
+            runs
+            and key is not None
+            and key == keys[-1]
+            and (mention.created_at - runs[-1][0].created_at).total_seconds() <= window
+        ):
+            runs[-1].append(mention)
+            continue
+        runs.append([mention])
+        keys.append(key)
+    coalesced: List[Any] = []
+    for key, run in zip(keys, runs):
+        if len(run) == 1:
+            coalesced.append(run[0])
+            continue
+        for member_id in key[1]:
+            COALESCED.inc(len(run) - 1, member=member_id)
+        print(f"Mentions {', '.join(str(m.id) for m in run)} coalesced", flush=True)
+        coalesced.append(CoalescedMention(run))
+    return coalesced
+
+
+def lane_results(mention, ok: bool) -> Dict[Any, bool]:
+    """The outcome of a (possibly coalesced) mention, by original id."""
+    return {part.id: ok for part in getattr(mention, "parts", [mention])}
+
+
+def _run_lane(client: tweepy.Client, lane: List[Any]) -> Dict[Any, bool]:
+    """Process one conversation's mentions in order, stopping at the first
+    failure so a later follow-up can never overtake the mention it answers."""
+    results: Dict[Any, bool] = {}
+    for mention in coalesce_lane(lane):
         try:
-            push_timeline_card(
-                build_card(
-                    title=f"Failed to post reply to mention {mention.id}",
-                    blocks=[
-                        text_block(reply.text, label="Intended reply"),
-                        text_block(str(exc), label="Error"),
-                    ],
-                    metadata={
-                        "agent_id": member.profile.id,
-                        "mention_id": mention.id,
-                        "error": str(exc),
-                    },
-                ),
-                posted_by=member.profile.id,
-            )
-        except Exception as recovery_exc:
-            print(
-                f"Error pushing failed-reply card for mention {mention.id}: {recovery_exc}",
-                flush=True,
-            )
-            # Reply-only mentions (no proposal card landed earlier) would
-            # otherwise vanish entirely — hold the watermark and retry.
-            if not reply.card:
-                return False
-    return True
+            with timed("mention"):
+                ok = process_mention(client, mention)
+            if not ok:
+                STAGE_ERRORS.inc(stage="mention", member="")
+        except Exception as exc:
+            # process_mention already dead-letters agent errors; anything
+            # escaping it is unexpected, so hold the watermark and retry.
+            print(f"Unexpected error processing mention {mention.id}: {exc}", flush=True)
+            ok = False
+        results.update(lane_results(mention, ok))
+        if not ok:
+            break
+    return results
 
 
-def main() -> None:
-    load_env()
-    client = build_client()
-    me = client.get_me().data
-    if not me:
-        raise RuntimeError("Could not resolve authenticated X user for listener")
-    bot_id = me.id
-    register_team()
+def mention_priority(mention) -> int:
+    """The most urgent priority among the members `mention` tags."""
+    return min(member_priority(member) for member in route_mention(MentionContext(text=mention.text or "")))
 
-    last_seen = load_last_seen()
-    start_time = datetime.now(timezone.utc) - timedelta(minutes=10)
-    if last_seen:
+
+def lane_priority(lane: Sequence[Any]) -> int:
+    # A lane runs in order, so an urgent mention is only as quick as the
+    # mentions ahead of it in its thread: the whole lane takes its rank.
+    return min(mention_priority(mention) for mention in lane)
+
+
+def _run_queued_lanes() -> None:
+    """Run the most urgent waiting lanes until none is left."""
+    while True:
+        task = LANES.get()
+        if task is None:
+            return
+        client, lane, future = task
+        if not future.set_running_or_notify_cancel():
+            continue
         try:
-            start_time = datetime.fromisoformat(last_seen)
-        except ValueError:
-            pass
+            future.set_result(_run_lane(client, lane))
+        except BaseException as exc:
+            future.set_exception(exc)
+
+
+def process_batch(
+    client: tweepy.Client, mentions: Sequence[Any], executor: Optional[Executor] = None
+) -> Dict[Any, bool]:
+    """Process a batch of mentions, one lane per conversation.
+
+    Conversations run concurrently on `executor`, most urgent first (see
+    lane_queue); mentions within one conversation run oldest-first on a
+    single lane. Returns mention id -> success for every mention that was
+    attempted. A mention missing from the result was skipped because an
+    earlier one in its conversation failed.
+    """
+    lanes: Dict[Any, List[Any]] = {}
+    for mention in mentions:
+        lanes.setdefault(_conversation_key(mention), []).append(mention)
+
+    results: Dict[Any, bool] = {}
+    if executor is None or len(lanes) <= 1:
+        for lane in sorted(lanes.values(), key=lane_priority):
+            results.update(_run_lane(client, lane))
+        return results
+
+    futures: List[Future] = []
+    for lane in lanes.values():
+        future: Future = Future()
+        LANES.put(lane_priority(lane), (client, lane, future))
+        futures.append(future)
+    # One runner per lane, as one task per lane before: a runner takes
+    # whichever lane is most urgent when it starts -- possibly another
+    # batch's, from another account -- so lanes queued after this batch can
+    # still overtake the rest of it.
+    for _ in futures:
+        executor.submit(_run_queued_lanes)
+    for future in futures:
+        results.update(future.result())
+    return results
+
+
+def commit_watermark(
+    ordered: Sequence[Any], completed: Dict[Any, datetime], floor: Optional[datetime] = None
+) -> Optional[Any]:
+    """Return the new watermark: the last mention of the contiguous completed
+    prefix of `ordered`, or None if the first mention is still outstanding.
+    `floor` is the created_at of the oldest mention that failed in an earlier
+    batch; the watermark stops short of it too.
 
+    Completed mentions past a gap stay in `completed` so the next poll skips
+    them instead of replying twice; entries older than the new watermark are
+    pruned because the API will not return them again.
+    """
+    mark: Optional[Any] = None
+    for mention in ordered:
+        if mention.id not in completed:
+            break
+        if floor is not None and (mention.created_at or _EPOCH) >= floor:
+            break
+        mark = mention
+    if mark is not None:
+        cutoff = completed[mark.id]
+        for mention_id, created_at in list(completed.items()):
+            if created_at < cutoff:
+                del completed[mention_id]
+    return mark
+
+
+def mention_query(bot_id: Any, start_time: datetime, since_id: Optional[Any]) -> Dict[str, Any]:
+    params: Dict[str, Any] = {
+        "id": bot_id,
+        "max_results": MENTIONS_PAGE_SIZE,
+        "tweet_fields": MENTION_TWEET_FIELDS,
+    }
+    # since_id is exclusive and exact; the timestamp is the fallback for a
+    # fresh process, which only persisted the watermark's created_at.
+    if since_id is not None:
+        params["since_id"] = since_id
+    else:
+        params["start_time"] = start_time
+    return params
+
+
+def fetch_mention_pages(
+    client: tweepy.Client,
+    bot_id: Any,
+    *,
+    start_time: datetime,
+    since_id: Optional[Any] = None,
+    max_pages: int = CATCHUP_MAX_PAGES,
+) -> Tuple[List[List[Any]], bool]:
+    """Fetch every mention newer than the watermark, oldest page first.
+
+    In steady state this is one request. After downtime or a burst the first
+    response carries a next_token, and this walks the backlog with
+    `pagination_token` instead of leaving it to later poll cycles.
+
+    X pages newest-first, so the oldest mentions arrive last and nothing can
+    be processed until the walk ends. Only the `max_pages` oldest pages are
+    kept; the second return value says newer pages were dropped, and the
+    next cycle picks them up from the advanced watermark.
+    """
+    params = mention_query(bot_id, start_time, since_id)
+    pages: Deque[List[Any]] = deque(maxlen=max_pages)
+    truncated = False
+    token: Optional[str] = None
     while True:
+        with timed("fetch"):
+            response = client.get_users_mentions(**params, pagination_token=token)
+        if response.data:
+            truncated = truncated or len(pages) == max_pages
+            pages.append(list(response.data))
+        token = (response.meta or {}).get("next_token")
+        if not token:
+            break
+    return list(reversed(pages)), truncated
+
+
+def process_page(
+    client: tweepy.Client,
+    page: Sequence[Any],
+    executor: Optional[Executor],
+    completed: Dict[Any, datetime],
+    failed: Optional[Dict[Any, datetime]] = None,
+) -> Tuple[Optional[Any], BatchResult]:
+    """Process one page of mentions and commit what completed.
+
+    Returns the new watermark mention (or None) and the page's BatchResult.
+    With `failed` (see `MentionCursor.failed`), a mention that failed on an
+    earlier page also holds the watermark until it completes.
+    """
+    ordered, pending = split_page(page, completed)
+    # One lookup for the whole page's thread context, before any lane runs.
+    prefetch(client, pending.values())
+    results = process_batch(client, list(pending.values()), executor)
+    return settle_page(ordered, pending, results, completed, failed)
+
+
+def split_page(page: Sequence[Any], completed: Dict[Any, datetime]) -> Tuple[List[Any], Dict[Any, Any]]:
+    """The page oldest-first, and its mentions (by id) still needing work."""
+    ordered = sorted(page, key=lambda m: m.created_at or _EPOCH)
+    return ordered, {m.id: m for m in ordered if m.id not in completed}
+
+
+def settle_page(
+    ordered: Sequence[Any],
+    pending: Dict[Any, Any],
+    results: Dict[Any, bool],
+    completed: Dict[Any, datetime],
+    failed: Optional[Dict[Any, datetime]] = None,
+) -> Tuple[Optional[Any], BatchResult]:
+    """Record a page's results and commit what completed."""
+    for mention_id, ok in results.items():
+        created_at = pending[mention_id].created_at or _EPOCH
+        if ok:
+            completed[mention_id] = created_at
+        if failed is not None:
+            if ok:
+                failed.pop(mention_id, None)
+            else:
+                failed[mention_id] = created_at
+    # Read before commit_watermark prunes entries behind the new mark.
+    finished = frozenset(m.id for m in ordered if m.id in completed)
+    mark = commit_watermark(ordered, completed, min(failed.values()) if failed else None)
+    return mark, BatchResult(len(finished) == len(ordered), len(pending), finished)
+
+
+def enqueue_page(page: Sequence[Any], source: str, account: str = "") -> BatchResult:
+    """Persist a page of mentions to the work queue, oldest first.
+
+    Once a mention is in the table it is durable, so the whole page counts
+    as done and the watermark moves past it; processing (and its retries)
+    belong to the queue workers from here. Nothing is reported `completed`
+    -- the webhook source must not mark a queued mention done.
+    """
+    ordered = sorted(page, key=lambda m: m.created_at or _EPOCH)
+    fresh = sum(1 for mention in ordered if record_mention(mention.data, source=source, account=account))
+    return BatchResult(True, fresh, frozenset())
+
+
+def run_queue_worker(
+    clients: Mapping[str, tweepy.Client],
+    owner: str,
+    stop: Optional[threading.Event] = None,
+    idle_seconds: float = QUEUE_IDLE_SECONDS,
+) -> None:
+    """Claim mentions from the work queue one at a time and process them.
+
+    A mention whose card push fails is released for a later retry (and
+    dead-lettered once it runs out of attempts) instead of holding a
+    watermark; the queue itself keeps each conversation in order. `clients`
+    maps account names to their clients; each mention is answered by the
+    account it mentioned, and only those accounts' mentions are claimed --
+    the rest belong to replicas configured for them. The lease is renewed
+    for as long as the mention is being processed.
+    """
+    stop = stop or threading.Event()
+    while not stop.is_set():
         try:
-            mentions = client.get_users_mentions(
-                id=bot_id,
-                start_time=start_time,
-                tweet_fields=["conversation_id", "created_at", "author_id", "text"],
-            )
-        except TweepyHTTPException as exc:
-            status_code = getattr(getattr(exc, "response", None), "status_code", None)
-            if status_code == 402:
-                # Avoid crash-looping if the X account does not have API credits enabled yet.
-                print(
-                    f"X API returned 402 Payment Required. Backing off for {PAYMENT_REQUIRED_BACKOFF_SECONDS}s.",
-                    flush=True,
-                )
-                time.sleep(PAYMENT_REQUIRED_BACKOFF_SECONDS)
-                continue
-            print(f"X API error fetching mentions: {exc}", flush=True)
-            time.sleep(POLL_SECONDS)
-            continue
+            rows = claim_mentions(owner, accounts=clients)
         except Exception as exc:
-            print(f"Unexpected error fetching mentions: {exc}", flush=True)
-            time.sleep(POLL_SECONDS)
+            print(f"Error claiming queued mentions: {exc}", flush=True)
+            stop.wait(idle_seconds)
             continue
+        if not rows:
+            stop.wait(idle_seconds)
+            continue
+        for row in rows:
+            mention = tweepy.Tweet(row["payload"])
+            client = clients[row.get("account") or ""]
+            prefetch(client, [mention])
+            error = ""
+            try:
+                with hold_lease(row["id"], owner), timed("mention"):
+                    ok = process_mention(client, mention, defer_throttled=True)
+                if not ok:
+                    STAGE_ERRORS.inc(stage="mention", member="")
+            except MentionDeferred as exc:
+                # Back on the queue until the author has budget again.
+                try:
+                    defer_mention(row["id"], owner, exc.delay, str(exc))
+                except Exception as settle_exc:
+                    print(f"Error deferring queued mention {mention.id}: {settle_exc}", flush=True)
+                continue
+            except Exception as exc:
+                print(f"Unexpected error processing mention {mention.id}: {exc}", flush=True)
+                ok, error = False, str(exc)
+            try:
+                if ok:
+                    if not complete_mention(row["id"], owner):
+                        print(f"Lease on mention {mention.id} lapsed before it completed", flush=True)
+                else:
+                    release_mention(row["id"], owner, error or "process_mention failed")
+            except Exception as exc:
+                # The lease lapses on its own; the mention is claimed again then.
+                print(f"Error settling queued mention {mention.id}: {exc}", flush=True)
+
+
+def mention_threads() -> int:
+    """Threads for mention lanes (or queue workers): enough for every call
+    the bulkheads admit, plus LISTENER_WORKERS that stay free of them."""
+    return LISTENER_WORKERS + team_capacity(get_team())
+
+
+def start_queue_workers(
+    clients: Mapping[str, tweepy.Client], count: Optional[int] = None
+) -> List[threading.Thread]:
+    count = mention_threads() if count is None else count
+    host = f"{socket.gethostname()}:{os.getpid()}"
+    threads = []
+    for index in range(count):
+        thread = threading.Thread(
+            target=run_queue_worker,
+            args=(clients, f"{host}:{index}"),
+            name=f"mention-queue-{index}",
+            daemon=True,
+        )
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+class MentionCursor:
+    """How far the listener has got: the persisted watermark, plus mentions
+    that completed past it while an older one was still outstanding.
+
+    `completed` is in memory only: a restart re-runs those mentions, which
+    is the same at-least-once behaviour a crash mid-mention always had.
+
+    `failed` holds mentions that failed and have not completed since, by
+    created_at. A fetched page starts at the watermark, so its own failures
+    hold the watermark anyway; stream batches do not. Without this, a later
+    stream batch that succeeded would move the watermark past a failure
+    whose backfill also failed, and no fetch would return it again.
+    """
+
+    def __init__(self, start_time: datetime, path: Path = LAST_SEEN_PATH):
+        self.start_time = start_time
+        self.since_id: Optional[Any] = None
+        self.completed: Dict[Any, datetime] = {}
+        self.failed: Dict[Any, datetime] = {}
+        self.path = path
+
+    def forget_missing(self, pages: Sequence[Sequence[Any]]) -> None:
+        """Drop failures a fetch from the watermark no longer returns (the
+        post was deleted), so they cannot hold the watermark for good.
+        Only those older than the newest mention fetched: a newer one may
+        not have reached the mentions endpoint yet."""
+        fetched = [mention for page in pages for mention in page]
+        if not fetched:
+            return
+        newest = max(mention.created_at or _EPOCH for mention in fetched)
+        ids = {mention.id for mention in fetched}
+        for mention_id, created_at in list(self.failed.items()):
+            if mention_id not in ids and created_at < newest:
+                del self.failed[mention_id]
+
+    @classmethod
+    def load(cls, path: Path = LAST_SEEN_PATH) -> "MentionCursor":
+        """Resume from the watermark in `path`, or from ten minutes ago."""
+        start_time = datetime.now(timezone.utc) - timedelta(minutes=10)
+        last_seen = load_last_seen(path)
+        if last_seen:
+            try:
+                start_time = datetime.fromisoformat(last_seen)
+            except ValueError:
+                pass
+        return cls(start_time, path)
+
+    def advance(self, mark: Any) -> None:
+        self.start_time = mark.created_at or datetime.now(timezone.utc)
+        self.since_id = mark.id
+        save_last_seen(self.start_time.isoformat(), self.path)
+
+
+class Account:
+    """One bot account served by this listener: its own client, identity,
+    watermark and rate-limit accounting. The team roster, worker pool,
+    timeline pool and Grok client are shared by all of them."""
+
+    def __init__(self, credentials: Dict[str, str]):
+        self.name = credentials.get("name", "")
+        self.client = build_client(credentials)
+        me = self.client.get_me().data
+        if not me:
+            raise RuntimeError(f"Could not resolve authenticated X user for listener account {self.name!r}")
+        self.me = me
+        self.cursor = MentionCursor.load(last_seen_path(self.name))
+        # Per account: X rate-limits the mentions endpoint per user.
+        self.scheduler = PollScheduler()
+        self.scheduler.attach(self.client)
+        # Its replies persist under its name, and those a stopped listener
+        # left unposted are picked up (see reply_store).
+        get_reply_poster(self.client, account=self.name, on_failure=report_lost_reply)
+
+    def run(self, executor: Executor, *, queued: bool = False, source_name: str = "poll") -> None:
+        client, cursor = self.client, self.cursor
+        source = build_mention_source(self.me, self.scheduler, queued=queued)
+
+        def fetch() -> Tuple[List[List[Any]], bool]:
+            pages, truncated = fetch_mention_pages(
+                client, self.me.id, start_time=cursor.start_time, since_id=cursor.since_id
+            )
+            cursor.forget_missing(pages)
+            return pages, truncated
+
+        def handle(batch: List[Any]) -> BatchResult:
+            if queued:
+                result = enqueue_page(batch, source_name, self.name)
+                if batch:
+                    cursor.advance(max(batch, key=lambda m: m.created_at or _EPOCH))
+                return result
+            # Pages are handed over oldest-first so the last-seen watermark
+            # only ever moves forward. Conversations run in parallel, but the
+            # watermark only advances over the contiguous prefix that
+            # completed -- a failed card push still holds it, so that mention
+            # (and everything after it) is retried by the next fetch. So does
+            # a failure from an earlier stream batch, until it completes.
+            mark, result = process_page(client, batch, executor, cursor.completed, cursor.failed)
+            if mark is not None:
+                cursor.advance(mark)
+            return result
+
+        source.run(fetch, handle)
 
-        # The X API returns mentions newest-first; process oldest-first so
-        # the last-seen watermark only ever moves forward.
-        epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
-        for mention in sorted(mentions.data or [], key=lambda m: m.created_at or epoch):
-            if not process_mention(client, mention):
-                # Card push failed: stop here so this mention (and later
-                # ones) are retried on the next poll.
-                break
-            start_time = mention.created_at or datetime.now(timezone.utc)
-            save_last_seen(start_time.isoformat())
-
-        time.sleep(POLL_SECONDS)
+
+def start_accounts(credentials: Sequence[Dict[str, str]]) -> List[Account]:
+    """An `Account` for every credentials entry that can start. One that
+    cannot -- a revoked or mistyped token -- is logged and skipped rather
+    than taking every other account down with it; raises only when none
+    can start."""
+    accounts = []
+    for entry in credentials:
+        try:
+            accounts.append(Account(entry))
+        except Exception as exc:
+            name = entry.get("name", "")
+            print(f"Listener account {name!r} could not start: {exc}; skipping it", flush=True)
+    if not accounts:
+        raise RuntimeError("No listener account could start")
+    return accounts
+
+
+def main() -> None:
+    load_env()
+    if os.getenv("LISTENER_MODE", "").strip().lower() == "async":
+        from async_listener import main as run_async
+
+        run_async()
+        return
+    credentials = load_accounts()
+    source_name = os.getenv("LISTENER_SOURCE", "poll").strip().lower()
+    if len(credentials) > 1 and source_name != "poll":
+        # The filtered stream and the Account Activity webhook are per app,
+        # not per account; fanning one out across accounts isn't built yet.
+        raise RuntimeError("Serving several X_ACCOUNTS needs LISTENER_SOURCE=poll")
+    accounts = start_accounts(credentials)
+    register_team()
+    # One keep-alive connection per thread that pushes cards: every mention
+    # thread, and the near-duplicate followers processed on their own.
+    size_timeline_pools(mention_threads() + LISTENER_WORKERS)
+
+    queued = LISTENER_QUEUE == "sql"
+    if LISTENER_QUEUE and not queued:
+        raise RuntimeError(f"Unknown LISTENER_QUEUE {LISTENER_QUEUE!r}; expected 'sql' or unset")
+    if queued:
+        workers = start_queue_workers({account.name: account.client for account in accounts})
+        if not LISTENER_INGEST:
+            for worker in workers:
+                worker.join()
+            return
+
+    # One pool for every account, so a busy account can use the capacity a
+    # quiet one leaves idle; the bulkheads bound Grok concurrency.
+    executor = ThreadPoolExecutor(max_workers=mention_threads(), thread_name_prefix="mention")
+    if len(accounts) == 1:
+        accounts[0].run(executor, queued=queued, source_name=source_name)
+        return
+
+    threads = [
+        threading.Thread(
+            target=account.run,
+            args=(executor,),
+            kwargs={"queued": queued, "source_name": source_name},
+            name=f"listener-{account.name}",
+            daemon=True,
+        )
+        for account in accounts
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
 
 
 if __name__ == "__main__":
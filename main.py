@@ -2,6 +2,7 @@ import os
 import threading
 
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 
 
 def _service_name() -> str:
@@ -46,6 +47,20 @@ def _build_worker_app(kind: str) -> FastAPI:
     def health() -> dict:
         return {"ok": True}
 
+    @api.get("/metrics")
+    def prometheus_metrics() -> PlainTextResponse:
+        from metrics import render
+
+        # Prometheus text exposition format, version 0.0.4.
+        return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+    if kind in ("x-listener", "listener"):
+        # X Account Activity deliveries (LISTENER_SOURCE=webhook). The routes
+        # verify X's signature themselves, so they answer 401 to anyone else.
+        from webhook import router as webhook_router
+
+        api.include_router(webhook_router)
+
     def _start_worker() -> None:
         # Accept the names docs/DEPLOYMENT.md tells operators to use as well as
         # the original ones. A service whose name matched neither used to come
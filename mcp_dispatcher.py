@@ -1,19 +1,26 @@
 import os
 import time
-from datetime import datetime, timezone
+from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 
 import requests
 from dotenv import load_dotenv
-from xai_sdk import Client
-from xai_sdk.chat import user
-from xai_sdk.tools import mcp
-
-from agents.base import timeline_headers
 from agents.registry import find_member
+from timeline_client import get_timeline_client
+from xai_client import get_grok_client
 
+# Holds the inbox cursor the timeline server sent with the last message
+# handled. Older releases stored that message's created_at instead.
 LAST_SEEN_PATH = Path(os.getenv("XMCP_DISPATCH_LAST_SEEN", "~/.xmcp/dispatch_last_seen.txt")).expanduser()
+# Messages read per request. A full page is followed by the next at once.
+DISPATCH_PAGE_SIZE = max(1, int(os.getenv("MCP_DISPATCH_PAGE_SIZE", "50")))
+# How long the timeline server may hold an empty inbox read open waiting for
+# a message (a long poll). 0 goes back to polling every IDLE_POLL_SECONDS.
+DISPATCH_WAIT_SECONDS = max(0.0, float(os.getenv("MCP_DISPATCH_WAIT_SECONDS", "25")))
+# Pause after an empty read that did not wait: the request failed, long
+# polling is off, or the server predates it. Keeps the loop from spinning.
+IDLE_POLL_SECONDS = 5
 
 
 def load_env() -> None:
@@ -27,6 +34,15 @@ def save_last_seen(value: str) -> None:
     LAST_SEEN_PATH.write_text(value, encoding="utf-8")
 
 
+def save_handled(message: Dict) -> None:
+    """Record `message` as handled: the next read starts past it. The
+    cursor is the server's, sent with each message; a server without one
+    leaves the page's next_cursor to record progress."""
+    cursor = message.get("cursor")
+    if cursor:
+        save_last_seen(cursor)
+
+
 def load_last_seen() -> Optional[str]:
     if not LAST_SEEN_PATH.exists():
         return None
@@ -34,12 +50,9 @@ def load_last_seen() -> Optional[str]:
 
 
 def get_timeline_item(item_id: str) -> Optional[Dict]:
-    timeline_url = os.getenv("TIMELINE_API_URL", "http://127.0.0.1:8080")
     try:
-        response = requests.get(
-            f"{timeline_url}/v1/timeline/items/{item_id}",
-            headers=timeline_headers(),
-            timeout=10,
+        response = get_timeline_client().get(
+            f"/v1/timeline/items/{item_id}", op="get_timeline_item"
         )
         if response.status_code != 200:
             return None
@@ -49,23 +62,38 @@ def get_timeline_item(item_id: str) -> Optional[Dict]:
         return None
 
 
-def get_messages(agent_id: str) -> list[Dict]:
-    timeline_url = os.getenv("TIMELINE_API_URL", "http://127.0.0.1:8080")
-    response = requests.get(
-        f"{timeline_url}/v1/a2a/agents/{agent_id}/messages",
-        headers=timeline_headers(),
-        timeout=10,
+def get_messages(
+    agent_id: str, after: str = "", limit: int = DISPATCH_PAGE_SIZE, wait: float = 0
+) -> Tuple[list[Dict], str]:
+    """Messages past the `after` cursor, oldest first, and the cursor past
+    them. Only new rows cross the wire, however long the inbox's history.
+
+    With `wait`, an empty inbox is a long poll: the server answers as soon
+    as a message arrives, or with nothing after `wait` seconds."""
+    client = get_timeline_client()
+    params: Dict[str, object] = {"after": after, "limit": limit}
+    kwargs: Dict[str, object] = {}
+    if wait:
+        params["wait"] = wait
+        # The read timeout has to outlast the server holding the request.
+        kwargs["timeout"] = wait + client.timeout
+    response = client.get(
+        f"/v1/a2a/agents/{agent_id}/messages",
+        # Separate op, so held requests don't skew get_messages latency.
+        op="wait_messages" if wait else "get_messages",
+        params=params,
+        **kwargs,
     )
     if response.status_code != 200:
-        return []
+        return [], after
     payload = response.json()
-    return payload.get("messages", [])
+    return payload.get("messages", []), payload.get("next_cursor", after)
 
 
 def send_message(from_agent: str, to: str, content: str, metadata: Dict) -> None:
-    timeline_url = os.getenv("TIMELINE_API_URL", "http://127.0.0.1:8080")
-    requests.post(
-        f"{timeline_url}/v1/a2a/messages",
+    get_timeline_client().post(
+        "/v1/a2a/messages",
+        op="send_message",
         json={
             "from": from_agent,
             "to": to,
@@ -73,13 +101,10 @@ def send_message(from_agent: str, to: str, content: str, metadata: Dict) -> None
             "content": content,
             "metadata": metadata,
         },
-        headers=timeline_headers(),
-        timeout=10,
     )
 
 
 def ensure_agent_registered(agent_id: str) -> None:
-    timeline_url = os.getenv("TIMELINE_API_URL", "http://127.0.0.1:8080")
     payload = {
         "id": agent_id,
         "name": "MCP Orchestrator",
@@ -88,43 +113,20 @@ def ensure_agent_registered(agent_id: str) -> None:
         "endpoint": "local",
         "tags": ["mcp", "orchestrator"],
     }
-    requests.post(
-        f"{timeline_url}/v1/a2a/agents",
-        json=payload,
-        headers=timeline_headers(),
-        timeout=10,
-    )
+    get_timeline_client().post("/v1/a2a/agents", op="register_agent", json=payload)
 
 
 def update_timeline_item(item_id: str, metadata: Dict) -> None:
-    timeline_url = os.getenv("TIMELINE_API_URL", "http://127.0.0.1:8080")
-    requests.patch(
-        f"{timeline_url}/v1/timeline/items/{item_id}",
-        json={"metadata": metadata},
-        headers=timeline_headers(),
-        timeout=10,
+    get_timeline_client().patch(
+        f"/v1/timeline/items/{item_id}", op="update_timeline_item", json={"metadata": metadata}
     )
 
 
 def call_grok(prompt: str) -> str:
-    api_key = os.getenv("XAI_API_KEY", "").strip()
-    if not api_key:
+    client = get_grok_client()
+    if client is None:
         return "Missing XAI_API_KEY."
-    model = os.getenv("XAI_MODEL", "grok-4-1-fast")
-    server_url = os.getenv("MCP_SERVER_URL", "http://127.0.0.1:8000/mcp")
-
-    client = Client(api_key=api_key)
-    chat = client.chat.create(
-        model=model,
-        tools=[mcp(server_url=server_url)],
-    )
-    chat.append(user(prompt))
-
-    response_text = ""
-    for _, chunk in chat.stream():
-        if chunk.content:
-            response_text += chunk.content
-    return response_text.strip() or "No response."
+    return client.chat(prompt) or "No response."
 
 
 def _parse_time(value: Optional[str]) -> Optional[datetime]:
@@ -139,11 +141,17 @@ def _parse_time(value: Optional[str]) -> Optional[datetime]:
 def main() -> None:
     load_env()
     agent_id = os.getenv("MCP_DISPATCH_AGENT_ID", "mcp-orchestrator")
-    last_seen = _parse_time(load_last_seen())
+    cursor = load_last_seen() or ""
+    # A timestamp from an older release: read from the start, skipping what
+    # it covers; from then on the file holds a cursor.
+    last_seen = None if "|" in cursor else _parse_time(cursor)
+    if last_seen:
+        cursor = ""
     ensure_agent_registered(agent_id)
 
     while True:
-        messages = get_messages(agent_id)
+        started = time.monotonic()
+        messages, next_cursor = get_messages(agent_id, after=cursor, wait=DISPATCH_WAIT_SECONDS)
         for message in messages:
             created_at = _parse_time(message.get("created_at"))
             if last_seen and created_at and created_at <= last_seen:
@@ -175,8 +183,7 @@ def main() -> None:
                     f"'{item_meta['processed_action']}'",
                     flush=True,
                 )
-                last_seen = created_at or datetime.now(timezone.utc)
-                save_last_seen(last_seen.isoformat())
+                save_handled(message)
                 continue
             owned_agent_id = item_meta.get("agent_id")
             if item and action and owned_agent_id:
@@ -223,10 +230,16 @@ Use MCP tools to execute any required external steps. Return a concise status up
                 metadata={"timeline_item_id": item_id, "action": action},
             )
 
-            last_seen = created_at or datetime.now(timezone.utc)
-            save_last_seen(last_seen.isoformat())
+            save_handled(message)
 
-        time.sleep(5)
+        if next_cursor != cursor:
+            cursor = next_cursor
+            save_last_seen(cursor)
+        # Otherwise the next long poll returns the moment a message lands.
+        # Only an empty answer that came back early needs a pause.
+        waited = time.monotonic() - started
+        if not messages and (not DISPATCH_WAIT_SECONDS or waited < min(DISPATCH_WAIT_SECONDS, 1.0)):
+            time.sleep(IDLE_POLL_SECONDS)
 
 
 if __name__ == "__main__":
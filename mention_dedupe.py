@@ -0,0 +1,294 @@
+"""Near-duplicate mention collapse, ahead of the member call.
+
+Spam waves and copy-paste brigades send hundreds of near-identical
+mentions, each of which would otherwise cost a Grok call and a timeline
+card. The listener routes every mention and, when its one member's reply
+may be shared (`AgentProfile.share_replies`), asks `NearDuplicateIndex.claim`
+about it: the first of a kind becomes the *leader* of a
+`DuplicateGroup` and is processed as usual; near-duplicates from other
+authors arriving within the window *follow* it -- they post the leader's
+reply to their own mention, with no member call and no card of their own.
+
+A follower never holds a thread while the leader runs: a brigade is many
+followers at once, and blocking each would take every mention thread and
+starve unrelated conversations. It registers a callback on the group
+(`DuplicateGroup.when_settled`) instead, or, on the work queue, goes back
+on the queue and rejoins its group when claimed again. If the leader has
+not answered within DEDUPE_WAIT_SECONDS, the followers give up on it and
+are processed on their own.
+
+Similarity is MinHash over character shingles, indexed by LSH bands so a
+lookup only compares against likely candidates, then confirmed against
+DEDUPE_THRESHOLD (estimated Jaccard similarity). Mentions must also tag the
+same @handles and $cashtags, so the same words aimed at another member or
+ticker are never merged.
+
+Members whose cards carry approval actions, which belong to one author,
+never take part, so their mentions never wait on a leader. A leader whose
+reply still cannot be shared -- it failed, or carried actions after all --
+fails the group, and its followers are processed on their own.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+# Seconds a leader stays joinable. 0 turns collapsing off.
+DEDUPE_WINDOW_SECONDS = float(os.getenv("DEDUPE_WINDOW_SECONDS", "300"))
+# Estimated Jaccard similarity of the shingle sets needed to collapse.
+DEDUPE_THRESHOLD = float(os.getenv("DEDUPE_THRESHOLD", "0.8"))
+# How long followers wait on their leader, from its claim, before being
+# processed on their own. Kept well under XAI_TIMEOUT_SECONDS: a leader
+# still running by then is likely stuck on a slow Grok call.
+DEDUPE_WAIT_SECONDS = float(os.getenv("DEDUPE_WAIT_SECONDS", "20"))
+
+SHINGLE_SIZE = 4
+NUM_PERM = 64
+# 16 bands of 4 rows: pairs above ~0.5 similarity land in a shared bucket
+# with high probability; the threshold check then decides.
+BANDS = 16
+
+_MERSENNE = (1 << 61) - 1
+_TAG = re.compile(r"[@$#]\w+")
+_URL = re.compile(r"https?://\S+")
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+# (a, b) for each permutation h(x) = (a*x + b) mod p, fixed so signatures
+# are comparable across processes.
+_PERMUTATIONS = [
+    (_hash64(f"a{i}") % (_MERSENNE - 1) + 1, _hash64(f"b{i}") % _MERSENNE) for i in range(NUM_PERM)
+]
+
+
+def normalize(text: str) -> str:
+    # Links (t.co wrappers differ per post) and tags (checked separately)
+    # say nothing about whether the request is the same.
+    text = _TAG.sub(" ", _URL.sub(" ", text.casefold()))
+    return " ".join(re.findall(r"\w+", text))
+
+
+def tags(text: str) -> FrozenSet[str]:
+    return frozenset(_TAG.findall(_URL.sub(" ", text.casefold())))
+
+
+def signature(text: str) -> Tuple[int, ...]:
+    normalized = normalize(text)
+    if len(normalized) <= SHINGLE_SIZE:
+        shingles = {normalized}
+    else:
+        shingles = {normalized[i : i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+    hashes = [_hash64(shingle) for shingle in shingles]
+    return tuple(min((a * h + b) % _MERSENNE for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def similarity(left: Sequence[int], right: Sequence[int]) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(1 for a, b in zip(left, right) if a == b) / len(left)
+
+
+class DuplicateGroup:
+    """A leader mention and the near-duplicates waiting on its reply.
+
+    The group *settles* once: when the leader shares its reply or fails,
+    or when `wait` seconds pass first. Followers learn the outcome through
+    `when_settled`.
+    """
+
+    def __init__(
+        self,
+        leader_id: Any,
+        author_id: Any,
+        wait: float = DEDUPE_WAIT_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.leader_id = leader_id
+        self.author_ids = {author_id}
+        self.wait_seconds = wait
+        self.deadline = clock() + wait
+        self._clock = clock
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._shared: Optional[Tuple[str, Any]] = None
+        self._expired = False
+        self._settled_callbacks: List[Callable[[Optional[Tuple[str, Any]]], None]] = []
+        self._timer: Optional[threading.Timer] = None
+        self._text: Optional[str] = None
+        self._text_callbacks: List[Callable[[str], None]] = []
+
+    @property
+    def failed(self) -> bool:
+        return self._done.is_set() and self._shared is None
+
+    @property
+    def settled(self) -> bool:
+        return self._done.is_set() or self._expired or self._clock() >= self.deadline
+
+    @property
+    def shared(self) -> Optional[Tuple[str, Any]]:
+        """(member id, reply) if the leader shared in time, else None."""
+        with self._lock:
+            return None if self._expired else self._shared
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - self._clock())
+
+    def share(self, member_id: str, reply: Any) -> None:
+        """The leader's reply, for its followers to reuse."""
+        with self._lock:
+            if self._done.is_set() or self._expired:
+                return
+            self._shared = (member_id, reply)
+            self._done.set()
+        self._settle()
+
+    def fail(self) -> None:
+        """Nothing to share; followers process themselves. No-op once shared."""
+        self._done.set()
+        self._settle()
+
+    def _expire(self) -> None:
+        with self._lock:
+            if not self._done.is_set():
+                self._expired = True
+        self._settle()
+
+    def _settle(self) -> None:
+        with self._lock:
+            callbacks, self._settled_callbacks = self._settled_callbacks, []
+            shared = None if self._expired else self._shared
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+        for callback in callbacks:
+            try:
+                callback(shared)
+            except Exception as exc:
+                print(f"Near-duplicate follower of {self.leader_id} failed: {exc}", flush=True)
+
+    def when_settled(self, callback: Callable[[Optional[Tuple[str, Any]]], None]) -> None:
+        """Call `callback` once with the leader's (member id, reply), or None
+        if it failed or ran past the deadline. Runs on whichever thread
+        settles the group, so `callback` must not block."""
+        with self._lock:
+            if not (self._done.is_set() or self._expired):
+                self._settled_callbacks.append(callback)
+                if self._timer is None:
+                    # One timer per group, however many follow it.
+                    self._timer = threading.Timer(self.remaining(), self._expire)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+            shared = None if self._expired else self._shared
+        callback(shared)
+
+    def publish_text(self, text: str) -> None:
+        """A reply text the leader produced after sharing (a deferred one)."""
+        with self._lock:
+            if self._text is not None:
+                return
+            self._text = text
+            callbacks, self._text_callbacks = self._text_callbacks, []
+        for callback in callbacks:
+            callback(text)
+
+    def on_text(self, callback: Callable[[str], None]) -> None:
+        """Call `callback` with the leader's deferred reply text."""
+        with self._lock:
+            if self._text is None:
+                self._text_callbacks.append(callback)
+                return
+        callback(self._text)
+
+
+class _Entry:
+    def __init__(self, group: DuplicateGroup, signature: Tuple[int, ...], tags: FrozenSet[str], expires_at: float):
+        self.group = group
+        self.signature = signature
+        self.tags = tags
+        self.expires_at = expires_at
+        self.follower_ids: List[Any] = []
+
+
+class NearDuplicateIndex:
+    """Leaders of the last `window` seconds, bucketed by LSH band."""
+
+    def __init__(
+        self,
+        window: float = DEDUPE_WINDOW_SECONDS,
+        threshold: float = DEDUPE_THRESHOLD,
+        clock: Callable[[], float] = time.monotonic,
+        wait: float = DEDUPE_WAIT_SECONDS,
+    ):
+        self.window = window
+        self.threshold = threshold
+        self.wait = wait
+        self._clock = clock
+        # Followers by mention id, so a follower put back on the work queue
+        # rejoins its group when claimed again.
+        self._followers: Dict[Any, DuplicateGroup] = {}
+        self._rows = NUM_PERM // BANDS
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[_Entry]] = {}
+        self._entries: Deque[Tuple[_Entry, List[Tuple[int, Tuple[int, ...]]]]] = deque()
+        self._lock = threading.Lock()
+
+    def _bands(self, sig: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+        return [(band, sig[band * self._rows : (band + 1) * self._rows]) for band in range(BANDS)]
+
+    def _expire(self, now: float) -> None:
+        while self._entries and self._entries[0][0].expires_at <= now:
+            entry, keys = self._entries.popleft()
+            for mention_id in entry.follower_ids:
+                self._followers.pop(mention_id, None)
+            for key in keys:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    continue
+                bucket[:] = [other for other in bucket if other is not entry]
+                if not bucket:
+                    del self._buckets[key]
+
+    def claim(self, text: str, author_id: Any, mention_id: Any) -> Tuple[DuplicateGroup, bool]:
+        """The group this mention belongs to, and whether it leads it."""
+        sig = signature(text)
+        mention_tags = tags(text)
+        keys = self._bands(sig)
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            rejoined = self._followers.get(mention_id)
+            if rejoined is not None:
+                return rejoined, False
+            seen = set()
+            for key in keys:
+                for entry in self._buckets.get(key, ()):
+                    if id(entry) in seen:
+                        continue
+                    seen.add(id(entry))
+                    group = entry.group
+                    if (
+                        entry.tags == mention_tags
+                        # The same author repeating themselves gets a fresh answer.
+                        and author_id not in group.author_ids
+                        # A shared reply is reused for the whole window.
+                        and (group.shared is not None or not group.settled)
+                        and similarity(sig, entry.signature) >= self.threshold
+                    ):
+                        group.author_ids.add(author_id)
+                        entry.follower_ids.append(mention_id)
+                        self._followers[mention_id] = group
+                        return group, False
+
+            group = DuplicateGroup(mention_id, author_id, self.wait, self._clock)
+            entry = _Entry(group, sig, mention_tags, now + self.window)
+            for key in keys:
+                self._buckets.setdefault(key, []).append(entry)
+            self._entries.append((entry, keys))
+            return group, True
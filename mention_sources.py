@@ -0,0 +1,353 @@
+"""Where the listener's mentions come from.
+
+Every source feeds the same two callbacks from `listener.main`:
+
+- `fetch()` returns the backlog past the listener's watermark as pages,
+  oldest first, plus whether newer pages were left for a later call
+  (`listener.fetch_mention_pages`).
+- `handle(batch)` processes a batch through `process_mention` and commits
+  the watermark, returning a `BatchResult`.
+
+`PollingSource` is the historical poller: fetch, handle, sleep. The sleep is
+paced by `PollScheduler`.
+
+`FilteredStreamSource` holds a long-lived connection to the X filtered
+stream with an `@handle` rule, so a mention reaches `handle` within a second
+of being posted and idle periods cost no requests. Anything the stream
+could have missed -- mentions posted while disconnected, or one whose card
+push failed -- is recovered by running the poller's `fetch()` once
+("backfill") on every (re)connect and after any batch that did not
+complete. The watermark makes that safe: already-completed mentions are
+skipped, not replayed.
+
+`WebhookSource` takes mentions X pushes to the worker app's Account
+Activity webhook route (see webhook.py).
+
+With LISTENER_QUEUE=sql, `handle` only persists each batch to the work
+queue (`listener.enqueue_page`) and the queue workers process it.
+"""
+
+import json
+import os
+import queue
+import threading
+from typing import Any, Callable, Dict, FrozenSet, List, NamedTuple, Optional, Set, Tuple
+
+import requests
+import tweepy
+from tweepy.errors import HTTPException as TweepyHTTPException
+
+from mention_store import list_pending, mark_done
+from poll_scheduler import PollScheduler
+
+
+class BatchResult(NamedTuple):
+    done: bool  # every mention in the batch completed
+    worked: int  # mentions that needed work (not already completed)
+    completed: FrozenSet[Any]  # ids of the batch's mentions that are complete
+
+
+Fetch = Callable[[], Tuple[List[List[Any]], bool]]
+Handle = Callable[[List[Any]], BatchResult]
+
+POLL_SECONDS = int(os.getenv("POLL_INTERVAL_SECONDS", "60"))
+PAYMENT_REQUIRED_BACKOFF_SECONDS = int(os.getenv("X_PAYMENT_REQUIRED_BACKOFF_SECONDS", "900"))
+
+STREAM_TWEET_FIELDS = "conversation_id,created_at,author_id,text,referenced_tweets"
+# Filtered-stream rules belong to the app, not to this source: the stream
+# carries posts matching any rule installed under the same bearer token.
+# Only those matching the rule installed here, under this tag, are mentions.
+STREAM_RULE_TAG = "mentions"
+# X sends a keep-alive newline every ~20s; a silent connection is dead.
+STREAM_READ_TIMEOUT_SECONDS = float(os.getenv("X_STREAM_READ_TIMEOUT_SECONDS", "30"))
+STREAM_MAX_BACKOFF_SECONDS = float(os.getenv("X_STREAM_MAX_BACKOFF_SECONDS", "320"))
+# Mentions taken off the stream per batch. The stream is read on its own
+# thread, so a burst queues up while the previous batch runs and then goes
+# to the worker pool together.
+STREAM_BATCH_SIZE = int(os.getenv("X_STREAM_BATCH_SIZE", "50"))
+
+
+def drain_backlog(fetch: Fetch, handle: Handle) -> Tuple[bool, int]:
+    """Run `fetch` and hand each page to `handle`, stopping at the first
+    page that did not complete. Returns (caught up, mentions worked)."""
+    pages, truncated = fetch()
+    if len(pages) > 1 or truncated:
+        print(
+            f"Catching up on {sum(len(p) for p in pages)} mentions across "
+            f"{len(pages)} pages{' (more pending)' if truncated else ''}",
+            flush=True,
+        )
+    worked = 0
+    for page in pages:
+        result = handle(page)
+        worked += result.worked
+        if not result.done:
+            return False, worked
+    return not truncated, worked
+
+
+class PollingSource:
+    def __init__(self, scheduler: Optional[PollScheduler] = None):
+        self.scheduler = scheduler or PollScheduler()
+
+    def run(self, fetch: Fetch, handle: Handle, stop: Optional[threading.Event] = None) -> None:
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                _caught_up, worked = drain_backlog(fetch, handle)
+            except TweepyHTTPException as exc:
+                status_code = getattr(getattr(exc, "response", None), "status_code", None)
+                if status_code == 402:
+                    # Avoid crash-looping if the X account does not have API credits enabled yet.
+                    print(
+                        f"X API returned 402 Payment Required. Backing off for {PAYMENT_REQUIRED_BACKOFF_SECONDS}s.",
+                        flush=True,
+                    )
+                    stop.wait(PAYMENT_REQUIRED_BACKOFF_SECONDS)
+                    continue
+                print(f"X API error fetching mentions: {exc}", flush=True)
+                stop.wait(POLL_SECONDS)
+                continue
+            except Exception as exc:
+                print(f"Unexpected error fetching mentions: {exc}", flush=True)
+                stop.wait(POLL_SECONDS)
+                continue
+
+            # Count only mentions that needed work: ones that completed past a
+            # gap are re-fetched until the watermark catches up, and are not
+            # arrivals. A backlog keeps the poller in its fast lane, which is
+            # what drains the rest of it on the next cycle.
+            self.scheduler.record_poll(worked)
+            stop.wait(self.scheduler.next_delay())
+
+
+class _Disconnected:
+    def __init__(self, error: Optional[BaseException]):
+        self.error = error
+
+
+class FilteredStreamSource:
+    def __init__(
+        self,
+        bearer_token: str,
+        handle_name: str,
+        *,
+        base_url: Optional[str] = None,
+        batch_size: int = STREAM_BATCH_SIZE,
+        read_timeout: float = STREAM_READ_TIMEOUT_SECONDS,
+        max_backoff: float = STREAM_MAX_BACKOFF_SECONDS,
+    ):
+        self.base_url = (
+            base_url
+            or os.getenv("X_STREAM_BASE_URL")
+            or os.getenv("X_API_BASE_URL", "https://api.x.com")
+        ).rstrip("/")
+        # Exclude our own posts: replies we send would otherwise match.
+        self.rule = f"@{handle_name} -from:{handle_name}"
+        self.batch_size = max(1, batch_size)
+        self.read_timeout = read_timeout
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {bearer_token}"
+        # Ids of the installed mention rule, for a copy installed before it
+        # was tagged; filled in by ensure_rule.
+        self.rule_ids: Set[str] = set()
+
+    def ensure_rule(self) -> None:
+        """Install the mention rule unless an identical one already exists."""
+        url = f"{self.base_url}/2/tweets/search/stream/rules"
+        response = self.session.get(url, timeout=10)
+        response.raise_for_status()
+        existing = response.json().get("data") or []
+        self.rule_ids = {str(rule.get("id")) for rule in existing if rule.get("value") == self.rule}
+        if self.rule_ids:
+            return
+        response = self.session.post(
+            url, json={"add": [{"value": self.rule, "tag": STREAM_RULE_TAG}]}, timeout=10
+        )
+        response.raise_for_status()
+        created = response.json().get("data") or []
+        self.rule_ids = {str(rule.get("id")) for rule in created if rule.get("value") == self.rule}
+
+    def is_mention(self, payload: Dict[str, Any]) -> bool:
+        """Whether a stream payload matched this source's rule rather than
+        another rule on the same app."""
+        return any(
+            rule.get("tag") == STREAM_RULE_TAG or str(rule.get("id")) in self.rule_ids
+            for rule in payload.get("matching_rules") or []
+        )
+
+    def _read(self, response: requests.Response, out: "queue.Queue[Any]", stop: threading.Event) -> None:
+        error: Optional[BaseException] = None
+        try:
+            for line in response.iter_lines():
+                if stop.is_set():
+                    break
+                if not line:
+                    continue  # keep-alive
+                payload = json.loads(line)
+                data = payload.get("data")
+                if data and self.is_mention(payload):
+                    out.put(tweepy.Tweet(data))
+        except (requests.RequestException, ValueError) as exc:
+            error = exc
+        finally:
+            response.close()
+            out.put(_Disconnected(error))
+
+    def _take_batch(self, first: Any, inbox: "queue.Queue[Any]") -> Tuple[List[Any], Optional[_Disconnected]]:
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                item = inbox.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, _Disconnected):
+                return batch, item
+            batch.append(item)
+        return batch, None
+
+    def _consume(self, response: requests.Response, fetch: Fetch, handle: Handle, stop: threading.Event) -> None:
+        inbox: "queue.Queue[Any]" = queue.Queue()
+        reader = threading.Thread(
+            target=self._read, args=(response, inbox, stop), name="x-stream-reader", daemon=True
+        )
+        reader.start()
+        while not stop.is_set():
+            try:
+                item = inbox.get(timeout=1)
+            except queue.Empty:
+                continue
+            if isinstance(item, _Disconnected):
+                if item.error:
+                    print(f"X stream disconnected: {item.error}", flush=True)
+                return
+            batch, disconnected = self._take_batch(item, inbox)
+            if not handle(batch).done:
+                # The failed mention is held behind the watermark; the poller
+                # path re-fetches it (and skips what already completed).
+                self._backfill(fetch, handle)
+            if disconnected:
+                return
+        response.close()
+
+    def _backfill(self, fetch: Fetch, handle: Handle) -> None:
+        try:
+            drain_backlog(fetch, handle)
+        except Exception as exc:
+            print(f"Error backfilling mentions: {exc}", flush=True)
+
+    def run(self, fetch: Fetch, handle: Handle, stop: Optional[threading.Event] = None) -> None:
+        stop = stop or threading.Event()
+        backoff = 1.0
+        while not stop.is_set():
+            try:
+                self.ensure_rule()
+                response = self.session.get(
+                    f"{self.base_url}/2/tweets/search/stream",
+                    params={"tweet.fields": STREAM_TWEET_FIELDS},
+                    stream=True,
+                    timeout=(10, self.read_timeout),
+                )
+                response.raise_for_status()
+            except requests.RequestException as exc:
+                # X asks clients to back off exponentially on failed connects.
+                print(f"X stream connect failed: {exc}; retrying in {backoff:g}s", flush=True)
+                stop.wait(backoff)
+                backoff = min(self.max_backoff, backoff * 2)
+                continue
+
+            backoff = 1.0
+            # Whatever arrived while we were disconnected.
+            self._backfill(fetch, handle)
+            self._consume(response, fetch, handle, stop)
+
+
+class WebhookSource:
+    """Mentions pushed by X to the worker app's webhook route (webhook.py).
+
+    The route persists each mention before acknowledging it; this source
+    marks them done once `handle` completes them. Mentions still pending --
+    left by a failed batch or a restart -- are replayed whenever the inbox
+    has been idle for `retry_seconds`, so a failed card push is retried
+    without spending mentions-endpoint quota. The endpoint is used once, on
+    start, to backfill whatever was posted while nothing was receiving.
+    """
+
+    def __init__(
+        self,
+        inbox: "Optional[queue.Queue[Any]]" = None,
+        *,
+        batch_size: int = STREAM_BATCH_SIZE,
+        retry_seconds: float = POLL_SECONDS,
+        replay: bool = True,
+    ):
+        if inbox is None:
+            from webhook import INBOX as inbox
+        self.inbox = inbox
+        self.batch_size = max(1, batch_size)
+        self.retry_seconds = retry_seconds
+        # Off when the listener feeds the SQL work queue: pending rows are
+        # the queue workers' to claim, not this source's to replay.
+        self.replay = replay
+
+    def _tracking(self, handle: Handle) -> Handle:
+        def wrapped(batch: List[Any]) -> BatchResult:
+            result = handle(batch)
+            # Also covers mentions the backfill found: a persisted copy of
+            # one of those must not be replayed as if it were still pending.
+            mark_done(result.completed)
+            return result
+
+        return wrapped
+
+    def _replay(self, handle: Handle) -> None:
+        rows = list_pending(self.batch_size)
+        if rows:
+            handle([tweepy.Tweet(row["payload"]) for row in rows])
+
+    def run(self, fetch: Fetch, handle: Handle, stop: Optional[threading.Event] = None) -> None:
+        stop = stop or threading.Event()
+        handle = self._tracking(handle)
+        try:
+            drain_backlog(fetch, handle)
+        except Exception as exc:
+            print(f"Error backfilling mentions: {exc}", flush=True)
+        while not stop.is_set():
+            try:
+                batch = [self.inbox.get(timeout=self.retry_seconds)]
+            except queue.Empty:
+                if not self.replay:
+                    continue
+                try:
+                    self._replay(handle)
+                except Exception as exc:
+                    print(f"Error replaying pending webhook mentions: {exc}", flush=True)
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.inbox.get_nowait())
+                except queue.Empty:
+                    break
+            handle([tweepy.Tweet(payload) for payload in batch])
+
+
+def build_mention_source(
+    bot: Any, scheduler: Optional[PollScheduler] = None, *, queued: bool = False
+) -> Any:
+    """The source named by LISTENER_SOURCE: "poll" (the default), "stream",
+    or "webhook". `queued` says batches go to the SQL work queue rather
+    than being processed by `handle` itself."""
+    kind = os.getenv("LISTENER_SOURCE", "poll").strip().lower()
+    if kind == "stream":
+        bearer = os.getenv("X_BEARER_TOKEN", "").strip()
+        if not bearer:
+            raise RuntimeError("LISTENER_SOURCE=stream needs X_BEARER_TOKEN (app-only auth)")
+        return FilteredStreamSource(bearer, bot.username)
+    if kind == "webhook":
+        return WebhookSource(replay=not queued)
+    if kind != "poll":
+        raise RuntimeError(
+            f"Unknown LISTENER_SOURCE {kind!r}; expected 'poll', 'stream' or 'webhook'"
+        )
+    return PollingSource(scheduler)
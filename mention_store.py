@@ -0,0 +1,349 @@
+"""Persisted inbound mentions, and the listener's SQL work queue over them.
+
+A mention row is `pending` until processed (`done`). With LISTENER_QUEUE=sql
+the table is also the hand-off between ingestion and processing, so any
+number of listener replicas can share the work:
+
+- `claim_mentions` moves claimable rows to `claimed` under a lease. On
+  Postgres the candidate rows are locked `FOR UPDATE SKIP LOCKED`, so
+  concurrent claimers take disjoint rows without queueing behind each
+  other. SQLite has no row locks (the clause compiles away); its writes
+  are already serialized by `BEGIN IMMEDIATE`, so select-then-update in one
+  write transaction is just as exclusive.
+- A worker renews its lease while it processes the row (`hold_lease`), so
+  a slow mention -- a near-duplicate deferral, a long Grok call, a full
+  bulkhead, a streamed reply -- is never taken over and answered twice. A
+  lease that lapses -- the worker died, or hung past MAX_LEASE_SECONDS --
+  makes the row claimable again, so no mention is stranded.
+- `release_mention` hands a failed row back with a retry delay; once a row
+  has been claimed `MENTION_MAX_ATTEMPTS` times it is dead-lettered
+  (`dead`) instead, for an operator to look at. `defer_mention` hands one
+  back untried (its author is rate limited) without spending an attempt.
+
+A row is only claimable while no older row of its conversation is still
+pending or claimed, which keeps replies within a thread in order across
+replicas, as `listener._run_lane` does within one.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import and_, exists, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from storage_db import mentions, read_connection, row_to_dict, serialize_record, utc_now, write_connection
+
+STATUS_PENDING = "pending"
+STATUS_CLAIMED = "claimed"
+STATUS_DONE = "done"
+STATUS_DEAD = "dead"
+
+MAX_ATTEMPTS = int(os.getenv("MENTION_MAX_ATTEMPTS", "5"))
+# How long a claim lasts unrenewed. A live worker renews it every third of
+# this, so it only bounds how soon a dead worker's mention is taken over.
+VISIBILITY_TIMEOUT_SECONDS = float(os.getenv("MENTION_VISIBILITY_TIMEOUT_SECONDS", "60"))
+# A worker stops renewing after this long on one mention, so a wedged one
+# cannot hold it (and the rest of its conversation) forever.
+MAX_LEASE_SECONDS = float(os.getenv("MENTION_MAX_LEASE_SECONDS", "1800"))
+RETRY_DELAY_SECONDS = float(os.getenv("MENTION_RETRY_DELAY_SECONDS", "30"))
+
+_UNFINISHED = (STATUS_PENDING, STATUS_CLAIMED)
+
+
+def queue_id(tweet_id: Any, account: Optional[str] = None) -> str:
+    """The row id for a mention of `account`. One post can mention several
+    of our accounts, and each of them answers it."""
+    return f"{account}/{tweet_id}" if account else str(tweet_id)
+
+
+def record_mention(payload: Dict[str, Any], source: str, account: Optional[str] = None) -> bool:
+    """Persist one inbound mention. True if it is new.
+
+    `payload` is the mention as an X API v2 tweet dict and must carry `id`;
+    `account` names the bot account it mentioned, which must answer it.
+    A redelivery of a mention already recorded is not an error -- push
+    sources deliver at least once -- it just returns False.
+    """
+    conversation_id = payload.get("conversation_id")
+    row = {
+        "id": queue_id(payload["id"], account),
+        "source": source,
+        "payload": payload,
+        "conversation_id": str(conversation_id) if conversation_id else None,
+        "account": account or None,
+        "status": STATUS_PENDING,
+        "attempts": 0,
+        "lease_owner": "",
+        "lease_expires_at": None,
+        "last_error": None,
+        "created_at": utc_now(),
+        "updated_at": None,
+    }
+    try:
+        with write_connection() as conn:
+            conn.execute(insert(mentions).values(**row))
+    except IntegrityError:
+        with read_connection() as conn:
+            present = conn.execute(select(mentions.c.id).where(mentions.c.id == row["id"])).fetchone()
+        # Anything other than the duplicate key this tolerates must surface.
+        if not present:
+            raise
+        return False
+    return True
+
+
+def list_pending(limit: int = 100) -> List[Dict[str, Any]]:
+    """Recorded mentions not yet processed, oldest first."""
+    query = (
+        select(mentions)
+        .where(mentions.c.status == STATUS_PENDING)
+        .order_by(mentions.c.created_at.asc(), mentions.c.id.asc())
+        .limit(limit)
+    )
+    with read_connection() as conn:
+        rows = conn.execute(query).fetchall()
+    return [serialize_record(row_to_dict(row)) for row in rows]
+
+
+def mark_done(mention_ids: Iterable[Any]) -> None:
+    ids = [str(mention_id) for mention_id in mention_ids]
+    if not ids:
+        return
+    with write_connection() as conn:
+        conn.execute(
+            update(mentions)
+            .where(mentions.c.id.in_(ids))
+            .values(status=STATUS_DONE, updated_at=utc_now())
+        )
+
+
+def claim_mentions(
+    owner: str,
+    limit: int = 1,
+    visibility_timeout: Optional[float] = None,
+    max_attempts: Optional[int] = None,
+    accounts: Optional[Iterable[str]] = None,
+) -> List[Dict[str, Any]]:
+    """Lease up to `limit` claimable mentions to `owner`, oldest first.
+
+    Claimable: pending and past any retry delay, or claimed under a lease
+    that has lapsed. A lapsed row that has already used up its attempts is
+    dead-lettered here rather than handed out again -- a mention that keeps
+    killing its worker never gets to complete or release itself.
+
+    `accounts` limits the claim to mentions of those accounts ("" for the
+    single X_* account), for a replica that can only answer as them; other
+    replicas' rows are never touched, so they spend none of their attempts.
+    """
+    visibility = VISIBILITY_TIMEOUT_SECONDS if visibility_timeout is None else visibility_timeout
+    max_attempts = MAX_ATTEMPTS if max_attempts is None else max_attempts
+    now = utc_now()
+    older = mentions.alias("older")
+    blocked = exists().where(
+        and_(
+            older.c.conversation_id == mentions.c.conversation_id,
+            older.c.status.in_(_UNFINISHED),
+            or_(
+                older.c.created_at < mentions.c.created_at,
+                and_(older.c.created_at == mentions.c.created_at, older.c.id < mentions.c.id),
+            ),
+        )
+    )
+    conditions = [
+        mentions.c.status.in_(_UNFINISHED),
+        or_(mentions.c.lease_expires_at.is_(None), mentions.c.lease_expires_at <= now),
+        or_(mentions.c.conversation_id.is_(None), ~blocked),
+    ]
+    if accounts is not None:
+        accounts = set(accounts)
+        named = mentions.c.account.in_(sorted(accounts - {""}))
+        conditions.append(or_(mentions.c.account.is_(None), named) if "" in accounts else named)
+    query = (
+        select(mentions)
+        .where(*conditions)
+        .order_by(mentions.c.created_at.asc(), mentions.c.id.asc())
+        .with_for_update(of=mentions, skip_locked=True)
+    )
+    claimed: List[Dict[str, Any]] = []
+    with write_connection() as conn:
+        # A dead-lettered row stops blocking the rest of its conversation,
+        # so look again (inside the same transaction) after burying one.
+        buried = True
+        while buried and len(claimed) < limit:
+            buried = False
+            for row in conn.execute(query.limit(max(1, limit - len(claimed)))).fetchall():
+                record = row_to_dict(row)
+                if record["attempts"] >= max_attempts:
+                    conn.execute(
+                        update(mentions)
+                        .where(mentions.c.id == record["id"])
+                        .values(
+                            status=STATUS_DEAD,
+                            lease_owner="",
+                            lease_expires_at=None,
+                            last_error=record["last_error"] or "lease expired on every attempt",
+                            updated_at=now,
+                        )
+                    )
+                    print(f"Dead-lettered mention {record['id']} after {record['attempts']} attempts", flush=True)
+                    buried = True
+                    continue
+                values = {
+                    "status": STATUS_CLAIMED,
+                    "attempts": record["attempts"] + 1,
+                    "lease_owner": owner,
+                    "lease_expires_at": now + timedelta(seconds=visibility),
+                    "updated_at": now,
+                }
+                conn.execute(update(mentions).where(mentions.c.id == record["id"]).values(**values))
+                record.update(values)
+                claimed.append(serialize_record(record))
+    return claimed
+
+
+def _owned(mention_id: Any, owner: str) -> Any:
+    return and_(
+        mentions.c.id == str(mention_id),
+        mentions.c.status == STATUS_CLAIMED,
+        mentions.c.lease_owner == owner,
+    )
+
+
+def extend_lease(mention_id: Any, owner: str, visibility_timeout: Optional[float] = None) -> bool:
+    """Push a claimed mention's lease out to a full visibility timeout from
+    now. False if `owner` no longer holds it."""
+    visibility = VISIBILITY_TIMEOUT_SECONDS if visibility_timeout is None else visibility_timeout
+    now = utc_now()
+    with write_connection() as conn:
+        result = conn.execute(
+            update(mentions)
+            .where(_owned(mention_id, owner))
+            .values(lease_expires_at=now + timedelta(seconds=visibility), updated_at=now)
+        )
+    return result.rowcount > 0
+
+
+@contextmanager
+def hold_lease(
+    mention_id: Any,
+    owner: str,
+    visibility_timeout: Optional[float] = None,
+    max_seconds: Optional[float] = None,
+) -> Iterator[None]:
+    """Keep `owner`'s lease on a claimed mention while the block runs.
+
+    A heartbeat thread renews it every third of the visibility timeout, for
+    up to `max_seconds` in all. It gives up once the lease is lost; the
+    block is not interrupted, and `complete_mention` then reports it.
+    """
+    visibility = VISIBILITY_TIMEOUT_SECONDS if visibility_timeout is None else visibility_timeout
+    limit = MAX_LEASE_SECONDS if max_seconds is None else max_seconds
+    stop = threading.Event()
+    began = time.monotonic()
+
+    def heartbeat() -> None:
+        while not stop.wait(visibility / 3):
+            if time.monotonic() - began >= limit:
+                print(
+                    f"Mention {mention_id} still running after {limit:.0f}s; lease left to lapse", flush=True
+                )
+                return
+            try:
+                if not extend_lease(mention_id, owner, visibility):
+                    return
+            except Exception as exc:
+                # Try again next beat; the lease has two more beats left.
+                print(f"Error renewing the lease on mention {mention_id}: {exc}", flush=True)
+
+    thread = threading.Thread(target=heartbeat, name=f"lease-{mention_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+
+
+def complete_mention(mention_id: Any, owner: str) -> bool:
+    """Mark a claimed mention done. False if `owner` no longer holds the
+    lease (it lapsed and another worker took the mention over)."""
+    with write_connection() as conn:
+        result = conn.execute(
+            update(mentions)
+            .where(_owned(mention_id, owner))
+            .values(status=STATUS_DONE, lease_owner="", lease_expires_at=None, updated_at=utc_now())
+        )
+    return result.rowcount > 0
+
+
+def release_mention(
+    mention_id: Any,
+    owner: str,
+    error: str = "",
+    retry_delay: Optional[float] = None,
+    max_attempts: Optional[int] = None,
+) -> Optional[str]:
+    """Hand a claimed mention back after a failed attempt.
+
+    Returns the row's new status -- pending (claimable again after
+    `retry_delay`) or dead once its attempts are used up -- or None if
+    `owner` no longer holds the lease.
+    """
+    delay = RETRY_DELAY_SECONDS if retry_delay is None else retry_delay
+    max_attempts = MAX_ATTEMPTS if max_attempts is None else max_attempts
+    now = utc_now()
+    with write_connection() as conn:
+        row = conn.execute(select(mentions.c.attempts).where(_owned(mention_id, owner))).fetchone()
+        if row is None:
+            return None
+        dead = row.attempts >= max_attempts
+        status = STATUS_DEAD if dead else STATUS_PENDING
+        conn.execute(
+            update(mentions)
+            .where(_owned(mention_id, owner))
+            .values(
+                status=status,
+                lease_owner="",
+                lease_expires_at=None if dead else now + timedelta(seconds=delay),
+                last_error=error or None,
+                updated_at=now,
+            )
+        )
+    if dead:
+        print(f"Dead-lettered mention {mention_id} after {row.attempts} attempts: {error}", flush=True)
+    return status
+
+
+def defer_mention(mention_id: Any, owner: str, delay: float, reason: str = "") -> bool:
+    """Hand a claimed mention back untried, claimable again after `delay`.
+
+    Unlike `release_mention` this is not a failed attempt: the claim's
+    attempt is given back, so a mention deferred many times (its author is
+    being rate limited) is never dead-lettered for it. False if `owner` no
+    longer holds the lease.
+    """
+    now = utc_now()
+    with write_connection() as conn:
+        result = conn.execute(
+            update(mentions)
+            .where(_owned(mention_id, owner))
+            .values(
+                status=STATUS_PENDING,
+                attempts=mentions.c.attempts - 1,
+                lease_owner="",
+                lease_expires_at=now + timedelta(seconds=delay),
+                last_error=reason or None,
+                updated_at=now,
+            )
+        )
+    return result.rowcount > 0
+
+
+def queue_depths() -> Dict[str, int]:
+    """Row count per status."""
+    query = select(mentions.c.status, func.count()).group_by(mentions.c.status)
+    with read_connection() as conn:
+        return {status: count for status, count in conn.execute(query).fetchall()}
@@ -0,0 +1,231 @@
+"""In-process metrics, rendered in the Prometheus text format.
+
+The worker app serves `render()` at `/metrics`. There is no client library
+here, and the exposition format is small enough not to need one: counters,
+gauges and cumulative-bucket histograms keyed by label values. Quantiles
+(p50/p95/p99) are the scraper's job -- `histogram_quantile` over the
+`_bucket` series -- which also makes them aggregate correctly across
+replicas.
+
+Listener stages are timed with `timed(stage, member=...)`; see
+`STAGE_SECONDS`.
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds. Spans a cache hit on the timeline server to a slow Grok answer
+# (XAI_TIMEOUT_SECONDS defaults to 120).
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(values: Dict[str, object]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in values.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: object) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: object) -> float:
+        with self._lock:
+            return self._values.get(_labels(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in values
+        ]
+
+
+Collect = Callable[[], Sequence[Tuple[Dict[str, object], float]]]
+
+
+class Collected(_Metric):
+    """Values read at scrape time from `collect`, which returns
+    (labels, value) pairs -- for numbers another component already keeps.
+    `kind` is "gauge", or "counter" for totals that only ever grow."""
+
+    def __init__(self, name: str, help_text: str, collect: Collect, kind: str = "gauge"):
+        super().__init__(name, help_text)
+        self.collect = collect
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for labels, value in self.collect():
+            lines.append(f"{self.name}{_format_labels(_labels(labels))} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (per-bucket counts, with +Inf last; sum)
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = _labels(labels)
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+            total[0] += value
+
+    def count(self, **labels: object) -> int:
+        with self._lock:
+            series = self._series.get(_labels(labels))
+            return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._series.items())
+        lines = self._header()
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(key, ('le', _format_value(bound)))} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.setdefault(metric.name, metric)
+            return self._metrics[metric.name]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as exc:
+                # One broken collector must not take the whole scrape down.
+                print(f"Error collecting metric {metric.name}: {exc}", flush=True)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help_text: str) -> Counter:
+    return REGISTRY.register(Counter(name, help_text))  # type: ignore[return-value]
+
+
+def histogram(name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help_text, buckets))  # type: ignore[return-value]
+
+
+def collected(name: str, help_text: str, collect: Collect, kind: str = "gauge") -> Collected:
+    return REGISTRY.register(Collected(name, help_text, collect, kind))  # type: ignore[return-value]
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+STAGE_SECONDS = histogram(
+    "listener_stage_seconds",
+    "Time spent in each listener stage (fetch, route, handle, push_card, create_tweet, mention).",
+)
+STAGE_ERRORS = counter("listener_stage_errors_total", "Listener stage calls that raised or failed.")
+RETRIES = counter("listener_retries_total", "Listener retries, by stage.")
+
+
+@contextmanager
+def timed(stage: str, member: str = "") -> Iterator[Dict[str, str]]:
+    """Time a listener stage into STAGE_SECONDS, counting a raise as an error.
+
+    Yields the label dict, so a caller that only learns the member inside
+    the block (routing) can fill it in before the observation is recorded.
+    """
+    labels = {"stage": stage, "member": member}
+    started = time.monotonic()
+    try:
+        yield labels
+    except BaseException:
+        STAGE_ERRORS.inc(**labels)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.monotonic() - started, **labels)
+
+
+def _timeline_series(key: str) -> List[Tuple[Dict[str, object], float]]:
+    from timeline_client import timeline_stats
+
+    return [({"op": op}, entry.get(key, 0)) for op, entry in sorted(timeline_stats().items())]
+
+
+# The shared timeline client keeps its own per-op counters
+# (TimelineClient.stats); read them at scrape time rather than twice.
+for _key, _name, _help in (
+    ("count", "timeline_client_calls_total", "Timeline/A2A HTTP calls, by op."),
+    ("errors", "timeline_client_errors_total", "Timeline/A2A HTTP calls that failed, by op."),
+    ("retries", "timeline_client_retries_total", "Timeline/A2A HTTP retries, by op."),
+    ("total_seconds", "timeline_client_seconds_total", "Seconds spent in timeline/A2A HTTP calls, by op."),
+):
+    collected(_name, _help, lambda key=_key: _timeline_series(key), kind="counter")
@@ -0,0 +1,97 @@
+"""Adaptive poll pacing for the listener's mentions endpoint.
+
+A fixed sleep is wrong in both directions: while mentions are flooding in it
+adds up to a whole interval to every reply, and while the account is quiet
+it spends requests finding nothing. `PollScheduler` polls at `min_interval`
+right after a poll that found mentions and backs off geometrically towards
+`max_interval` while polls come back empty.
+
+Whatever the arrival rate asks for, the X rate-limit window is a floor. X
+reports `x-rate-limit-remaining` / `x-rate-limit-reset` on every response;
+tweepy does not surface them on its parsed `Response`, so `attach()` hooks
+the client's `requests` session instead. Spreading the remaining requests
+evenly over the rest of the window means the listener never burns its quota
+early and then sits in tweepy's `wait_on_rate_limit` sleep until the reset.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Mapping, Optional
+
+POLL_MIN_INTERVAL_SECONDS = float(os.getenv("POLL_MIN_INTERVAL_SECONDS", "5"))
+# Idle ceiling. Defaults to the historical fixed interval, so a quiet account
+# is never polled less often than before.
+POLL_MAX_INTERVAL_SECONDS = float(
+    os.getenv("POLL_MAX_INTERVAL_SECONDS", os.getenv("POLL_INTERVAL_SECONDS", "60"))
+)
+POLL_IDLE_BACKOFF = float(os.getenv("POLL_IDLE_BACKOFF", "2"))
+
+# Requests kept in reserve at the end of a window, for the retries and
+# catch-up pages that don't go through the scheduler.
+_RATE_LIMIT_HEADROOM = 1
+
+
+class PollScheduler:
+    def __init__(
+        self,
+        min_interval: float = POLL_MIN_INTERVAL_SECONDS,
+        max_interval: float = POLL_MAX_INTERVAL_SECONDS,
+        idle_backoff: float = POLL_IDLE_BACKOFF,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.idle_backoff = max(1.0, idle_backoff)
+        self._clock = clock
+        self._interval = min_interval
+        self._remaining: Optional[int] = None
+        self._reset_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record_poll(self, found: int) -> None:
+        """Adjust the arrival-driven interval after a poll returned `found`."""
+        with self._lock:
+            if found:
+                self._interval = self.min_interval
+            else:
+                self._interval = min(self.max_interval, self._interval * self.idle_backoff)
+
+    def observe_rate_limit(self, headers: Mapping[str, str]) -> None:
+        """Record the rate-limit window from a mentions-endpoint response."""
+        try:
+            remaining = int(headers["x-rate-limit-remaining"])
+            reset_at = float(headers["x-rate-limit-reset"])
+        except (KeyError, TypeError, ValueError):
+            return
+        with self._lock:
+            self._remaining = remaining
+            self._reset_at = reset_at
+
+    def next_delay(self) -> float:
+        """Seconds to sleep before the next poll."""
+        with self._lock:
+            delay = self._interval
+            if self._remaining is None or self._reset_at is None:
+                return delay
+            window = self._reset_at - self._clock()
+            if window <= 0:
+                # The window has rolled over; the next response reports the
+                # new one.
+                return delay
+            spendable = self._remaining - _RATE_LIMIT_HEADROOM
+            if spendable <= 0:
+                # Out of budget: sleeping to the reset ourselves beats a
+                # blocking 429 retry inside tweepy.
+                return max(delay, window + 1)
+            return max(delay, window / spendable)
+
+    def attach(self, client: Any, route: str = "/mentions") -> None:
+        """Read rate-limit headers off every `client` response for `route`."""
+
+        def _hook(response: Any, *_args: Any, **_kwargs: Any) -> Any:
+            if route in getattr(response, "url", ""):
+                self.observe_rate_limit(response.headers)
+            return response
+
+        client.session.hooks["response"].append(_hook)
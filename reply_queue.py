@@ -0,0 +1,518 @@
+"""Rate-limited reply posting, off the mention path.
+
+`process_mention` used to call `create_tweet` inline. With the client's
+`wait_on_rate_limit=True`, a 429 on posting put that call to sleep until the
+window reset -- and with it the poll loop, routing and card pushes for every
+other mention. Posting has its own, much smaller quota than reading, so the
+two should not throttle each other.
+
+`ReplyPoster` owns posting instead. `submit` queues a reply and returns at
+once; one background thread posts queued replies oldest-first, paced by a
+`TokenBucket` sized to the posting limit (and kept honest by the
+`x-rate-limit-*` headers X returns on each post). Transient failures --
+connection errors and 5xx -- are retried with exponential backoff; a 429
+waits for the window to reset without spending an attempt. A reply that
+still cannot be posted goes to its `on_failure` callback, which the listener
+uses to push the failed-reply card to the timeline.
+
+The mention a queued reply answers already counts as done, so a poster
+created with an `account` persists its queue (see reply_store): a reply is
+written to the database when it is submitted and deleted once it is posted
+or given up on. Replies a stopped process left behind are adopted and
+posted by the next poster for the account.
+"""
+
+import asyncio
+import heapq
+import inspect
+import itertools
+import os
+import socket
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+import requests
+import tweepy
+
+from metrics import RETRIES, collected, timed
+from reply_store import REPLY_LEASE_SECONDS, adopt_replies, forget_reply, renew_replies, save_reply
+
+# X's per-user posting limit. The default is the v2 POST /2/tweets limit on
+# the paid tiers; set it to the account's own.
+REPLY_RATE_LIMIT = int(os.getenv("X_REPLY_RATE_LIMIT", "100"))
+REPLY_RATE_WINDOW_SECONDS = float(os.getenv("X_REPLY_RATE_WINDOW_SECONDS", "900"))
+# Replies that may go out back-to-back before pacing kicks in.
+REPLY_BURST = max(1, int(os.getenv("X_REPLY_BURST", "5")))
+REPLY_MAX_ATTEMPTS = max(1, int(os.getenv("X_REPLY_MAX_ATTEMPTS", "4")))
+REPLY_RETRY_BACKOFF_SECONDS = float(os.getenv("X_REPLY_RETRY_BACKOFF_SECONDS", "5"))
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `capacity`.
+
+    X's own accounting wins when it is stricter: `observe_rate_limit` caps
+    the bucket at the posts X says are left, and holds it empty until the
+    reset once they are gone.
+    """
+
+    def __init__(
+        self,
+        rate: float = REPLY_RATE_LIMIT / REPLY_RATE_WINDOW_SECONDS,
+        capacity: float = REPLY_BURST,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self) -> float:
+        """Take a token if one is available and return 0, or return the
+        seconds until one will be (without taking it)."""
+        with self._lock:
+            now = self._clock()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def give_back(self) -> None:
+        """Return a token `take` handed out but that was never spent."""
+        with self._lock:
+            self._refill(self._clock())
+            self._tokens = min(self.capacity, self._tokens + 1)
+
+    def block_until(self, reset_at: float) -> None:
+        """Hold the bucket empty until `reset_at`, when X's window renews
+        and the burst is available again."""
+        with self._lock:
+            self._tokens = self.capacity
+            self._updated = max(self._updated, reset_at)
+            self._blocked_until = max(self._blocked_until, reset_at)
+
+    def observe_rate_limit(self, headers: Mapping[str, str]) -> None:
+        """Record X's view of the posting window from a response."""
+        try:
+            remaining = int(headers["x-rate-limit-remaining"])
+            reset_at = float(headers["x-rate-limit-reset"])
+        except (KeyError, TypeError, ValueError):
+            return
+        if remaining <= 0:
+            self.block_until(reset_at + 1)
+            return
+        with self._lock:
+            now = self._clock()
+            if now >= self._blocked_until:
+                self._refill(now)
+            self._tokens = min(self._tokens, remaining)
+
+    def attach(self, client: Any) -> None:
+        """Read rate-limit headers off every post `client` makes."""
+
+        def _hook(response: Any, *_args: Any, **_kwargs: Any) -> Any:
+            request = getattr(response, "request", None)
+            path = urlparse(getattr(response, "url", "")).path.rstrip("/")
+            if getattr(request, "method", "") == "POST" and path.endswith("/2/tweets"):
+                self.observe_rate_limit(response.headers)
+            return response
+
+        client.session.hooks["response"].append(_hook)
+
+
+class Reply(NamedTuple):
+    text: str
+    in_reply_to_tweet_id: Any
+    # Called with the final error once the reply is given up on.
+    on_failure: Optional[Callable[[BaseException], None]]
+    member: str = ""  # the team member replying, for metrics
+    attempts: int = 0
+    row_id: Optional[str] = None  # its reply_store row, when persisted
+
+
+def _is_transient(exc: BaseException) -> bool:
+    return isinstance(exc, (tweepy.TwitterServerError, requests.ConnectionError, requests.Timeout))
+
+
+def _reset_at(exc: BaseException) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers["x-rate-limit-reset"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _report_hook_error(reply: Reply, exc: BaseException) -> None:
+    print(f"Error reporting failed reply to mention {reply.in_reply_to_tweet_id}: {exc}", flush=True)
+
+
+# Distinguishes posters within a process in their reply_store leases.
+_OWNER_IDS = itertools.count()
+
+
+class ReplyPoster:
+    """Posts replies from a paced, retrying in-memory queue.
+
+    With an `account`, the queue is persisted under it; `on_failure(reply,
+    exc)` then reports a reply given up on that has no hook of its own --
+    one adopted from a stopped poster.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        bucket: Optional[TokenBucket] = None,
+        *,
+        max_attempts: int = REPLY_MAX_ATTEMPTS,
+        backoff: float = REPLY_RETRY_BACKOFF_SECONDS,
+        clock: Callable[[], float] = time.time,
+        account: Optional[str] = None,
+        on_failure: Optional[Callable[[Reply, BaseException], Any]] = None,
+    ):
+        self.client = client
+        self.account = account
+        self.on_failure = on_failure
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{next(_OWNER_IDS)}"
+        # reply_store rows of the replies queued here, whose leases it renews.
+        self._held: Set[str] = set()
+        self.bucket = bucket or TokenBucket(clock=clock)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff = backoff
+        self._clock = clock
+        # (ready at, sequence, reply): retries wait here without holding up
+        # replies queued behind them.
+        self._heap: List[Tuple[float, int, Reply]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.posted = 0
+        self.failed = 0
+
+    def submit(
+        self,
+        text: str,
+        in_reply_to_tweet_id: Any,
+        on_failure: Optional[Callable[[BaseException], None]] = None,
+        member: str = "",
+    ) -> None:
+        reply = self._persist(Reply(text, in_reply_to_tweet_id, on_failure, member))
+        self._schedule(reply, self._clock())
+
+    def _persist(self, reply: Reply) -> Reply:
+        if self.account is None:
+            return reply
+        try:
+            row_id = save_reply(
+                self.account, self.owner, reply.text, reply.in_reply_to_tweet_id, reply.member
+            )
+        except Exception as exc:
+            # Still worth posting; it just won't survive a restart.
+            print(f"Error persisting reply to mention {reply.in_reply_to_tweet_id}: {exc}", flush=True)
+            return reply
+        with self._cond:
+            self._held.add(row_id)
+        return reply._replace(row_id=row_id)
+
+    def _forget(self, reply: Reply) -> None:
+        """Delete a posted or abandoned reply's row."""
+        if reply.row_id is None:
+            return
+        with self._cond:
+            self._held.discard(reply.row_id)
+        try:
+            forget_reply(reply.row_id)
+        except Exception as exc:
+            # Its lease lapses unrenewed, and the reply is posted again.
+            print(f"Error forgetting reply to mention {reply.in_reply_to_tweet_id}: {exc}", flush=True)
+
+    def keep_replies(self) -> List[Reply]:
+        """Renew the leases on this poster's persisted replies and adopt the
+        ones a stopped poster left behind. Returns those, to be queued."""
+        with self._cond:
+            held = list(self._held)
+        renew_replies(self.owner, held)
+        rows = adopt_replies(self.account or "", self.owner)
+        adopted = [
+            Reply(row["text"], row["in_reply_to_tweet_id"], None, row["member"], row_id=row["id"])
+            for row in rows
+        ]
+        if adopted:
+            with self._cond:
+                self._held.update(reply.row_id for reply in adopted)
+            print(f"Recovered {len(adopted)} unposted replies for account {self.account!r}", flush=True)
+        return adopted
+
+    def _keep(self) -> None:
+        while True:
+            try:
+                for reply in self.keep_replies():
+                    self._schedule(reply, self._clock())
+            except Exception as exc:
+                print(f"Error keeping persisted replies: {exc}", flush=True)
+            if self._stop.wait(REPLY_LEASE_SECONDS / 3):
+                return
+
+    def _failure_hook(self, reply: Reply) -> Optional[Callable[[BaseException], Any]]:
+        if reply.on_failure is not None:
+            return reply.on_failure
+        if self.on_failure is not None:
+            on_failure = self.on_failure
+            return lambda exc: on_failure(reply, exc)
+        return None
+
+    def _schedule(self, reply: Reply, ready_at: float) -> None:
+        with self._cond:
+            heapq.heappush(self._heap, (ready_at, next(self._seq), reply))
+            self._cond.notify()
+
+    def pending(self) -> int:
+        """Replies queued, waiting to retry, or being posted."""
+        with self._cond:
+            return len(self._heap) + self._in_flight
+
+    def _take(self) -> Tuple[Optional[Reply], Optional[float]]:
+        """Pop the next reply if it is due and a token is free. Otherwise
+        (None, seconds until one might be; None when nothing is queued).
+        Called with `_cond` held."""
+        if not self._heap:
+            return None, None
+        wait = self._heap[0][0] - self._clock()
+        if wait <= 0:
+            wait = self.bucket.take()
+            if wait <= 0:
+                self._in_flight += 1
+                return heapq.heappop(self._heap)[2], None
+        return None, wait
+
+    def _next(self) -> Optional[Reply]:
+        """Block until a reply is due and a token is free; None on stop."""
+        with self._cond:
+            while not self._stop.is_set():
+                reply, wait = self._take()
+                if reply is not None:
+                    return reply
+                self._cond.wait(wait)
+        return None
+
+    def _retry_after(self, reply: Reply, exc: BaseException) -> Optional[Tuple[float, Reply]]:
+        """When (and as what) to retry a failed post, or None to give up."""
+        if isinstance(exc, tweepy.TooManyRequests):
+            # Not the reply's fault: wait out the window, attempts untouched.
+            reset_at = _reset_at(exc) or self._clock() + self.backoff
+            self.bucket.block_until(reset_at + 1)
+            RETRIES.inc(stage="create_tweet")
+            return reset_at + 1, reply
+        attempts = reply.attempts + 1
+        if _is_transient(exc) and attempts < self.max_attempts:
+            delay = self.backoff * 2 ** (attempts - 1)
+            print(
+                f"Error replying to mention {reply.in_reply_to_tweet_id}: {exc}; retrying in {delay:g}s",
+                flush=True,
+            )
+            RETRIES.inc(stage="create_tweet")
+            return self._clock() + delay, reply._replace(attempts=attempts)
+        self.failed += 1
+        print(f"Error replying to mention {reply.in_reply_to_tweet_id}: {exc}", flush=True)
+        return None
+
+    def _post(self, reply: Reply) -> None:
+        try:
+            with timed("create_tweet", reply.member):
+                self.client.create_tweet(text=reply.text, in_reply_to_tweet_id=reply.in_reply_to_tweet_id)
+        except Exception as exc:
+            retry = self._retry_after(reply, exc)
+            if retry is not None:
+                self._schedule(retry[1], retry[0])
+                return
+            on_failure = self._failure_hook(reply)
+            if on_failure is not None:
+                try:
+                    on_failure(exc)
+                except Exception as hook_exc:
+                    _report_hook_error(reply, hook_exc)
+            self._forget(reply)
+            return
+        self.posted += 1
+        self._forget(reply)
+
+    def run(self) -> None:
+        while True:
+            reply = self._next()
+            if reply is None:
+                return
+            try:
+                self._post(reply)
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+                    self._cond.notify_all()
+
+    def start(self) -> "ReplyPoster":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="reply-poster", daemon=True)
+            self._thread.start()
+            if self.account is not None:
+                threading.Thread(target=self._keep, name="reply-keeper", daemon=True).start()
+        return self
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Block until nothing is queued or in flight. False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._heap or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(5)
+
+    def stats(self) -> Dict[str, int]:
+        return {"queued": self.pending(), "posted": self.posted, "failed": self.failed}
+
+
+class AsyncReplyPoster(ReplyPoster):
+    """`ReplyPoster` for the asyncio listener: the same pacing, retries and
+    failure hook, posting through tweepy's AsyncClient from a task on the
+    listener's event loop. `on_failure` may be a coroutine function.
+    `submit` must be called from that loop."""
+
+    def __init__(self, client: Any, bucket: Optional[TokenBucket] = None, **kwargs: Any):
+        super().__init__(client, bucket, **kwargs)
+        self._wakeup = asyncio.Event()
+        self._task: "Optional[asyncio.Task[None]]" = None
+        self._keeper: "Optional[asyncio.Task[None]]" = None
+
+    def _schedule(self, reply: Reply, ready_at: float) -> None:
+        with self._cond:
+            heapq.heappush(self._heap, (ready_at, next(self._seq), reply))
+        self._wakeup.set()
+
+    async def _post_async(self, reply: Reply) -> None:
+        try:
+            with timed("create_tweet", reply.member):
+                await self.client.create_tweet(
+                    text=reply.text, in_reply_to_tweet_id=reply.in_reply_to_tweet_id
+                )
+        except Exception as exc:
+            retry = self._retry_after(reply, exc)
+            if retry is not None:
+                self._schedule(retry[1], retry[0])
+                return
+            on_failure = self._failure_hook(reply)
+            if on_failure is not None:
+                try:
+                    outcome = on_failure(exc)
+                    if inspect.isawaitable(outcome):
+                        await outcome
+                except Exception as hook_exc:
+                    _report_hook_error(reply, hook_exc)
+            self._forget(reply)
+            return
+        self.posted += 1
+        self._forget(reply)
+
+    async def _keep_async(self) -> None:
+        # The database calls run on a thread; the loop only queues the result.
+        loop = asyncio.get_running_loop()
+        while not self._stop.is_set():
+            try:
+                for reply in await loop.run_in_executor(None, self.keep_replies):
+                    self._schedule(reply, self._clock())
+            except Exception as exc:
+                print(f"Error keeping persisted replies: {exc}", flush=True)
+            await asyncio.sleep(REPLY_LEASE_SECONDS / 3)
+
+    async def run_async(self) -> None:
+        while not self._stop.is_set():
+            with self._cond:
+                reply, wait = self._take()
+            if reply is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._post_async(reply)
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+
+    def start(self) -> "AsyncReplyPoster":
+        if self._task is None:
+            loop = asyncio.get_running_loop()
+            self._task = loop.create_task(self.run_async())
+            if self.account is not None:
+                self._keeper = loop.create_task(self._keep_async())
+            _ASYNC_POSTERS.add(self)
+        return self
+
+    async def drain(self, poll: float = 0.01) -> None:
+        """Wait until nothing is queued or in flight."""
+        while self.pending():
+            await asyncio.sleep(poll)
+
+    async def aclose(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        if self._keeper is not None:
+            self._keeper.cancel()
+        if self._task is not None:
+            await self._task
+
+
+_POSTERS: Dict[int, ReplyPoster] = {}
+_POSTERS_LOCK = threading.Lock()
+_ASYNC_POSTERS: "weakref.WeakSet[AsyncReplyPoster]" = weakref.WeakSet()
+
+
+def get_reply_poster(
+    client: Any,
+    account: Optional[str] = None,
+    on_failure: Optional[Callable[[Reply, BaseException], Any]] = None,
+) -> ReplyPoster:
+    """The started poster for `client`, created (and attached to its
+    session's rate-limit headers) on first use. `account` and `on_failure`
+    apply to that first use: see `ReplyPoster`."""
+    with _POSTERS_LOCK:
+        poster = _POSTERS.get(id(client))
+        if poster is None:
+            poster = ReplyPoster(client, account=account, on_failure=on_failure)
+            if getattr(client, "session", None) is not None:
+                poster.bucket.attach(client)
+            _POSTERS[id(client)] = poster.start()
+        return poster
+
+
+def _poster_series(key: str) -> List[Tuple[Dict[str, object], float]]:
+    with _POSTERS_LOCK:
+        posters = list(_POSTERS.values())
+    posters += list(_ASYNC_POSTERS)
+    return [({}, sum(poster.stats()[key] for poster in posters))]
+
+
+collected("reply_queue_depth", "Replies queued, waiting to retry, or being posted.", lambda: _poster_series("queued"))
+collected("reply_posted_total", "Replies posted.", lambda: _poster_series("posted"), kind="counter")
+collected("reply_failed_total", "Replies given up on.", lambda: _poster_series("failed"), kind="counter")
@@ -0,0 +1,92 @@
+"""Persisted pending replies, so queued replies survive a restart.
+
+`reply_queue.ReplyPoster` posts replies from memory, after the mention they
+answer has been marked done and the watermark (or queue row) has moved past
+it. With an `account`, the poster also writes each reply here when it is
+queued and deletes it once it is posted or given up on, so a crash in
+between leaves the row behind instead of losing the reply.
+
+A row is leased to the poster that wrote it, which renews the lease while
+the reply is still queued. A lease that lapses -- its poster's process is
+gone -- lets any poster for the same account adopt the row and post it,
+the restarted listener included. Postgres locks the rows it adopts
+`FOR UPDATE SKIP LOCKED`; SQLite serializes the write transaction instead,
+as in `mention_store.claim_mentions`.
+"""
+
+import uuid
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy import delete, insert, select, update
+
+from storage_db import pending_replies, row_to_dict, utc_now, write_connection
+
+# How long a poster's claim on its replies lasts unrenewed; posters renew
+# every third of it. A crashed listener's replies are posted this long after
+# it stops, by whichever poster for the account comes up next.
+REPLY_LEASE_SECONDS = 120.0
+
+
+def save_reply(account: str, owner: str, text: str, in_reply_to_tweet_id: Any, member: str = "") -> str:
+    """Persist a queued reply, leased to `owner`. Returns its row id."""
+    now = utc_now()
+    reply_id = uuid.uuid4().hex
+    with write_connection() as conn:
+        conn.execute(
+            insert(pending_replies).values(
+                id=reply_id,
+                account=account,
+                in_reply_to_tweet_id=str(in_reply_to_tweet_id),
+                text=text,
+                member=member,
+                lease_owner=owner,
+                lease_expires_at=now + timedelta(seconds=REPLY_LEASE_SECONDS),
+                created_at=now,
+            )
+        )
+    return reply_id
+
+
+def forget_reply(reply_id: str) -> None:
+    """Drop a reply that was posted or given up on."""
+    with write_connection() as conn:
+        conn.execute(delete(pending_replies).where(pending_replies.c.id == reply_id))
+
+
+def renew_replies(owner: str, reply_ids: Iterable[str]) -> int:
+    """Extend `owner`'s leases on the given replies. Returns how many it
+    still held."""
+    reply_ids = list(reply_ids)
+    if not reply_ids:
+        return 0
+    now = utc_now()
+    with write_connection() as conn:
+        result = conn.execute(
+            update(pending_replies)
+            .where(pending_replies.c.id.in_(reply_ids), pending_replies.c.lease_owner == owner)
+            .values(lease_expires_at=now + timedelta(seconds=REPLY_LEASE_SECONDS))
+        )
+    return result.rowcount
+
+
+def adopt_replies(account: str, owner: str, limit: int = 100) -> List[Dict[str, Any]]:
+    """Lease to `owner` up to `limit` of `account`'s replies whose lease has
+    lapsed, oldest first."""
+    now = utc_now()
+    query = (
+        select(pending_replies)
+        .where(pending_replies.c.account == account, pending_replies.c.lease_expires_at <= now)
+        .order_by(pending_replies.c.created_at.asc())
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    with write_connection() as conn:
+        rows = [row_to_dict(row) for row in conn.execute(query).fetchall()]
+        if rows:
+            conn.execute(
+                update(pending_replies)
+                .where(pending_replies.c.id.in_([row["id"] for row in rows]))
+                .values(lease_owner=owner, lease_expires_at=now + timedelta(seconds=REPLY_LEASE_SECONDS))
+            )
+    return rows
@@ -8,7 +8,7 @@ from typing import Any, Dict, Iterable, Tuple
 from sqlalchemy import insert, select, update
 
 from cards import normalize_actions
-from storage_db import a2a_agents, a2a_messages, timeline_items, write_connection
+from storage_db import a2a_agents, a2a_messages, next_sequence, timeline_items, write_connection
 
 
 def _parse_timestamp(value: Any, *, field: str = "created_at") -> datetime:
@@ -136,7 +136,8 @@ def _upsert_messages(messages: Iterable[Dict[str, Any]]) -> Tuple[int, int]:
                 conn.execute(update(a2a_messages).where(a2a_messages.c.id == message_id).values(**payload))
                 updated += 1
             else:
-                conn.execute(insert(a2a_messages).values(**payload))
+                seq = next_sequence(conn, a2a_messages.name)
+                conn.execute(insert(a2a_messages).values(**payload, seq=seq))
                 inserted += 1
     return inserted, updated
 
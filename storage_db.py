@@ -4,24 +4,30 @@ import time
 from contextlib import contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Iterator, Optional
+from typing import Any, Callable, Dict, Iterator, Optional
 
 from sqlalchemy import (
     JSON,
+    BigInteger,
     Column,
     DateTime,
+    Index,
+    Integer,
     MetaData,
     String,
     Table,
     Text,
     create_engine,
     event,
+    func,
     inspect,
+    select,
     text,
+    update,
 )
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.engine import Connection, Engine
-from sqlalchemy.exc import DBAPIError
+from sqlalchemy.exc import DBAPIError, IntegrityError
 
 DEFAULT_DB_PATH = Path("~/.xmcp/xmcp.db").expanduser()
 SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
@@ -29,7 +35,13 @@ SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
 # Literal SQL defaults for backfilling NOT NULL columns onto existing rows.
 # A NOT NULL column added without one cannot be applied to a populated table,
 # so a missing entry here is a programming error rather than a default.
-_BACKFILL_DEFAULTS = {"blocks": "'[]'", "schema_version": "''", "dispatched_action": "''"}
+_BACKFILL_DEFAULTS = {
+    "blocks": "'[]'",
+    "schema_version": "''",
+    "dispatched_action": "''",
+    "attempts": "0",
+    "lease_owner": "''",
+}
 
 # Bounded, because losing the create race is expected and transient: the retry
 # only has to outlast another process committing its CREATE TABLE.
@@ -38,6 +50,7 @@ _SCHEMA_RETRY_DELAY_S = 0.25
 
 _ENGINE: Optional[Engine] = None
 _ENGINE_LOCK = threading.Lock()
+_AFTER_COMMIT = "after_commit"
 
 metadata = MetaData()
 
@@ -90,8 +103,81 @@ a2a_messages = Table(
     Column("content", Text, nullable=False, default=""),
     Column("metadata", json_type, nullable=False),
     Column("created_at", DateTime(timezone=True), nullable=False, index=True),
+    # Assigned from `sequences` inside the inserting transaction, so values
+    # become visible in order (see `next_sequence`); created_at does not.
+    # Nullable only so an existing table can gain it; `_number_messages`
+    # fills in rows written before it existed.
+    Column("seq", BigInteger, nullable=True),
+    # The keyset an inbox is read by: a reader resuming from a cursor
+    # (a2a_store.list_messages) touches only the rows past it.
+    Index("ix_a2a_messages_inbox_seq", "to_agent", "seq"),
 )
 
+# Counters handed out in commit order; one row per sequence.
+sequences = Table(
+    "sequences",
+    metadata,
+    Column("name", String, primary_key=True),
+    Column("value", BigInteger, nullable=False),
+)
+
+# Inbound X mentions, persisted before they are acknowledged (webhook) or
+# before the listener's watermark moves past them (LISTENER_QUEUE=sql), so a
+# crash can't lose one. Keyed by tweet id, which also makes a redelivery of
+# the same mention a no-op. Doubles as the listener's work queue; see
+# mention_store.claim_mentions.
+mentions = Table(
+    "mentions",
+    metadata,
+    Column("id", String, primary_key=True),
+    Column("source", String, nullable=False),
+    # The mention in X API v2 tweet shape, whatever the wire format was.
+    Column("payload", json_type, nullable=False),
+    Column("conversation_id", String, nullable=True, index=True),
+    # The bot account mentioned (listener.load_accounts name); NULL for the
+    # single account configured through the X_* variables.
+    Column("account", String, nullable=True),
+    Column("status", String, nullable=False, index=True),
+    # Claims so far; a mention claimed this often without completing is
+    # dead-lettered rather than retried forever.
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("lease_owner", String, nullable=False, default=""),
+    # While claimed: when the lease lapses and another worker may take the
+    # mention. While pending: the earliest time it may be claimed (retry
+    # backoff). NULL means claimable now.
+    Column("lease_expires_at", DateTime(timezone=True), nullable=True, index=True),
+    Column("last_error", Text, nullable=True),
+    Column("created_at", DateTime(timezone=True), nullable=False, index=True),
+    Column("updated_at", DateTime(timezone=True), nullable=True),
+)
+
+# Replies queued for posting but not yet posted (reply_queue.ReplyPoster),
+# so a restart posts them instead of dropping them. Each row is leased to
+# the poster holding it in memory; one whose poster stopped renewing it is
+# adopted by another poster for the same account (see reply_store).
+pending_replies = Table(
+    "pending_replies",
+    metadata,
+    Column("id", String, primary_key=True),
+    # The bot account posting it (listener.load_accounts name); "" for the
+    # single account configured through the X_* variables.
+    Column("account", String, nullable=False),
+    Column("in_reply_to_tweet_id", String, nullable=False),
+    Column("text", Text, nullable=False),
+    Column("member", String, nullable=False, default=""),
+    Column("lease_owner", String, nullable=False),
+    Column("lease_expires_at", DateTime(timezone=True), nullable=False),
+    Column("created_at", DateTime(timezone=True), nullable=False),
+    Index("ix_pending_replies_account_lease", "account", "lease_expires_at"),
+)
+
+# Tables that have gained columns since they first shipped, which
+# _add_missing_columns brings up to date on an existing database.
+_UPGRADED_TABLES = (timeline_items, mentions, a2a_messages)
+# Tables that have gained indexes since they first shipped; see
+# _add_missing_indexes.
+_REINDEXED_TABLES = (a2a_messages,)
+
 
 def utc_now() -> datetime:
     return datetime.now(timezone.utc)
@@ -148,9 +234,10 @@ def _add_missing_columns(engine: Engine) -> None:
     `metadata.create_all` creates missing *tables* and then leaves an existing
     table alone, so a database created by an earlier revision keeps its old
     column set and every query naming a newer column fails. There is no
-    migration framework here, so bring the one table that has gained columns
-    up to date in place. Each ADD COLUMN is guarded by a live reflection, which
-    makes this a no-op on an already-current database.
+    migration framework here, so bring the tables that have gained columns
+    (`_UPGRADED_TABLES`) up to date in place. Each ADD COLUMN is guarded by
+    a live reflection, which makes this a no-op on an already-current
+    database.
 
     The reflection is not a lock, though. All four services boot at once and
     share one database, so several can reflect "missing" before any of them
@@ -161,11 +248,16 @@ def _add_missing_columns(engine: Engine) -> None:
     success -- another process adding the column is the desired end state.
     """
     inspector = inspect(engine)
-    if not inspector.has_table(timeline_items.name):
+    for table in _UPGRADED_TABLES:
+        _add_missing_columns_to(engine, inspector, table)
+
+
+def _add_missing_columns_to(engine: Engine, inspector: Any, table: Table) -> None:
+    if not inspector.has_table(table.name):
         return
 
-    existing = {column["name"] for column in inspector.get_columns(timeline_items.name)}
-    missing = [c for c in timeline_items.columns if c.name not in existing]
+    existing = {column["name"] for column in inspector.get_columns(table.name)}
+    missing = [c for c in table.columns if c.name not in existing]
     if not missing:
         return
 
@@ -184,12 +276,12 @@ def _add_missing_columns(engine: Engine) -> None:
             default = _BACKFILL_DEFAULTS.get(column.name)
             if default is None:
                 raise RuntimeError(
-                    f"{timeline_items.name}.{column.name} is NOT NULL with no backfill "
+                    f"{table.name}.{column.name} is NOT NULL with no backfill "
                     "default; existing rows need one -- add it to _BACKFILL_DEFAULTS"
                 )
             constraint = f" NOT NULL DEFAULT {default}"
         statement = text(
-            f"ALTER TABLE {preparer.format_table(timeline_items)} "
+            f"ALTER TABLE {preparer.format_table(table)} "
             f"ADD COLUMN {preparer.quote(column.name)} "
             f"{type_compiler.process(column.type)}{constraint}"
         )
@@ -201,6 +293,87 @@ def _add_missing_columns(engine: Engine) -> None:
                 raise
 
 
+def _add_missing_indexes(engine: Engine) -> None:
+    """Create indexes that `create_all` won't, on tables that already exist.
+
+    Same story, and the same race, as `_add_missing_columns`: each CREATE
+    INDEX is guarded by a live reflection and stands alone, and another
+    service creating the index first counts as success.
+    """
+    inspector = inspect(engine)
+    for table in _REINDEXED_TABLES:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            try:
+                index.create(engine)
+            except DBAPIError as exc:
+                if "already exists" not in str(getattr(exc, "orig", exc)).lower():
+                    raise
+
+
+def next_sequence(conn: Connection, name: str) -> int:
+    """The next value of sequence `name`, taken in `conn`'s transaction.
+
+    The increment locks the counter row until that transaction ends, so a
+    second writer waits for the first to commit (or roll back) before it
+    gets a number. Values therefore become visible in ascending order, which
+    a database sequence or autoincrement does not promise: those are handed
+    out at insert time, and a lower value can still commit after a higher
+    one. A reader that has seen value n will never later find one below it.
+    """
+    statement = update(sequences).where(sequences.c.name == name).values(value=sequences.c.value + 1)
+    if conn.execute(statement).rowcount == 0:
+        # Seeded on startup (`_number_messages`); a schema created since, as
+        # a fresh one alongside its empty tables, starts from zero here.
+        try:
+            with conn.begin_nested():
+                conn.execute(sequences.insert().values(name=name, value=0))
+        except IntegrityError:
+            pass  # another writer seeded it first
+        conn.execute(statement)
+    return conn.execute(select(sequences.c.value).where(sequences.c.name == name)).scalar_one()
+
+
+def _number_messages(engine: Engine) -> None:
+    """Seed the A2A message sequence, numbering rows written before it existed.
+
+    Idempotent, and safe with every service booting at once: the counter
+    row is created if missing (a duplicate from a concurrent boot is
+    success), and the numbering runs under `next_sequence`'s row lock, so
+    only one process numbers a given row.
+    """
+    messages = a2a_messages
+    try:
+        with engine.begin() as conn:
+            seeded = select(sequences.c.name).where(sequences.c.name == messages.name)
+            if conn.execute(seeded).first() is None:
+                top = conn.execute(select(func.max(messages.c.seq))).scalar() or 0
+                conn.execute(sequences.insert().values(name=messages.name, value=top))
+    except IntegrityError:
+        pass  # seeded by a service booting alongside
+    pending = select(messages.c.id).where(messages.c.seq.is_(None)).limit(1)
+    with engine.connect() as conn:
+        if conn.execute(pending).first() is None:
+            return
+    with write_connection(engine) as conn:
+        # Taking a number locks the counter before the rows are read, so a
+        # service numbering them alongside has finished (the number spent
+        # here only leaves a gap).
+        next_sequence(conn, messages.name)
+        unnumbered = conn.execute(
+            select(messages.c.id)
+            .where(messages.c.seq.is_(None))
+            .order_by(messages.c.created_at.asc(), messages.c.id.asc())
+        ).scalars().all()
+        for message_id in unnumbered:
+            seq = next_sequence(conn, messages.name)
+            conn.execute(update(messages).where(messages.c.id == message_id).values(seq=seq))
+
+
 def _create_tables(engine: Engine) -> None:
     """Create the schema, tolerating another service creating it concurrently.
 
@@ -236,6 +409,8 @@ def _create_engine() -> Engine:
         _configure_sqlite(engine)
     _create_tables(engine)
     _add_missing_columns(engine)
+    _add_missing_indexes(engine)
+    _number_messages(engine)
     return engine
 
 
@@ -249,30 +424,53 @@ def get_engine() -> Engine:
     return _ENGINE
 
 
+def after_commit(conn: Connection, callback: Callable[[], None]) -> None:
+    """Run `callback` once the `write_connection` transaction holding `conn`
+    commits; it is dropped if the transaction rolls back.
+
+    For side effects that must not be seen before the write is, such as
+    waking a reader that will go straight back to the database."""
+    conn.info.setdefault(_AFTER_COMMIT, []).append(callback)
+
+
+def _run_after_commit(conn: Connection, committed: bool) -> None:
+    # conn.info lives on the pooled DBAPI connection, so it is cleared either
+    # way; the next checkout must not inherit this transaction's callbacks.
+    for callback in conn.info.pop(_AFTER_COMMIT, []) if committed else ():
+        callback()
+    conn.info.pop(_AFTER_COMMIT, None)
+
+
 @contextmanager
-def write_connection() -> Iterator[Connection]:
-    engine = get_engine()
+def write_connection(engine: Optional[Engine] = None) -> Iterator[Connection]:
+    engine = engine or get_engine()
     conn = engine.connect()
     if engine.dialect.name == "sqlite":
         conn.exec_driver_sql("BEGIN IMMEDIATE")
+        committed = False
         try:
             yield conn
             conn.commit()
+            committed = True
         except Exception:
             conn.rollback()
             raise
         finally:
+            _run_after_commit(conn, committed)
             conn.close()
         return
 
     trans = conn.begin()
+    committed = False
     try:
         yield conn
         trans.commit()
+        committed = True
     except Exception:
         trans.rollback()
         raise
     finally:
+        _run_after_commit(conn, committed)
         conn.close()
 
 
@@ -0,0 +1,18 @@
+import pytest
+
+import listener
+import thread_context
+from admission import AuthorAdmission
+from agents.cache import TTLCache
+from mention_dedupe import NearDuplicateIndex
+
+
+@pytest.fixture(autouse=True)
+def fresh_listener_state(monkeypatch):
+    """Per-author budgets, near-duplicate leaders, cached thread posts and
+    partly answered mentions are process-wide; a test must not inherit the
+    ones earlier tests left."""
+    monkeypatch.setattr(listener, "ADMISSION", AuthorAdmission())
+    monkeypatch.setattr(listener, "DUPLICATES", NearDuplicateIndex())
+    monkeypatch.setattr(thread_context, "_POSTS", TTLCache("test_thread_posts", 3600))
+    monkeypatch.setattr(listener, "ANSWERED", TTLCache("test_answered_members", 3600))
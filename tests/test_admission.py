@@ -0,0 +1,169 @@
+"""Per-author admission: budgets by member kind, bounded state, and what a
+throttled mention gets instead of a member call."""
+
+import os
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import listener
+from admission import THROTTLED_REPLY, Admission, AuthorAdmission
+from agents.base import AgentReply
+from agents.bulkhead import BulkheadFull
+from mention_store import STATUS_PENDING, claim_mentions, defer_mention, queue_depths, record_mention
+from storage_db import get_engine, metadata, reset_engine_for_tests
+
+LIMITS = {"agent": (2, 1 / 60), "bot": (5, 1.0)}
+
+
+def _admission(now, **kwargs):
+    return AuthorAdmission(LIMITS, clock=lambda: now[0], **kwargs)
+
+
+def test_agents_are_expensive_and_bots_cheap():
+    now = [0.0]
+    admission = _admission(now)
+    assert [admission.admit(1, "agent").admitted for _ in range(3)] == [True, True, False]
+    # The same author still has its bot budget, and other authors their own.
+    assert all(admission.admit(1, "bot").admitted for _ in range(5))
+    assert admission.admit(2, "agent").admitted
+    now[0] = 60
+    assert admission.admit(1, "agent").admitted
+
+
+def test_only_the_first_refusal_of_a_run_is_notified():
+    now = [0.0]
+    admission = _admission(now)
+    admission.admit(1, "agent")
+    admission.admit(1, "agent")
+    refusals = [admission.admit(1, "agent") for _ in range(3)]
+    assert [r.notify for r in refusals] == [True, False, False]
+    assert refusals[0].wait == pytest.approx(60)
+    now[0] = 60
+    assert admission.admit(1, "agent") == Admission(0.0)
+    assert admission.admit(1, "agent").notify
+
+
+def test_idle_authors_are_evicted():
+    now = [0.0]
+    admission = _admission(now, max_authors=2)
+    admission.admit(1, "agent")
+    admission.admit(1, "agent")
+    admission.admit(2, "agent")
+    admission.admit(3, "agent")
+    assert len(admission) == 2
+    # Author 1 was least recently seen: it starts over with a full bucket.
+    assert admission.admit(1, "agent").admitted
+
+
+class _Poster:
+    def __init__(self):
+        self.replies = []
+
+    def submit(self, text, mention_id, on_failure=None, member=""):
+        self.replies.append((mention_id, text))
+
+
+def test_throttled_mentions_never_reach_the_member(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(listener, "ADMISSION", _admission(now))
+    poster = _Poster()
+    monkeypatch.setattr(listener, "get_reply_poster", lambda client: poster)
+    calls = []
+    member = SimpleNamespace(
+        profile=SimpleNamespace(id="research", kind="agent"),
+        handle_mention=lambda context: calls.append(context.mention_id) or AgentReply(text="ok"),
+    )
+    monkeypatch.setattr(listener, "route_mention", lambda context: [member])
+
+    for i in range(1, 5):
+        mention = SimpleNamespace(id=i, text=f"@Research question {i}", author_id=9, conversation_id=i)
+        assert listener.process_mention(None, mention)
+    assert calls == [1, 2]
+    assert poster.replies == [(1, "ok"), (2, "ok"), (3, THROTTLED_REPLY)]
+
+    with pytest.raises(listener.MentionDeferred) as deferred:
+        mention = SimpleNamespace(id=5, text="@Research again", author_id=9, conversation_id=5)
+        listener.process_mention(None, mention, defer_throttled=True)
+    assert deferred.value.delay > 0
+
+
+def test_a_mention_shed_by_a_busy_member_is_retried_without_spending_its_budget(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(listener, "ADMISSION", _admission(now))
+    poster = _Poster()
+    monkeypatch.setattr(listener, "get_reply_poster", lambda client: poster)
+    member = SimpleNamespace(
+        profile=SimpleNamespace(id="research", kind="agent"),
+        handle_mention=lambda context: AgentReply(text="ok"),
+    )
+    monkeypatch.setattr(listener, "route_mention", lambda context: [member])
+    busy = [True]
+    real_submit = listener.submit_mention
+
+    def submit(member, context):
+        if busy[0]:
+            raise BulkheadFull("research is at capacity")
+        return real_submit(member, context)
+
+    monkeypatch.setattr(listener, "submit_mention", submit)
+    mention = SimpleNamespace(id=1, text="@Research question", author_id=9, conversation_id=1)
+    # Far more retries than the author's burst of two.
+    for _ in range(6):
+        assert listener.process_mention(None, mention) is False
+    busy[0] = False
+    assert listener.process_mention(None, mention)
+    assert poster.replies == [(1, "ok")]
+
+
+def test_a_deferred_fan_out_refunds_the_members_already_admitted(monkeypatch):
+    now = [0.0]
+    admission = _admission(now)
+    monkeypatch.setattr(listener, "ADMISSION", admission)
+    for _ in range(5):
+        admission.admit(9, "bot")
+    members = [
+        SimpleNamespace(profile=SimpleNamespace(id="research", kind="agent")),
+        SimpleNamespace(profile=SimpleNamespace(id="tickerbot", kind="bot")),
+    ]
+    mention = SimpleNamespace(id=1, author_id=9)
+    with pytest.raises(listener.MentionDeferred):
+        listener.admit_members(mention, members, lambda member_id: None, defer=True)
+    # Research's token came back: the author still has the full burst.
+    assert [admission.admit(9, "agent").admitted for _ in range(3)] == [True, True, False]
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", os.getenv("TEST_DATABASE_URL") or f"sqlite:///{tmp_path / 'xmcp.db'}")
+    reset_engine_for_tests()
+    engine = get_engine()
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    yield engine
+    reset_engine_for_tests()
+
+
+def test_queue_defers_throttled_mentions_without_spending_attempts(db, monkeypatch):
+    record_mention({"id": "1", "text": "@bot hi", "author_id": "9", "edit_history_tweet_ids": ["1"]}, "poll")
+    stop = threading.Event()
+
+    def throttled(client, mention, defer_throttled=False):
+        assert defer_throttled
+        stop.set()
+        raise listener.MentionDeferred(60)
+
+    monkeypatch.setattr(listener, "process_mention", throttled)
+    listener.run_queue_worker({"": None}, "w", stop, idle_seconds=0.01)
+    assert queue_depths() == {STATUS_PENDING: 1}
+    # Not claimable until the author's budget is back.
+    assert claim_mentions("w") == []
+
+
+def test_defer_gives_the_attempt_back(db):
+    record_mention({"id": "1", "text": "hi", "edit_history_tweet_ids": ["1"]}, "poll")
+    for _ in range(3):
+        assert claim_mentions("w", max_attempts=1)[0]["attempts"] == 1
+        assert defer_mention("1", "w", delay=0)
+    assert not defer_mention("1", "other", delay=0)
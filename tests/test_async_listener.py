@@ -0,0 +1,279 @@
+"""The asyncio listener: Grok off the loop, cards and replies awaited."""
+
+import asyncio
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import httpx
+import pytest
+import yarl
+
+import async_listener
+import listener
+from agents.base import AgentReply
+from mention_dedupe import NearDuplicateIndex
+from reply_queue import AsyncReplyPoster, TokenBucket
+from timeline_client import AsyncTimelineClient
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _mention(mention_id, conversation_id, offset):
+    return SimpleNamespace(
+        id=mention_id,
+        text=f"mention {mention_id}",
+        author_id=1,
+        conversation_id=conversation_id,
+        created_at=T0 + timedelta(seconds=offset),
+    )
+
+
+class _Member:
+    def __init__(self, handle, member_id="general"):
+        self.profile = SimpleNamespace(id=member_id, kind="agent")
+        self.handle_mention = handle
+
+
+class _FakeX:
+    def __init__(self):
+        self.replies = []
+
+    async def create_tweet(self, text, in_reply_to_tweet_id):
+        self.replies.append(in_reply_to_tweet_id)
+
+
+def _timeline(cards, fail_for=()):
+    def respond(request):
+        body = json.loads(request.content)
+        if body["title"] in fail_for:
+            return httpx.Response(500)
+        cards.append(body["title"])
+        return httpx.Response(201, json={"id": body["title"], **body})
+
+    return AsyncTimelineClient("http://timeline", {}, transport=httpx.MockTransport(respond))
+
+
+def _run(page, handle, fail_for=()):
+    cards, completed = [], {}
+    x = _FakeX()
+
+    async def go():
+        poster = AsyncReplyPoster(x, TokenBucket(rate=1000, capacity=100)).start()
+        pipeline = async_listener.AsyncPipeline(_timeline(cards, fail_for))
+        result = await pipeline.process_page(poster, page, completed)
+        await asyncio.wait_for(poster.drain(), 5)
+        await poster.aclose()
+        return result
+
+    mark, result = asyncio.run(go())
+    return mark, result, cards, x.replies
+
+
+def test_grok_calls_for_different_conversations_overlap(monkeypatch):
+    # Each handler waits for the other to start: a serial pipeline would
+    # time out on the barrier.
+    barrier = threading.Barrier(2, timeout=5)
+
+    def handle(context):
+        barrier.wait()
+        return AgentReply(text=f"re {context.mention_id}", card={"title": f"card {context.mention_id}"})
+
+    monkeypatch.setattr(listener, "route_mention", lambda context: [_Member(handle)])
+    mark, result, cards, replies = _run([_mention(1, "a", 0), _mention(2, "b", 1)], handle)
+    assert mark.id == 2 and result.done
+    assert sorted(cards) == ["card 1", "card 2"]
+    assert sorted(replies) == [1, 2]
+
+
+def test_failed_card_push_holds_the_watermark(monkeypatch):
+    def handle(context):
+        return AgentReply(text="re", card={"title": f"card {context.mention_id}"})
+
+    monkeypatch.setattr(listener, "route_mention", lambda context: [_Member(handle)])
+    page = [_mention(1, "a", 0), _mention(2, "a", 1), _mention(3, "b", 2)]
+    mark, result, cards, replies = _run(page, handle, fail_for={"card 1"})
+    # Mention 2 waits behind the failed 1 in its thread; 3 is unaffected.
+    assert mark is None
+    assert not result.done and result.completed == {3}
+    assert cards == ["card 3"] and replies == [3]
+
+
+def test_agent_errors_are_dead_lettered(monkeypatch):
+    def handle(context):
+        raise RuntimeError("grok down")
+
+    monkeypatch.setattr(listener, "route_mention", lambda context: [_Member(handle)])
+    mark, result, cards, replies = _run([_mention(1, "a", 0)], handle)
+    assert result.done
+    assert cards == ["Agent error on mention 1"]
+    assert replies == []
+
+
+def test_after_card_follow_up_runs_once_the_card_is_pushed(monkeypatch):
+    followed = threading.Event()
+    items = []
+
+    def after_card(item):
+        items.append(item["id"])
+        followed.set()
+
+    def handle(context):
+        return AgentReply(text="re", card={"title": "card 1"}, after_card=after_card)
+
+    monkeypatch.setattr(listener, "route_mention", lambda context: [_Member(handle)])
+    mark, result, cards, replies = _run([_mention(1, "a", 0)], handle)
+    assert result.done and replies == [1]
+    assert followed.wait(5)
+    assert items == ["card 1"]
+
+
+def test_tagged_members_push_their_own_cards_and_share_one_reply(monkeypatch):
+    barrier = threading.Barrier(2, timeout=5)
+
+    def handle(context):
+        barrier.wait()
+        return AgentReply(text="re", card={"title": threading.current_thread().name})
+
+    members = [_Member(handle, "async-research"), _Member(handle, "async-desk")]
+    monkeypatch.setattr(listener, "route_mention", lambda context: members)
+    mark, result, cards, replies = _run([_mention(1, "a", 0)], handle)
+    assert result.done
+    assert sorted(card.split("_")[0] for card in cards) == ["member-async-desk", "member-async-research"]
+    assert replies == [1]
+
+
+def test_a_follower_of_a_stuck_leader_does_not_hold_its_page(monkeypatch):
+    monkeypatch.setattr(listener, "DUPLICATES", NearDuplicateIndex(window=60, wait=0.1))
+    release = threading.Event()
+    calls = []
+
+    def handle(context):
+        calls.append(context.mention_id)
+        if context.mention_id == 1:
+            release.wait(5)
+        return AgentReply(text="No.")
+
+    member = _Member(handle, "async-research")
+    member.profile.share_replies = True
+    monkeypatch.setattr(listener, "route_mention", lambda context: [member])
+    spam = "@Research is it true that $XYZ is going to 100x this week?? everyone says so"
+    leader, follower = _mention(1, "a", 0), _mention(2, "b", 1)
+    leader.text = follower.text = spam
+    follower.author_id = 2
+    x = _FakeX()
+
+    async def go():
+        poster = AsyncReplyPoster(x, TokenBucket(rate=1000, capacity=100)).start()
+        pipeline = async_listener.AsyncPipeline(_timeline([]))
+        lead = asyncio.create_task(pipeline.process_page(poster, [leader], {}))
+        while calls != [1]:
+            await asyncio.sleep(0.01)
+        # The follower's page settles while its leader is still running, and
+        # past the deadline it is answered on its own.
+        _mark, result = await pipeline.process_page(poster, [follower], {})
+        assert result.done
+        while x.replies != [2]:
+            await asyncio.sleep(0.01)
+        release.set()
+        await lead
+        await asyncio.wait_for(poster.drain(), 5)
+        await poster.aclose()
+
+    asyncio.run(asyncio.wait_for(go(), 10))
+    assert calls == [1, 2]
+    assert sorted(x.replies) == [1, 2]
+
+
+def test_fetch_pages_oldest_first_and_truncates():
+    class Client:
+        def __init__(self):
+            self.calls = []
+
+        async def get_users_mentions(self, **params):
+            self.calls.append(params)
+            index = int(params.get("pagination_token") or 0)
+            meta = {"next_token": str(index + 1)} if index < 2 else {}
+            return SimpleNamespace(data=[f"page{index}"], meta=meta)
+
+    client = Client()
+    pages, truncated = asyncio.run(
+        async_listener.fetch_mention_pages_async(client, 42, start_time=T0, max_pages=2)
+    )
+    # X pages newest-first; the two oldest are kept, oldest first.
+    assert pages == [["page2"], ["page1"]] and truncated
+    assert client.calls[0]["start_time"] == T0
+
+
+class _FakeAsyncClient:
+    def __init__(self, name):
+        self.name = name
+
+    async def get_me(self):
+        if self.name == "revoked":
+            raise RuntimeError("401 Unauthorized")
+        return SimpleNamespace(data=SimpleNamespace(id=self.name))
+
+
+def _serve(monkeypatch, poll_account, names):
+    monkeypatch.setattr(async_listener, "register_team", lambda: None)
+    monkeypatch.setattr(async_listener, "size_timeline_pools", lambda callers: None)
+    monkeypatch.setattr(
+        async_listener, "build_async_client", lambda account: _FakeAsyncClient(account["name"])
+    )
+    monkeypatch.setattr(async_listener, "poll_account", poll_account)
+    monkeypatch.setattr(async_listener, "MentionCursor", SimpleNamespace(load=lambda path: None))
+    monkeypatch.setattr(async_listener, "AsyncTimelineClient", lambda: SimpleNamespace(aclose=_noop))
+    return asyncio.run(async_listener.run([{"name": name} for name in names]))
+
+
+def test_an_account_that_cannot_start_leaves_the_others_running(monkeypatch):
+    served = []
+
+    async def poll_account(pipeline, client, cursor, account=None, me=None):
+        served.append(me.id)
+
+    _serve(monkeypatch, poll_account, ["desk", "revoked"])
+    assert served == ["desk"]
+
+
+def test_an_account_that_stops_later_is_not_reported_as_failing_to_start(monkeypatch, capsys):
+    async def poll_account(pipeline, client, cursor, account=None, me=None):
+        if account == "desk":
+            raise RuntimeError("lost the timeline")
+        await asyncio.sleep(0.05)
+
+    # The other account keeps running; it is not a startup failure.
+    _serve(monkeypatch, poll_account, ["desk", "shop"])
+    out = capsys.readouterr().out
+    assert "Listener account 'desk' stopped: lost the timeline" in out
+    assert "could not start" not in out
+    with pytest.raises(RuntimeError, match="Every listener account stopped"):
+        _serve(monkeypatch, poll_account, ["desk"])
+
+
+def test_rate_limit_headers_reach_the_poll_scheduler_and_reply_bucket():
+    scheduler = SimpleNamespace(seen=[], observe_rate_limit=lambda headers: scheduler.seen.append(headers))
+    bucket = SimpleNamespace(seen=[], observe_rate_limit=lambda headers: bucket.seen.append(headers))
+    trace = async_listener.rate_limit_trace(scheduler, bucket)
+
+    async def respond(method, url):
+        response = SimpleNamespace(headers={"n": url})
+        params = SimpleNamespace(method=method, url=yarl.URL(url), response=response)
+        for handler in trace.on_request_end:
+            await handler(None, None, params)
+
+    async def go():
+        await respond("GET", "https://api.x.com/2/users/1/mentions")
+        await respond("POST", "https://api.x.com/2/tweets")
+        await respond("GET", "https://api.x.com/2/tweets")
+        await respond("GET", "https://api.x.com/2/users/me")
+
+    asyncio.run(go())
+    assert scheduler.seen == [{"n": "https://api.x.com/2/users/1/mentions"}]
+    assert bucket.seen == [{"n": "https://api.x.com/2/tweets"}]
+
+
+async def _noop():
+    return None
@@ -0,0 +1,108 @@
+"""Bulkheads: each member's own bounded lane, bots inline."""
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import listener
+from agents import bulkhead
+from agents.base import KIND_AGENT, KIND_BOT, AgentProfile, AgentReply, MentionContext, TeamMember
+from agents.bulkhead import Bulkhead, BulkheadFull, handle_in_lane
+
+
+class _Member(TeamMember):
+    def __init__(self, member_id, kind, handle, **limits):
+        profile = AgentProfile(id=member_id, handle=member_id, name=member_id, description="", kind=kind, **limits)
+        super().__init__(profile)
+        self.handle = handle
+
+    def handle_mention(self, mention):
+        return self.handle(mention)
+
+
+@pytest.fixture(autouse=True)
+def fresh_bulkheads(monkeypatch):
+    monkeypatch.setattr(bulkhead, "_BULKHEADS", {})
+
+
+def test_bots_run_inline_and_agents_on_their_own_threads():
+    def where(mention):
+        return AgentReply(text=threading.current_thread().name)
+
+    here = threading.current_thread().name
+    assert handle_in_lane(_Member("bot", KIND_BOT, where), MentionContext(text="")).text == here
+    assert handle_in_lane(_Member("slow", KIND_AGENT, where), MentionContext(text="")).text.startswith("member-slow")
+
+
+def test_calls_past_concurrency_plus_queue_depth_are_refused():
+    release = threading.Event()
+    box = Bulkhead("busy", max_concurrency=1, queue_depth=1)
+    running = box.submit(release.wait, 5)
+    queued = box.submit(release.wait, 5)
+    with pytest.raises(BulkheadFull):
+        box.submit(release.wait, 5)
+    assert box.in_flight() == 2 and box.rejected == 1
+    release.set()
+    running.result(5), queued.result(5)
+    assert box.in_flight() == 0
+    box.submit(lambda: None).result(5)
+
+
+def test_the_rest_of_an_admitted_call_is_never_refused_but_holds_a_slot():
+    release = threading.Event()
+    box = Bulkhead("brief", max_concurrency=1, queue_depth=0)
+    writing = box.follow(release.wait, 5)
+    # A brief already under way still counts: new mentions are shed...
+    with pytest.raises(BulkheadFull):
+        box.submit(release.wait, 5)
+    # ...but another admitted mention's brief is not.
+    queued = box.follow(release.wait, 5)
+    assert box.in_flight() == 2
+    release.set()
+    writing.result(5), queued.result(5)
+    assert box.in_flight() == 0
+
+
+def test_profile_limits_size_the_bulkhead():
+    member = _Member("research", KIND_AGENT, None, max_concurrency=3, queue_depth=7)
+    assert bulkhead.bulkhead_for(member).capacity == 10
+    assert bulkhead.bulkhead_for(_Member("ticker", KIND_BOT, None)) is None
+    assert bulkhead.team_capacity([member, _Member("ticker", KIND_BOT, None)]) == 10
+
+
+class _Poster:
+    def __init__(self):
+        self.replies = []
+
+    def submit(self, text, mention_id, on_failure=None, member=""):
+        self.replies.append(mention_id)
+
+
+def test_a_bot_mention_never_waits_behind_a_busy_agent(monkeypatch):
+    poster = _Poster()
+    monkeypatch.setattr(listener, "get_reply_poster", lambda client: poster)
+    release = threading.Event()
+    agent = _Member(
+        "research", KIND_AGENT, lambda m: release.wait(5) and AgentReply(text="brief"), max_concurrency=1, queue_depth=0
+    )
+    bot = _Member("ticker", KIND_BOT, lambda m: AgentReply(text="$TSLA"))
+    monkeypatch.setattr(listener, "route_mention", lambda context: [bot if "Ticker" in context.text else agent])
+
+    def mention(mention_id, text):
+        return SimpleNamespace(id=mention_id, text=text, author_id=mention_id, conversation_id=mention_id)
+
+    slow = threading.Thread(target=listener.process_mention, args=(None, mention(1, "@Research why?")))
+    slow.start()
+    while bulkhead.bulkhead_for(agent).in_flight() == 0:
+        threading.Event().wait(0.01)
+    # The agent is full: its next mention is shed for a retry, not queued...
+    assert listener.process_mention(None, mention(2, "@Research and?")) is False
+    with pytest.raises(listener.MentionDeferred):
+        listener.process_mention(None, mention(3, "@Research also?"), defer_throttled=True)
+    # ...and the bot answers meanwhile.
+    assert listener.process_mention(None, mention(4, "@TickerBot $TSLA"))
+    assert poster.replies == [4]
+    release.set()
+    slow.join(5)
+    assert poster.replies == [4, 1]
@@ -0,0 +1,128 @@
+"""grok_chat/grok_stream: identical prompts share one Grok call."""
+
+import threading
+
+import pytest
+
+from agents import base
+from agents.cache import TTLCache
+
+
+class _Grok:
+    model = "grok"
+    server_url = "http://mcp"
+
+    def __init__(self, release=None):
+        self.prompts = []
+        self.release = release
+
+    def chat(self, prompt):
+        self.prompts.append(prompt)
+        if self.release is not None:
+            self.release.wait(5)
+        return f"answer {len(self.prompts)}"
+
+    def stream(self, prompt):
+        self.prompts.append(prompt)
+        yield "streamed "
+        if self.release is not None:
+            self.release.wait(5)
+        yield "answer"
+
+
+@pytest.fixture
+def grok(monkeypatch):
+    def install(client, ttl=10):
+        monkeypatch.setattr(base, "get_grok_client", lambda: client)
+        monkeypatch.setattr(base, "_grok_answers", TTLCache("test_grok", ttl))
+        return client
+
+    return install
+
+
+def test_concurrent_identical_prompts_share_one_call(grok):
+    release = threading.Event()
+    client = grok(_Grok(release), ttl=0)
+    answers = []
+    threads = [
+        threading.Thread(target=lambda p=p: answers.append(base.grok_chat(p)))
+        for p in ("What about $NVDA?", "what  about $nvda?\n", "What about $NVDA?")
+    ]
+    for thread in threads:
+        thread.start()
+    while base._grok_answers.stats()["coalesced"] < 2:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert answers == ["answer 1"] * 3
+    assert len(client.prompts) == 1
+    # ttl=0: nothing kept once the call is done.
+    assert base.grok_chat("What about $NVDA?") == "answer 2"
+
+
+def test_recent_answer_is_reused_and_distinct_prompts_are_not(grok):
+    client = grok(_Grok())
+    assert base.grok_chat("a") == base.grok_chat("A ") == "answer 1"
+    assert base.grok_chat("b") == "answer 2"
+    assert len(client.prompts) == 2
+
+
+def test_completed_stream_is_cached(grok):
+    client = grok(_Grok())
+    assert "".join(base.grok_stream("q")) == "streamed answer"
+    assert list(base.grok_stream("q")) == ["streamed answer"]
+    assert base.grok_chat("q") == "streamed answer"
+    assert len(client.prompts) == 1
+
+
+def test_side_effecting_calls_bypass_the_cache(grok):
+    client = grok(_Grok())
+    assert base.grok_chat("Execute approve on item 1") == "answer 1"
+    assert base.grok_chat("Execute approve on item 1", cache=False) == "answer 2"
+    assert base.grok_chat("Execute approve on item 1", cache=False) == "answer 3"
+    assert len(client.prompts) == 3
+
+
+def test_general_agent_actions_are_never_served_from_cache(grok):
+    from agents.team.general import GeneralAgent
+
+    client = grok(_Grok())
+    agent = GeneralAgent()
+    item = {"id": "card-1", "title": "Follow up"}
+    assert agent.execute_action(item, "Approve") == "answer 1"
+    assert agent.execute_action(item, "Approve") == "answer 2"
+    assert len(client.prompts) == 2
+
+
+def test_stream_in_flight_is_shared(grok):
+    release = threading.Event()
+    client = grok(_Grok(release))
+    leader = base.grok_stream("q")
+    assert next(leader) == "streamed "
+    follower = base.grok_stream("Q ")
+    got = []
+    thread = threading.Thread(target=lambda: got.extend(follower))
+    thread.start()
+    release.set()
+    assert "".join(leader) == "answer"
+    thread.join(5)
+    assert got == ["streamed ", "answer"]
+    assert len(client.prompts) == 1
+    assert base.grok_chat("q") == "streamed answer"
+
+
+def test_followers_fail_when_the_shared_stream_is_abandoned(grok):
+    release = threading.Event()
+    client = grok(_Grok(release))
+    leader = base.grok_stream("q")
+    assert next(leader) == "streamed "
+    follower = base.grok_stream("q")
+    assert next(follower) == "streamed "
+    leader.close()
+    with pytest.raises(RuntimeError):
+        next(follower)
+    # Nothing truncated was cached; the next caller streams afresh.
+    release.set()
+    assert "".join(base.grok_stream("q")) == "streamed answer"
+    assert len(client.prompts) == 2
@@ -0,0 +1,71 @@
+"""Lane priority: urgent lanes first, aging so none starves."""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import listener
+from agents.base import PRIORITY_AGENT, PRIORITY_APPROVAL, PRIORITY_BOT, PRIORITY_GENERAL
+from agents.registry import get_team
+from lane_queue import LaneQueue, _depths
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_most_urgent_level_first_fifo_within_a_level():
+    queue = LaneQueue(aging_seconds=30, clock=_Clock())
+    queue.put(PRIORITY_GENERAL, "chat")
+    queue.put(PRIORITY_APPROVAL, "trade 1")
+    queue.put(PRIORITY_BOT, "ticker")
+    queue.put(PRIORITY_APPROVAL, "trade 2")
+    assert [queue.get() for _ in range(5)] == ["trade 1", "trade 2", "ticker", "chat", None]
+
+
+def test_a_waiting_lane_ages_ahead_of_fresh_urgent_ones():
+    clock = _Clock()
+    queue = LaneQueue(aging_seconds=30, clock=clock)
+    queue.put(PRIORITY_GENERAL, "chat")
+    clock.now = 100
+    queue.put(PRIORITY_APPROVAL, "trade")
+    # 100s is more than three levels' worth of aging.
+    assert queue.get() == "chat"
+    assert queue.depths() == {PRIORITY_GENERAL: 0, PRIORITY_APPROVAL: 1}
+
+
+def test_team_priorities():
+    priorities = {member.profile.id: listener.member_priority(member) for member in get_team()}
+    assert priorities == {
+        "tradedesk": PRIORITY_APPROVAL,
+        "shopping": PRIORITY_APPROVAL,
+        "tickerbot": PRIORITY_BOT,
+        "research": PRIORITY_AGENT,
+        "x-agent": PRIORITY_GENERAL,
+    }
+
+
+def test_backlogged_batch_runs_the_trade_lane_first(monkeypatch):
+    seen = []
+
+    def fake_run_lane(client, lane):
+        seen.append(lane[0].text)
+        return {mention.id: True for mention in lane}
+
+    monkeypatch.setattr(listener, "_run_lane", fake_run_lane)
+    t0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    texts = ["@MyXstack hi", "@Research why?", "@TickerBot $BTC", "@Tradedesk $TSLA buy 10"]
+    mentions = [
+        SimpleNamespace(id=i, text=text, author_id=i, conversation_id=i, created_at=t0 + timedelta(seconds=i))
+        for i, text in enumerate(texts)
+    ]
+    # One mention thread: lanes run strictly one at a time.
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        results = listener.process_batch(None, mentions, executor)
+    assert results == {0: True, 1: True, 2: True, 3: True}
+    assert seen == ["@Tradedesk $TSLA buy 10", "@TickerBot $BTC", "@Research why?", "@MyXstack hi"]
+    assert {labels["priority"]: depth for labels, depth in _depths()}["approval"] == 0
@@ -0,0 +1,359 @@
+"""Listener batch processing: per-conversation ordering and the watermark."""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+import listener
+from agents.base import AgentReply, merge_replies
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _mention(mention_id, conversation_id, offset):
+    return SimpleNamespace(
+        id=mention_id,
+        text=f"mention {mention_id}",
+        author_id=1,
+        conversation_id=conversation_id,
+        created_at=T0 + timedelta(seconds=offset),
+    )
+
+
+def test_conversations_run_concurrently(monkeypatch):
+    # Two conversations must be in flight at once: each waits for the other
+    # to start, which would deadlock (and time out) on a serial loop.
+    barrier = threading.Barrier(2, timeout=5)
+
+    def fake_process(client, mention):
+        barrier.wait()
+        return True
+
+    monkeypatch.setattr(listener, "process_mention", fake_process)
+    mentions = [_mention(1, "a", 0), _mention(2, "b", 1)]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = listener.process_batch(None, mentions, executor)
+    assert results == {1: True, 2: True}
+
+
+def test_same_conversation_stays_ordered_and_stops_at_failure(monkeypatch):
+    monkeypatch.setattr(listener, "COALESCE_WINDOW_SECONDS", 0)
+    seen = []
+
+    def fake_process(client, mention):
+        seen.append(mention.id)
+        return mention.id != 2
+
+    monkeypatch.setattr(listener, "process_mention", fake_process)
+    mentions = [_mention(1, "a", 0), _mention(2, "a", 1), _mention(3, "a", 2)]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = listener.process_batch(None, mentions, executor)
+    # Mention 3 must not overtake the failed mention 2 in its thread.
+    assert seen == [1, 2]
+    assert results == {1: True, 2: False}
+
+
+def test_unexpected_exception_counts_as_failure(monkeypatch):
+    def fake_process(client, mention):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(listener, "process_mention", fake_process)
+    assert listener.process_batch(None, [_mention(1, "a", 0)]) == {1: False}
+
+
+def test_watermark_only_covers_contiguous_prefix():
+    ordered = [_mention(1, "a", 0), _mention(2, "b", 1), _mention(3, "c", 2)]
+    completed = {1: ordered[0].created_at, 3: ordered[2].created_at}
+    assert listener.commit_watermark(ordered, completed) is ordered[0]
+    # Mention 3 finished past the gap; it is remembered so the retry skips it.
+    assert 3 in completed
+
+
+def test_watermark_holds_when_oldest_mention_failed():
+    ordered = [_mention(1, "a", 0), _mention(2, "b", 1)]
+    completed = {2: ordered[1].created_at}
+    assert listener.commit_watermark(ordered, completed) is None
+    assert completed == {2: ordered[1].created_at}
+
+
+def test_watermark_prunes_entries_behind_it():
+    ordered = [_mention(1, "a", 0), _mention(2, "b", 1)]
+    completed = {1: ordered[0].created_at, 2: ordered[1].created_at}
+    assert listener.commit_watermark(ordered, completed) is ordered[1]
+    assert completed == {2: ordered[1].created_at}
+
+
+class _FakeMentionsClient:
+    """Serves `mentions` newest-first in pages, like the X API."""
+
+    def __init__(self, mentions, page_size):
+        self.pages = [
+            mentions[::-1][i : i + page_size] for i in range(0, len(mentions), page_size)
+        ]
+        self.calls = []
+
+    def get_users_mentions(self, **params):
+        self.calls.append(params)
+        index = int(params.get("pagination_token") or 0)
+        next_index = index + 1
+        meta = {"next_token": str(next_index)} if next_index < len(self.pages) else {}
+        return SimpleNamespace(data=self.pages[index] if self.pages else None, meta=meta)
+
+
+def test_catch_up_walks_every_page_oldest_first():
+    mentions = [_mention(i, i, i) for i in range(1, 8)]
+    client = _FakeMentionsClient(mentions, page_size=3)
+    pages, truncated = listener.fetch_mention_pages(client, 42, start_time=T0, since_id=None)
+    assert not truncated
+    assert len(client.calls) == 3
+    assert sorted(m.id for page in pages for m in page) == list(range(1, 8))
+    # The oldest page comes first so the watermark only moves forward.
+    assert min(m.id for m in pages[0]) == 1
+    assert all(call["max_results"] == listener.MENTIONS_PAGE_SIZE for call in client.calls)
+    assert client.calls[0]["start_time"] == T0
+
+
+def test_catch_up_keeps_only_the_oldest_pages():
+    mentions = [_mention(i, i, i) for i in range(1, 8)]
+    client = _FakeMentionsClient(mentions, page_size=3)
+    pages, truncated = listener.fetch_mention_pages(
+        client, 42, start_time=T0, since_id=5, max_pages=1
+    )
+    assert truncated
+    assert [m.id for m in pages[0]] == [1]
+    assert client.calls[0]["since_id"] == 5
+    assert "start_time" not in client.calls[0]
+
+
+def test_page_stops_short_when_a_mention_fails(monkeypatch):
+    monkeypatch.setattr(listener, "process_mention", lambda client, m: m.id != 2)
+    page = [_mention(3, "c", 2), _mention(1, "a", 0), _mention(2, "b", 1)]
+    completed = {}
+    mark, result = listener.process_page(None, page, None, completed)
+    assert mark.id == 1
+    assert not result.done
+    assert result.worked == 3
+    # Mention 3 completed past the failed one; the source is told so.
+    assert result.completed == {1, 3}
+
+
+def test_a_failure_in_an_earlier_stream_batch_holds_the_watermark(monkeypatch):
+    failing = {1}
+    monkeypatch.setattr(listener, "process_mention", lambda client, m: m.id not in failing)
+    cursor = listener.MentionCursor(T0)
+    first, second = _mention(1, "a", 0), _mention(2, "b", 1)
+
+    # Batch N: mention 1 fails, and the backfill that follows fails too.
+    mark, result = listener.process_page(None, [first], None, cursor.completed, cursor.failed)
+    assert mark is None and not result.done
+    # Batch N+1 succeeds, but must not move the watermark past mention 1.
+    mark, result = listener.process_page(None, [second], None, cursor.completed, cursor.failed)
+    assert mark is None and result.done
+
+    # A later backfill from the watermark fetches both; 1 now completes.
+    failing.clear()
+    mark, result = listener.process_page(None, [second, first], None, cursor.completed, cursor.failed)
+    assert mark is second and result.done
+    assert cursor.failed == {}
+
+
+def test_a_failed_mention_a_fetch_no_longer_returns_stops_holding_the_watermark():
+    cursor = listener.MentionCursor(T0)
+    cursor.failed = {1: T0, 9: T0 + timedelta(seconds=9)}
+    cursor.forget_missing([[_mention(2, "b", 1), _mention(3, "c", 2)]])
+    # 1 was deleted; 9 is newer than anything fetched and may still appear.
+    assert cursor.failed == {9: T0 + timedelta(seconds=9)}
+
+
+def test_accounts_default_to_the_single_env_account(monkeypatch):
+    monkeypatch.delenv("X_ACCOUNTS", raising=False)
+    monkeypatch.delenv("X_ACCOUNTS_FILE", raising=False)
+    assert listener.load_accounts() == [{"name": ""}]
+    assert listener.last_seen_path("") == listener.LAST_SEEN_PATH
+
+
+def test_accounts_are_read_and_validated(monkeypatch, tmp_path):
+    accounts = [
+        {"name": "desk", "access_token": "t1", "access_secret": "s1"},
+        {"name": "shop", "access_token": "t2", "access_secret": "s2"},
+    ]
+    path = tmp_path / "accounts.json"
+    path.write_text(json.dumps(accounts))
+    monkeypatch.setenv("X_ACCOUNTS_FILE", str(path))
+    assert [a["name"] for a in listener.load_accounts()] == ["desk", "shop"]
+    # Each account keeps its own watermark file.
+    assert listener.last_seen_path("desk") != listener.last_seen_path("shop")
+
+    monkeypatch.delenv("X_ACCOUNTS_FILE")
+    for bad in ([accounts[0], accounts[0]], [{"name": "x"}], [], "nope"):
+        monkeypatch.setenv("X_ACCOUNTS", json.dumps(bad) if bad != "nope" else bad)
+        with pytest.raises(RuntimeError):
+            listener.load_accounts()
+
+
+def test_cursor_resumes_from_its_own_watermark(tmp_path):
+    path = tmp_path / "last_seen.desk.txt"
+    cursor = listener.MentionCursor.load(path)
+    cursor.advance(_mention(9, "a", 30))
+    assert listener.MentionCursor.load(path).start_time == T0 + timedelta(seconds=30)
+
+
+class _FanoutMember:
+    def __init__(self, member_id, handle):
+        self.profile = SimpleNamespace(id=member_id, kind="agent", max_concurrency=2, queue_depth=0)
+        self.handle_mention = handle
+
+
+def _fanout(monkeypatch, members, fail_cards=()):
+    cards, replies = [], []
+    monkeypatch.setattr(listener, "route_mention", lambda context: members)
+
+    def push(card, posted_by):
+        if posted_by in fail_cards:
+            raise RuntimeError("timeline down")
+        cards.append(posted_by)
+        return {"id": card["title"]}
+
+    monkeypatch.setattr(listener, "push_timeline_card", push)
+    poster = SimpleNamespace(submit=lambda text, mention_id, on_failure=None, member="": replies.append(text))
+    monkeypatch.setattr(listener, "get_reply_poster", lambda client: poster)
+    return cards, replies
+
+
+def test_every_tagged_member_answers_at_once_in_one_reply(monkeypatch):
+    # Each member waits for the other to start: run one after the other,
+    # they would time out on the barrier.
+    barrier = threading.Barrier(2, timeout=5)
+
+    def handler(name):
+        def handle(context):
+            barrier.wait()
+            return AgentReply(text=f"{name} says hi", card={"title": name})
+
+        return handle
+
+    members = [_FanoutMember("fan-research", handler("research")), _FanoutMember("fan-desk", handler("desk"))]
+    cards, replies = _fanout(monkeypatch, members)
+    assert listener.process_mention(None, _mention(1, "a", 0))
+    assert sorted(cards) == ["fan-desk", "fan-research"]
+    # One post, in tag order.
+    assert replies == ["research says hi\n\ndesk says hi"]
+
+
+def test_retry_runs_only_the_members_that_did_not_answer(monkeypatch):
+    calls = []
+
+    def handler(name):
+        def handle(context):
+            calls.append(name)
+            return AgentReply(text=name, card={"title": name})
+
+        return handle
+
+    members = [_FanoutMember("fan-a", handler("a")), _FanoutMember("fan-b", handler("b"))]
+    cards, replies = _fanout(monkeypatch, members, fail_cards={"fan-b"})
+    assert listener.process_mention(None, _mention(1, "a", 0)) is False
+    assert cards == ["fan-a"] and replies == ["a"]
+
+    cards, replies = _fanout(monkeypatch, members)
+    assert listener.process_mention(None, _mention(1, "a", 0))
+    assert sorted(calls) == ["a", "b", "b"]
+    assert cards == ["fan-b"] and replies == ["b"]
+
+
+def test_merged_replies_share_the_length_limit():
+    merged = merge_replies(["short", "x " * 200, ""])
+    assert len(merged) <= 280
+    assert merged.startswith("short\n\nx x") and merged.endswith("…")
+
+
+def test_a_burst_in_one_thread_reaches_the_member_once(monkeypatch):
+    contexts = []
+
+    def handle(context):
+        contexts.append(context)
+        return AgentReply(text="one answer", card={"title": "brief"})
+
+    member = _FanoutMember("fan-chat", handle)
+    member.profile.coalesce = True
+    cards, replies = _fanout(monkeypatch, [member])
+    burst = [_mention(1, "a", 0), _mention(2, "a", 4), _mention(3, "a", 8), _mention(4, "a", 30)]
+    burst[3].author_id = 2
+    results = listener.process_batch(None, burst)
+    assert results == {1: True, 2: True, 3: True, 4: True}
+    # 1-3 are one author's burst; 4 is late and from someone else.
+    assert [context.text for context in contexts] == ["mention 1\nmention 2\nmention 3", "mention 4"]
+    assert [context.mention_id for context in contexts] == [3, 4]
+    assert cards == ["fan-chat", "fan-chat"] and replies == ["one answer", "one answer"]
+
+
+def test_members_that_take_each_mention_separately_are_never_coalesced(monkeypatch):
+    contexts = []
+    member = _FanoutMember("fan-desk", lambda context: contexts.append(context) or AgentReply(text="ok"))
+    _fanout(monkeypatch, [member])
+    assert listener.process_batch(None, [_mention(1, "a", 0), _mention(2, "a", 1)]) == {1: True, 2: True}
+    assert len(contexts) == 2
+
+
+def test_a_reply_written_after_the_card_is_queued_before_the_mention_is_done(monkeypatch):
+    threads = []
+
+    def write_brief(item):
+        threads.append(threading.current_thread().name)
+        return f"brief for {item['id']}"
+
+    member = _FanoutMember(
+        "fan-brief", lambda context: AgentReply(text="", card={"title": "card"}, after_card=write_brief)
+    )
+    cards, replies = _fanout(monkeypatch, [member])
+    assert listener.process_mention(None, _mention(1, "a", 0))
+    # Written in the member's own lane, not the shared after-card pool, and
+    # already queued when process_mention returned.
+    assert threads[0].startswith("member-fan-brief")
+    assert replies == ["brief for card"]
+
+
+def test_a_reply_still_being_written_does_not_hold_back_another_members_card(monkeypatch):
+    brief_started = threading.Event()
+    seen_desk_card = []
+
+    def write_brief(item):
+        brief_started.set()
+        # The approval card must land while the brief is still streaming.
+        deadline = time.monotonic() + 5
+        while "fan-desk" not in cards and time.monotonic() < deadline:
+            time.sleep(0.01)
+        seen_desk_card.append("fan-desk" in cards)
+        return "brief"
+
+    def propose(context):
+        # Done only after the brief has started, so its card comes second.
+        brief_started.wait(5)
+        return AgentReply(text="proposed", card={"title": "approval"})
+
+    brief = AgentReply(text="", card={"title": "b"}, after_card=write_brief)
+    members = [_FanoutMember("fan-brief", lambda context: brief), _FanoutMember("fan-desk", propose)]
+    cards, replies = _fanout(monkeypatch, members)
+    assert listener.process_mention(None, _mention(1, "a", 0))
+    assert seen_desk_card == [True]
+    assert cards == ["fan-brief", "fan-desk"]
+    assert replies == ["brief\n\nproposed"]
+
+
+def test_an_account_that_cannot_start_is_skipped(monkeypatch):
+    class _Account:
+        def __init__(self, credentials):
+            if credentials["name"] == "revoked":
+                raise RuntimeError("401 Unauthorized")
+            self.name = credentials["name"]
+
+    monkeypatch.setattr(listener, "Account", _Account)
+    accounts = listener.start_accounts([{"name": "desk"}, {"name": "revoked"}, {"name": "shop"}])
+    assert [account.name for account in accounts] == ["desk", "shop"]
+    with pytest.raises(RuntimeError, match="No listener account"):
+        listener.start_accounts([{"name": "revoked"}])
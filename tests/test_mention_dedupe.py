@@ -0,0 +1,259 @@
+"""Near-duplicate collapse: MinHash/LSH index and the listener's fan-out."""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import listener
+from agents.base import AgentReply
+from mention_dedupe import NearDuplicateIndex, signature, similarity
+
+SPAM = "@Research is it true that $XYZ is going to 100x this week?? everyone says so https://t.co/abc"
+
+
+def test_near_duplicates_score_high_and_distinct_text_low():
+    base = signature(SPAM)
+    assert similarity(base, signature(SPAM.upper().replace("https://t.co/abc", "https://t.co/zzz"))) == 1.0
+    assert similarity(base, signature(SPAM.replace("this week", "this week!!! 🚀"))) >= 0.8
+    assert similarity(base, signature("@Research summarize today's Fed minutes for me")) < 0.3
+
+
+def test_other_authors_follow_the_leader():
+    index = NearDuplicateIndex(window=60)
+    group, leader = index.claim(SPAM, author_id=1, mention_id=10)
+    assert leader
+    follower, leads = index.claim(SPAM + " !!", author_id=2, mention_id=11)
+    assert follower is group and not leads
+    # The same author asking again, a different ticker, or another member
+    # tagged are all requests of their own.
+    assert index.claim(SPAM, author_id=1, mention_id=12)[1]
+    assert index.claim(SPAM.replace("$XYZ", "$ABC"), author_id=3, mention_id=13)[1]
+    assert index.claim(SPAM.replace("@Research", "@Shopping"), author_id=4, mention_id=14)[1]
+
+
+def test_leaders_expire_and_failed_groups_are_not_joined():
+    now = [0.0]
+    index = NearDuplicateIndex(window=60, clock=lambda: now[0])
+    group, _ = index.claim(SPAM, 1, 10)
+    now[0] = 61
+    assert index.claim(SPAM, 2, 11)[1]
+
+    failed, _ = index.claim("@Research another copy-paste wave of text here", 5, 20)
+    failed.fail()
+    assert index.claim("@Research another copy-paste wave of text here", 6, 21)[1]
+
+
+def test_deferred_text_reaches_followers_registered_before_and_after():
+    group, _ = NearDuplicateIndex(window=60).claim(SPAM, 1, 10)
+    seen = []
+    group.on_text(seen.append)
+    group.publish_text("brief")
+    group.on_text(seen.append)
+    assert seen == ["brief", "brief"]
+
+
+def test_a_group_settles_once_on_its_deadline():
+    group, _ = NearDuplicateIndex(window=60, wait=0.05).claim(SPAM, 1, 10)
+    seen = []
+    group.when_settled(seen.append)
+    deadline = time.monotonic() + 5
+    while not seen and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # Too late to share; followers have been sent on alone.
+    group.share("research", AgentReply(text="No."))
+    group.when_settled(seen.append)
+    assert seen == [None, None]
+
+
+class _Poster:
+    def __init__(self):
+        self.replies = []
+
+    def submit(self, text, mention_id, on_failure=None, member=""):
+        self.replies.append((mention_id, text))
+
+
+def test_listener_answers_a_wave_with_one_member_call(monkeypatch):
+    monkeypatch.setattr(listener, "DUPLICATES", NearDuplicateIndex(window=60))
+    poster = _Poster()
+    monkeypatch.setattr(listener, "get_reply_poster", lambda client: poster)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def handle(context):
+        calls.append(context.mention_id)
+        started.set()
+        release.wait(5)
+        return AgentReply(text="No.")
+
+    member = SimpleNamespace(
+        profile=SimpleNamespace(id="research", kind="agent", share_replies=True), handle_mention=handle
+    )
+    monkeypatch.setattr(listener, "route_mention", lambda context: [member])
+
+    def mention(mention_id, author_id):
+        return SimpleNamespace(id=mention_id, text=SPAM, author_id=author_id, conversation_id=mention_id)
+
+    results = {}
+    leader = threading.Thread(target=lambda: results.update({1: listener.process_mention(None, mention(1, 1))}))
+    leader.start()
+    assert started.wait(5)
+    followers = [
+        threading.Thread(target=lambda i=i: results.update({i: listener.process_mention(None, mention(i, i))}))
+        for i in (2, 3)
+    ]
+    for thread in followers:
+        thread.start()
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert calls == [1]
+    assert results == {1: True, 2: True, 3: True}
+    assert sorted(poster.replies) == [(1, "No."), (2, "No."), (3, "No.")]
+
+
+def test_approval_cards_are_never_shared(monkeypatch):
+    monkeypatch.setattr(listener, "DUPLICATES", NearDuplicateIndex(window=60))
+    poster = _Poster()
+    monkeypatch.setattr(listener, "get_reply_poster", lambda client: poster)
+    monkeypatch.setattr(listener, "push_timeline_card", lambda card, posted_by: {"id": "card"})
+    calls = []
+
+    def handle(context):
+        calls.append(context.mention_id)
+        return AgentReply(text="Proposal logged.", card={"title": "t", "actions": [{"id": "approve"}]})
+
+    member = SimpleNamespace(profile=SimpleNamespace(id="tradedesk", kind="agent"), handle_mention=handle)
+    monkeypatch.setattr(listener, "route_mention", lambda context: [member])
+    text = "@Tradedesk $TSLA buy 100 please"
+    for i in (1, 2):
+        assert listener.process_mention(None, SimpleNamespace(id=i, text=text, author_id=i, conversation_id=i))
+    assert calls == [1, 2]
+
+
+def test_a_member_with_approval_cards_never_makes_a_duplicate_wait(monkeypatch):
+    # General's cards carry Approve/Reject/Snooze, so its replies are never
+    # shared; a near-duplicate must not wait on a leader that cannot help it.
+    monkeypatch.setattr(listener, "DUPLICATES", NearDuplicateIndex(window=60))
+    poster = _Poster()
+    monkeypatch.setattr(listener, "get_reply_poster", lambda client: poster)
+    monkeypatch.setattr(listener, "push_timeline_card", lambda card, posted_by: {"id": "card"})
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def handle(context):
+        calls.append(context.mention_id)
+        if context.mention_id == 1:
+            started.set()
+            release.wait(5)
+        return AgentReply(text="No.", card={"title": "t", "actions": ["Approve", "Reject", "Snooze"]})
+
+    member = SimpleNamespace(profile=SimpleNamespace(id="x-agent", kind="agent"), handle_mention=handle)
+    monkeypatch.setattr(listener, "route_mention", lambda context: [member])
+
+    def mention(mention_id, author_id):
+        return SimpleNamespace(id=mention_id, text=SPAM, author_id=author_id, conversation_id=mention_id)
+
+    leader = threading.Thread(target=listener.process_mention, args=(None, mention(1, 1)))
+    leader.start()
+    assert started.wait(5)
+    try:
+        # Answered on its own while the first is still running.
+        began = time.monotonic()
+        assert listener.process_mention(None, mention(2, 2))
+        assert time.monotonic() - began < 2
+        assert calls == [1, 2]
+    finally:
+        release.set()
+        leader.join(5)
+
+
+def _waiting_member(monkeypatch, release):
+    calls = []
+
+    def handle(context):
+        calls.append(context.mention_id)
+        if context.mention_id == 1:
+            release.wait(5)
+        return AgentReply(text="No.")
+
+    member = SimpleNamespace(
+        profile=SimpleNamespace(id="research", kind="agent", share_replies=True), handle_mention=handle
+    )
+    monkeypatch.setattr(listener, "route_mention", lambda context: [member])
+    return calls
+
+
+def _spam(mention_id):
+    return SimpleNamespace(id=mention_id, text=SPAM, author_id=mention_id, conversation_id=mention_id)
+
+
+def test_a_burst_of_followers_holds_no_thread(monkeypatch):
+    monkeypatch.setattr(listener, "DUPLICATES", NearDuplicateIndex(window=60))
+    poster = _Poster()
+    monkeypatch.setattr(listener, "get_reply_poster", lambda client: poster)
+    release = threading.Event()
+    calls = _waiting_member(monkeypatch, release)
+    leader = threading.Thread(target=listener.process_mention, args=(None, _spam(1)))
+    leader.start()
+    try:
+        while calls != [1]:
+            time.sleep(0.01)
+        # Every follower returns at once, on the caller's thread, while the
+        # leader is still running.
+        began = time.monotonic()
+        assert all(listener.process_mention(None, _spam(i)) for i in range(2, 52))
+        assert time.monotonic() - began < 2
+        assert poster.replies == []
+    finally:
+        release.set()
+        leader.join(5)
+    assert calls == [1]
+    assert sorted(poster.replies) == [(i, "No.") for i in range(1, 52)]
+
+
+def test_followers_of_a_stuck_leader_are_processed_on_their_own(monkeypatch):
+    monkeypatch.setattr(listener, "DUPLICATES", NearDuplicateIndex(window=60, wait=0.1))
+    poster = _Poster()
+    monkeypatch.setattr(listener, "get_reply_poster", lambda client: poster)
+    release = threading.Event()
+    calls = _waiting_member(monkeypatch, release)
+    leader = threading.Thread(target=listener.process_mention, args=(None, _spam(1)))
+    leader.start()
+    try:
+        while calls != [1]:
+            time.sleep(0.01)
+        assert listener.process_mention(None, _spam(2))
+        deadline = time.monotonic() + 5
+        while not poster.replies and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert calls == [1, 2] and poster.replies == [(2, "No.")]
+    finally:
+        release.set()
+        leader.join(5)
+
+
+def test_a_queued_follower_goes_back_on_the_queue_and_rejoins_its_group(monkeypatch):
+    monkeypatch.setattr(listener, "DUPLICATES", NearDuplicateIndex(window=60))
+    poster = _Poster()
+    monkeypatch.setattr(listener, "get_reply_poster", lambda client: poster)
+    release = threading.Event()
+    calls = _waiting_member(monkeypatch, release)
+    leader = threading.Thread(target=listener.process_mention, args=(None, _spam(1)))
+    leader.start()
+    try:
+        while calls != [1]:
+            time.sleep(0.01)
+        with pytest.raises(listener.MentionDeferred) as deferred:
+            listener.process_mention(None, _spam(2), defer_throttled=True)
+        assert 0 < deferred.value.delay <= listener.DEDUPE_RECHECK_SECONDS
+    finally:
+        release.set()
+        leader.join(5)
+    # Claimed again once the leader has answered: the same group, not a new one.
+    assert listener.process_mention(None, _spam(2), defer_throttled=True)
+    assert calls == [1]
+    assert sorted(poster.replies) == [(1, "No."), (2, "No.")]
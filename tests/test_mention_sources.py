@@ -0,0 +1,227 @@
+"""Mention sources: the poller and the filtered stream (against a fake X)."""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from mention_sources import (
+    BatchResult,
+    FilteredStreamSource,
+    PollingSource,
+    WebhookSource,
+    build_mention_source,
+    drain_backlog,
+)
+from poll_scheduler import PollScheduler
+
+
+def _line(tweet, *rules):
+    """A stream line for `tweet`, matching the mention rule unless `rules`
+    (tag, id pairs) say otherwise."""
+    matching = [{"id": rule_id, "tag": tag} for tag, rule_id in rules or [("mentions", "1")]]
+    return json.dumps({"data": tweet, "matching_rules": matching})
+
+
+def _tweet(tweet_id, conversation_id):
+    return {
+        "id": str(tweet_id),
+        "text": f"@bot hello {tweet_id}",
+        "author_id": "7",
+        "conversation_id": str(conversation_id),
+        "created_at": "2026-01-01T00:00:00.000Z",
+        "edit_history_tweet_ids": [str(tweet_id)],
+    }
+
+
+class _FakeX:
+    """Just enough of the filtered-stream API: rules, and one stream
+    connection per entry in `connections`, each a list of lines."""
+
+    def __init__(self, connections):
+        self.connections = list(connections)
+        self.rules = []
+        self.stream_connects = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.0"
+
+            def log_message(self, *_args):
+                pass
+
+            def _json(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                assert self.headers["Authorization"] == "Bearer app-token"
+                if self.path.startswith("/2/tweets/search/stream/rules"):
+                    rules = [{"id": str(i), "value": v} for i, v in enumerate(fake.rules, 1)]
+                    self._json(200, {"data": rules})
+                    return
+                assert "tweet.fields=" in self.path
+                fake.stream_connects += 1
+                lines = fake.connections.pop(0) if fake.connections else []
+                self.send_response(200)
+                self.end_headers()
+                for line in lines:
+                    self.wfile.write(line.encode() + b"\r\n")
+                    self.wfile.flush()
+                # Closing the connection ends the stream.
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                created = []
+                for rule in payload["add"]:
+                    fake.rules.append(rule["value"])
+                    created.append({"id": str(len(fake.rules)), "value": rule["value"], "tag": rule["tag"]})
+                self._json(201, {"data": created, "meta": {"summary": {"created": len(created)}}})
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake_x():
+    servers = []
+
+    def make(connections):
+        server = _FakeX(connections)
+        servers.append(server)
+        return server
+
+    yield make
+    for server in servers:
+        server.close()
+
+
+def _run_until(source, fetch, handle, stop, timeout=10):
+    thread = threading.Thread(target=source.run, args=(fetch, handle, stop), daemon=True)
+    thread.start()
+    assert stop.wait(timeout), "source never delivered the expected mentions"
+    thread.join(timeout)
+
+
+def test_stream_delivers_mentions_and_reconnects_with_backfill(fake_x):
+    x = fake_x(
+        [
+            [_line(_tweet(1, 1)), ""],  # "" is a keep-alive
+            [_line(_tweet(2, 2))],
+        ]
+    )
+    delivered, backfills = [], []
+    stop = threading.Event()
+
+    def fetch():
+        backfills.append(1)
+        return [], False
+
+    def handle(batch):
+        delivered.extend(m.id for m in batch)
+        if len(delivered) == 2:
+            stop.set()
+        return BatchResult(True, len(batch), frozenset(m.id for m in batch))
+
+    source = FilteredStreamSource("app-token", "bot", base_url=x.url)
+    _run_until(source, fetch, handle, stop)
+
+    assert delivered == [1, 2]
+    assert x.stream_connects == 2
+    # One backfill per connect covers whatever was posted in between.
+    assert len(backfills) == 2
+    # The rule is installed once and never duplicated on reconnect.
+    assert x.rules == ["@bot -from:bot"]
+
+
+def test_stream_backfills_after_a_failed_batch(fake_x):
+    x = fake_x([[_line(_tweet(1, 1))]])
+    backfills = []
+    stop = threading.Event()
+
+    def fetch():
+        backfills.append(1)
+        if len(backfills) == 2:
+            stop.set()
+        return [], False
+
+    def handle(batch):
+        return BatchResult(False, len(batch), frozenset())
+
+    _run_until(FilteredStreamSource("app-token", "bot", base_url=x.url), fetch, handle, stop)
+    assert len(backfills) == 2
+
+
+def test_stream_skips_posts_matching_other_rules(fake_x):
+    x = fake_x(
+        [
+            [
+                _line(_tweet(1, 1), ("brand-monitoring", "9")),
+                _line(_tweet(2, 2), ("brand-monitoring", "9"), ("mentions", "1")),
+                # Installed before it was tagged: matched by its rule id.
+                _line(_tweet(3, 3), (None, "1")),
+                json.dumps({"data": _tweet(4, 4)}),
+            ]
+        ]
+    )
+    delivered = []
+    stop = threading.Event()
+
+    def handle(batch):
+        delivered.extend(m.id for m in batch)
+        if 3 in delivered:
+            stop.set()
+        return BatchResult(True, len(batch), frozenset(m.id for m in batch))
+
+    _run_until(FilteredStreamSource("app-token", "bot", base_url=x.url), lambda: ([], False), handle, stop)
+    assert delivered == [2, 3]
+
+
+def test_drain_backlog_stops_at_incomplete_page():
+    handled = []
+
+    def handle(page):
+        handled.append(page)
+        return BatchResult(page != ["b"], len(page), frozenset())
+
+    assert drain_backlog(lambda: ([["a"], ["b"], ["c"]], False), handle) == (False, 2)
+    assert handled == [["a"], ["b"]]
+
+
+def test_polling_source_records_arrivals_and_sleeps():
+    stop = threading.Event()
+    scheduler = PollScheduler(min_interval=0, max_interval=0)
+    recorded = []
+    scheduler.record_poll = recorded.append
+
+    def handle(page):
+        stop.set()
+        return BatchResult(True, len(page), frozenset(page))
+
+    PollingSource(scheduler).run(lambda: ([["m1", "m2"]], False), handle, stop)
+    assert recorded == [2]
+
+
+def test_build_mention_source(monkeypatch):
+    bot = SimpleNamespace(username="bot")
+    monkeypatch.delenv("LISTENER_SOURCE", raising=False)
+    assert isinstance(build_mention_source(bot), PollingSource)
+    monkeypatch.setenv("LISTENER_SOURCE", "stream")
+    monkeypatch.setenv("X_BEARER_TOKEN", "app-token")
+    assert isinstance(build_mention_source(bot), FilteredStreamSource)
+    monkeypatch.setenv("LISTENER_SOURCE", "webhook")
+    assert isinstance(build_mention_source(bot), WebhookSource)
+    monkeypatch.setenv("LISTENER_SOURCE", "carrier-pigeon")
+    with pytest.raises(RuntimeError):
+        build_mention_source(bot)
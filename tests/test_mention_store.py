@@ -0,0 +1,232 @@
+"""The SQL mention work queue: claiming, leases, retries and dead-letters."""
+
+import os
+import threading
+import time
+
+import pytest
+from sqlalchemy import inspect, text
+
+import listener
+from mention_store import (
+    STATUS_CLAIMED,
+    STATUS_DEAD,
+    STATUS_DONE,
+    STATUS_PENDING,
+    claim_mentions,
+    complete_mention,
+    hold_lease,
+    queue_depths,
+    record_mention,
+    release_mention,
+)
+from storage_db import _add_missing_columns, get_engine, metadata, reset_engine_for_tests
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    url = os.getenv("TEST_DATABASE_URL") or f"sqlite:///{tmp_path / 'xmcp.db'}"
+    monkeypatch.setenv("DATABASE_URL", url)
+    reset_engine_for_tests()
+    engine = get_engine()
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    yield engine
+    reset_engine_for_tests()
+
+
+def _payload(tweet_id, conversation_id=None):
+    payload = {
+        "id": str(tweet_id),
+        "text": f"@bot hello {tweet_id}",
+        "author_id": "7",
+        "created_at": "2026-01-01T00:00:00.000Z",
+        "edit_history_tweet_ids": [str(tweet_id)],
+    }
+    if conversation_id:
+        payload["conversation_id"] = str(conversation_id)
+    return payload
+
+
+def _enqueue(*payloads):
+    for payload in payloads:
+        record_mention(payload, source="poll")
+        # Queue order is insertion order; keep timestamps distinct.
+        time.sleep(0.002)
+
+
+def test_claims_are_disjoint_and_leased(db):
+    _enqueue(_payload(1), _payload(2), _payload(3))
+    first = claim_mentions("a", limit=2)
+    second = claim_mentions("b", limit=2)
+    assert [row["id"] for row in first] == ["1", "2"]
+    assert [row["id"] for row in second] == ["3"]
+    assert claim_mentions("100") == []
+    assert first[0]["status"] == STATUS_CLAIMED and first[0]["attempts"] == 1
+    assert first[0]["lease_owner"] == "a"
+
+
+def test_concurrent_claimers_never_share_a_mention(db):
+    _enqueue(*[_payload(i) for i in range(20)])
+    claimed = []
+    lock = threading.Lock()
+
+    def claimer(owner):
+        while True:
+            rows = claim_mentions(owner, limit=3)
+            if not rows:
+                return
+            with lock:
+                claimed.extend(row["id"] for row in rows)
+
+    threads = [threading.Thread(target=claimer, args=(f"w{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert sorted(claimed, key=int) == [str(i) for i in range(20)]
+
+
+def test_conversation_is_claimed_in_order(db):
+    _enqueue(_payload(1, "100"), _payload(2, "100"), _payload(3, "200"))
+    # Mention 2 waits behind 1 in its thread; 3 is another thread.
+    assert [row["id"] for row in claim_mentions("a", limit=5)] == ["1", "3"]
+    assert claim_mentions("b") == []
+    assert complete_mention("1", "a")
+    assert [row["id"] for row in claim_mentions("b")] == ["2"]
+
+
+def test_completion_needs_the_lease(db):
+    _enqueue(_payload(1))
+    claim_mentions("a")
+    assert not complete_mention("1", "b")
+    assert complete_mention("1", "a")
+    assert queue_depths() == {STATUS_DONE: 1}
+
+
+def test_lapsed_lease_is_taken_over(db):
+    _enqueue(_payload(1))
+    claim_mentions("a", visibility_timeout=0)
+    rows = claim_mentions("b")
+    assert [row["id"] for row in rows] == ["1"]
+    assert rows[0]["attempts"] == 2
+    # The original worker finishing late must not settle b's claim.
+    assert not complete_mention("1", "a")
+
+
+def test_release_retries_after_delay_then_dead_letters(db):
+    _enqueue(_payload(1))
+    claim_mentions("a")
+    assert release_mention("1", "a", "card push failed", retry_delay=60) == STATUS_PENDING
+    assert claim_mentions("a") == []
+
+    with db.begin() as conn:
+        conn.execute(text("UPDATE mentions SET lease_expires_at = NULL"))
+    claim_mentions("a", max_attempts=2)
+    assert release_mention("1", "a", "card push failed", max_attempts=2) == STATUS_DEAD
+    assert claim_mentions("a") == []
+    assert queue_depths() == {STATUS_DEAD: 1}
+
+
+def test_expired_lease_past_max_attempts_is_dead_lettered(db):
+    _enqueue(_payload(1), _payload(2, "100"), _payload(3, "100"))
+    claim_mentions("a", limit=2, visibility_timeout=0)
+    # Mention 2 keeps killing its worker: its lease lapses at the limit.
+    rows = claim_mentions("b", limit=5, max_attempts=1)
+    assert queue_depths()[STATUS_DEAD] == 2
+    # A dead mention no longer holds up its conversation.
+    assert [row["id"] for row in rows] == ["3"]
+
+
+def test_queue_worker_completes_and_releases(db, monkeypatch):
+    _enqueue(_payload(1, "100"), _payload(2, "200"))
+    stop = threading.Event()
+    seen = []
+
+    def fake_process(client, mention, defer_throttled=False):
+        seen.append(mention.id)
+        if len(seen) == 2:
+            stop.set()
+        return mention.id == 1
+
+    monkeypatch.setattr(listener, "process_mention", fake_process)
+    listener.run_queue_worker({"": None}, "w", stop, idle_seconds=0.01)
+    assert seen == [1, 2]
+    assert queue_depths() == {STATUS_DONE: 1, STATUS_PENDING: 1}
+
+
+def test_enqueue_page_is_idempotent(db):
+    import tweepy
+
+    page = [tweepy.Tweet(_payload(2)), tweepy.Tweet(_payload(1))]
+    result = listener.enqueue_page(page, "poll")
+    assert (result.done, result.worked, result.completed) == (True, 2, frozenset())
+    assert listener.enqueue_page(page, "poll").worked == 0
+    assert queue_depths() == {STATUS_PENDING: 2}
+
+
+def test_legacy_mentions_table_gains_queue_columns(db):
+    metadata.drop_all(db)
+    with db.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE mentions (id VARCHAR PRIMARY KEY, source VARCHAR NOT NULL, "
+                "payload JSON NOT NULL, status VARCHAR NOT NULL, "
+                "created_at TIMESTAMP NOT NULL, updated_at TIMESTAMP)"
+            )
+        )
+    _add_missing_columns(db)
+    columns = {column["name"] for column in inspect(db).get_columns("mentions")}
+    assert {"conversation_id", "attempts", "lease_owner", "lease_expires_at", "last_error"} <= columns
+
+
+def test_each_account_answers_its_own_mentions(db, monkeypatch):
+    # One post mentioning two of our accounts is queued once per account.
+    assert record_mention(_payload(1), source="poll", account="desk")
+    assert record_mention(_payload(1), source="poll", account="shop")
+    assert record_mention(_payload(2), source="poll", account="gone")
+    stop = threading.Event()
+    answered = []
+
+    def fake_process(client, mention, defer_throttled=False):
+        answered.append((client, mention.id))
+        if len(answered) == 2:
+            stop.set()
+        return True
+
+    monkeypatch.setattr(listener, "process_mention", fake_process)
+    listener.run_queue_worker({"desk": "desk-client", "shop": "shop-client"}, "w", stop, idle_seconds=0.01)
+    assert sorted(answered) == [("desk-client", 1), ("shop-client", 1)]
+    # A mention for an account this replica doesn't serve is left alone,
+    # without spending any of its attempts.
+    assert queue_depths() == {STATUS_DONE: 2, STATUS_PENDING: 1}
+    assert [row["attempts"] for row in claim_mentions("other", accounts=["gone"])] == [1]
+
+
+def test_claims_are_limited_to_the_accounts_served(db):
+    assert record_mention(_payload(1), source="poll")
+    assert record_mention(_payload(2), source="poll", account="desk")
+    assert record_mention(_payload(3), source="poll", account="shop")
+    assert [row["id"] for row in claim_mentions("a", limit=5, accounts=["", "desk"])] == ["1", "desk/2"]
+    assert claim_mentions("a", limit=5, accounts=["desk"]) == []
+    assert [row["id"] for row in claim_mentions("b", limit=5)] == ["shop/3"]
+
+
+def test_a_lease_is_renewed_while_its_mention_runs(db):
+    _enqueue(_payload(1))
+    (row,) = claim_mentions("a", visibility_timeout=0.3)
+    with hold_lease(row["id"], "a", visibility_timeout=0.3):
+        # Well past the unrenewed lease, nobody can take it over.
+        time.sleep(0.8)
+        assert claim_mentions("b") == []
+    assert complete_mention(row["id"], "a")
+
+
+def test_a_wedged_worker_stops_renewing_its_lease(db):
+    _enqueue(_payload(1))
+    (row,) = claim_mentions("a", visibility_timeout=0.2)
+    with hold_lease(row["id"], "a", visibility_timeout=0.2, max_seconds=0.3):
+        deadline = time.monotonic() + 5
+        while not claim_mentions("b") and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert not complete_mention(row["id"], "a")
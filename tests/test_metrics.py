@@ -0,0 +1,65 @@
+"""Prometheus text rendering and listener stage timing."""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import metrics
+from metrics import Counter, Histogram, Registry, collected
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("stage_seconds", "Stage time.", buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.5, 3):
+        histogram.observe(value, stage="handle", member="tradedesk")
+    lines = histogram.render()
+    assert lines[:2] == ["# HELP stage_seconds Stage time.", "# TYPE stage_seconds histogram"]
+    assert lines[2:] == [
+        'stage_seconds_bucket{member="tradedesk",stage="handle",le="0.1"} 1',
+        'stage_seconds_bucket{member="tradedesk",stage="handle",le="1"} 3',
+        'stage_seconds_bucket{member="tradedesk",stage="handle",le="+Inf"} 4',
+        'stage_seconds_sum{member="tradedesk",stage="handle"} 4.05',
+        'stage_seconds_count{member="tradedesk",stage="handle"} 4',
+    ]
+
+
+def test_counter_and_collected_values_and_label_escaping():
+    registry = Registry()
+    errors = registry.register(Counter("errors_total", "Errors."))
+    errors.inc(stage='say "hi"')
+    errors.inc(2, stage='say "hi"')
+    registry.register(metrics.Collected("depth", "Depth.", lambda: [({}, 7)]))
+    text = registry.render()
+    assert 'errors_total{stage="say \\"hi\\""} 3' in text
+    assert "# TYPE depth gauge\ndepth 7\n" in text
+
+
+def test_broken_collector_does_not_break_the_scrape():
+    registry = Registry()
+    registry.register(metrics.Collected("broken", "Broken.", lambda: 1 / 0))
+    registry.register(Counter("fine_total", "Fine."))
+    assert "# TYPE fine_total counter" in registry.render()
+
+
+def test_timed_records_latency_and_errors():
+    before = metrics.STAGE_SECONDS.count(stage="push_card", member="m")
+    errors = metrics.STAGE_ERRORS.value(stage="push_card", member="m")
+    with metrics.timed("push_card", "m"):
+        pass
+    with pytest.raises(RuntimeError):
+        with metrics.timed("push_card", "m"):
+            raise RuntimeError("timeline down")
+    assert metrics.STAGE_SECONDS.count(stage="push_card", member="m") == before + 2
+    assert metrics.STAGE_ERRORS.value(stage="push_card", member="m") == errors + 1
+
+
+def test_worker_app_serves_metrics(monkeypatch):
+    monkeypatch.setenv("RAILWAY_SERVICE_NAME", "")
+    import main
+
+    collected("test_only_gauge", "A gauge.", lambda: [({"kind": "test"}, 1)])
+    client = TestClient(main._build_worker_app("metrics-test"))
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'test_only_gauge{kind="test"} 1' in response.text
+    assert "# TYPE listener_stage_seconds histogram" in response.text
@@ -0,0 +1,58 @@
+"""Adaptive poll pacing: arrival-driven backoff under a rate-limit floor."""
+
+from types import SimpleNamespace
+
+from poll_scheduler import PollScheduler
+
+
+def _scheduler(now=1000.0):
+    return PollScheduler(min_interval=5, max_interval=60, idle_backoff=2, clock=lambda: now)
+
+
+def test_arrivals_poll_fast_and_idle_backs_off_to_ceiling():
+    scheduler = _scheduler()
+    scheduler.record_poll(3)
+    assert scheduler.next_delay() == 5
+    delays = []
+    for _ in range(6):
+        scheduler.record_poll(0)
+        delays.append(scheduler.next_delay())
+    assert delays == [10, 20, 40, 60, 60, 60]
+    scheduler.record_poll(1)
+    assert scheduler.next_delay() == 5
+
+
+def test_remaining_budget_is_spread_over_the_window():
+    scheduler = _scheduler(now=1000.0)
+    scheduler.record_poll(1)
+    # 11 requests left (10 spendable after headroom) over 300s -> one per 30s.
+    scheduler.observe_rate_limit({"x-rate-limit-remaining": "11", "x-rate-limit-reset": "1300"})
+    assert scheduler.next_delay() == 30
+
+
+def test_exhausted_budget_sleeps_to_the_reset():
+    scheduler = _scheduler(now=1000.0)
+    scheduler.record_poll(1)
+    scheduler.observe_rate_limit({"x-rate-limit-remaining": "0", "x-rate-limit-reset": "1200"})
+    assert scheduler.next_delay() == 201
+
+
+def test_expired_window_and_bad_headers_are_ignored():
+    scheduler = _scheduler(now=2000.0)
+    scheduler.record_poll(1)
+    scheduler.observe_rate_limit({"x-rate-limit-remaining": "0", "x-rate-limit-reset": "1200"})
+    assert scheduler.next_delay() == 5
+    scheduler.observe_rate_limit({"x-rate-limit-remaining": "soon"})
+    assert scheduler.next_delay() == 5
+
+
+def test_attach_reads_headers_only_from_the_mentions_route():
+    client = SimpleNamespace(session=SimpleNamespace(hooks={"response": []}))
+    scheduler = _scheduler(now=1000.0)
+    scheduler.attach(client)
+    hook = client.session.hooks["response"][0]
+    headers = {"x-rate-limit-remaining": "0", "x-rate-limit-reset": "1100"}
+    hook(SimpleNamespace(url="https://api.twitter.com/2/tweets", headers=headers))
+    assert scheduler.next_delay() == 5
+    hook(SimpleNamespace(url="https://api.twitter.com/2/users/1/mentions", headers=headers))
+    assert scheduler.next_delay() == 101
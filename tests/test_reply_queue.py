@@ -0,0 +1,191 @@
+"""Reply posting queue: token-bucket pacing, retries and the failure hook."""
+
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+import tweepy
+from sqlalchemy import func, select
+
+import reply_store
+from reply_queue import ReplyPoster, TokenBucket
+from storage_db import get_engine, metadata, pending_replies, reset_engine_for_tests
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    url = os.getenv("TEST_DATABASE_URL") or f"sqlite:///{tmp_path / 'xmcp.db'}"
+    monkeypatch.setenv("DATABASE_URL", url)
+    reset_engine_for_tests()
+    engine = get_engine()
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    yield engine
+    reset_engine_for_tests()
+
+
+def _persisted(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(pending_replies)).scalar()
+
+
+class _Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _error(cls, status, headers=None):
+    response = SimpleNamespace(
+        status_code=status,
+        reason="error",
+        headers=headers or {},
+        json=lambda: {"errors": [{"message": "nope"}]},
+    )
+    return cls(response)
+
+
+class _FakeClient:
+    def __init__(self, outcomes=()):
+        self.outcomes = list(outcomes)
+        self.posted = []
+
+    def create_tweet(self, text, in_reply_to_tweet_id):
+        outcome = self.outcomes.pop(0) if self.outcomes else None
+        if outcome is not None:
+            raise outcome
+        self.posted.append((in_reply_to_tweet_id, text))
+
+
+def test_bucket_bursts_then_paces():
+    clock = _Clock()
+    bucket = TokenBucket(rate=0.5, capacity=2, clock=clock)
+    assert bucket.take() == 0
+    assert bucket.take() == 0
+    assert bucket.take() == 2
+    clock.now += 2
+    assert bucket.take() == 0
+
+
+def test_bucket_honours_exhausted_x_window():
+    clock = _Clock()
+    bucket = TokenBucket(rate=10, capacity=5, clock=clock)
+    bucket.observe_rate_limit({"x-rate-limit-remaining": "0", "x-rate-limit-reset": "1060"})
+    assert bucket.take() == 61
+    clock.now = 1061
+    assert bucket.take() == 0
+    # Remaining posts cap the burst even when the bucket would allow more.
+    clock.now += 100
+    bucket.observe_rate_limit({"x-rate-limit-remaining": "1", "x-rate-limit-reset": "2000"})
+    assert bucket.take() == 0
+    assert bucket.take() > 0
+
+
+def test_bucket_attach_reads_only_post_responses():
+    client = SimpleNamespace(session=SimpleNamespace(hooks={"response": []}))
+    clock = _Clock()
+    bucket = TokenBucket(rate=1, capacity=3, clock=clock)
+    bucket.attach(client)
+    (hook,) = client.session.hooks["response"]
+    exhausted = {"x-rate-limit-remaining": "0", "x-rate-limit-reset": "1100"}
+    hook(SimpleNamespace(url="https://api.x.com/2/tweets/1", request=SimpleNamespace(method="GET"), headers=exhausted))
+    assert bucket.take() == 0
+    hook(SimpleNamespace(url="https://api.x.com/2/tweets", request=SimpleNamespace(method="POST"), headers=exhausted))
+    assert bucket.take() == 101
+
+
+def test_submit_returns_immediately_and_posts_in_order():
+    client = _FakeClient()
+    poster = ReplyPoster(client, TokenBucket(rate=1000, capacity=10)).start()
+    for mention_id in (1, 2, 3):
+        poster.submit(f"reply {mention_id}", mention_id)
+    assert poster.wait_idle(5)
+    assert client.posted == [(1, "reply 1"), (2, "reply 2"), (3, "reply 3")]
+    assert poster.stats() == {"queued": 0, "posted": 3, "failed": 0}
+    poster.stop()
+
+
+def test_transient_errors_retry_and_terminal_errors_call_the_hook():
+    client = _FakeClient([_error(tweepy.TwitterServerError, 503), None, _error(tweepy.Forbidden, 403)])
+    failures = []
+    poster = ReplyPoster(client, TokenBucket(rate=1000, capacity=10), backoff=0.01).start()
+    poster.submit("retried", 1, on_failure=failures.append)
+    assert poster.wait_idle(5)
+    poster.submit("duplicate", 2, on_failure=failures.append)
+    assert poster.wait_idle(5)
+    assert client.posted == [(1, "retried")]
+    assert [type(exc) for exc in failures] == [tweepy.Forbidden]
+    poster.stop()
+
+
+def test_retries_give_up_after_max_attempts():
+    client = _FakeClient([_error(tweepy.TwitterServerError, 500)] * 3)
+    failures = []
+    poster = ReplyPoster(client, TokenBucket(rate=1000, capacity=10), max_attempts=3, backoff=0.01).start()
+    poster.submit("never", 1, on_failure=failures.append)
+    assert poster.wait_idle(5)
+    assert len(failures) == 1 and client.posted == []
+    poster.stop()
+
+
+def test_rate_limited_reply_waits_for_reset_without_spending_attempts():
+    clock = _Clock()
+    posted = threading.Event()
+    limited = _error(tweepy.TooManyRequests, 429, {"x-rate-limit-reset": "1030"})
+    client = _FakeClient([limited])
+    bucket = TokenBucket(rate=1000, capacity=10, clock=clock)
+    poster = ReplyPoster(client, bucket, max_attempts=1, clock=clock)
+    poster.submit("later", 1, on_failure=lambda exc: posted.set())
+    reply = poster._next()
+    poster._post(reply)
+    # Rescheduled past the reset, not failed, despite max_attempts=1.
+    assert not posted.is_set()
+    ready_at, _seq, queued = poster._heap[0]
+    assert ready_at == 1031 and queued.attempts == 0
+    assert bucket.take() == 31
+
+
+def test_posted_and_abandoned_replies_are_no_longer_persisted(db):
+    client = _FakeClient([None, _error(tweepy.Forbidden, 403)])
+    poster = ReplyPoster(client, TokenBucket(rate=1000, capacity=10), account="desk").start()
+    poster.submit("posted", 1)
+    poster.submit("refused", 2, on_failure=lambda exc: None)
+    assert poster.wait_idle(5)
+    poster.stop()
+    assert client.posted == [(1, "posted")]
+    assert _persisted(db) == 0
+
+
+def test_replies_left_unposted_by_a_stopped_listener_are_posted_by_the_next(db, monkeypatch):
+    # A poster that never got to post: the process died with these queued.
+    monkeypatch.setattr(reply_store, "REPLY_LEASE_SECONDS", 0)
+    crashed = ReplyPoster(_FakeClient(), account="desk")
+    crashed.submit("first", 1, member="research")
+    crashed.submit("second", 2, member="research")
+    ReplyPoster(_FakeClient(), account="shop").submit("other account", 3)
+    assert _persisted(db) == 3
+
+    client = _FakeClient([None, _error(tweepy.Forbidden, 403)])
+    lost = []
+    poster = ReplyPoster(
+        client,
+        TokenBucket(rate=1000, capacity=10),
+        account="desk",
+        on_failure=lambda reply, exc: lost.append((reply.in_reply_to_tweet_id, reply.member)),
+    ).start()
+    try:
+        deadline = time.monotonic() + 5
+        while len(client.posted) + len(lost) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert poster.wait_idle(5)
+    finally:
+        poster.stop()
+    # Adopted replies have lost their own hooks; the poster's reports them.
+    assert client.posted == [("1", "first")]
+    assert lost == [("2", "research")]
+    # Only the other account's reply is still waiting for its own poster.
+    assert _persisted(db) == 1
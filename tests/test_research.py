@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+
+from agents import base
+from agents.base import MentionContext, stream_to_card
+from agents.team import research
+from agents.team.research import ResearchAgent
+
+
+class _Timeline:
+    """Applies appends like the server does, remembering each request."""
+
+    def __init__(self, fail_first=0):
+        self.text = ""
+        self.requests = []
+        self.fail_first = fail_first
+
+    def post(self, path, *, op, json):
+        self.requests.append((path, json))
+        if self.fail_first:
+            self.fail_first -= 1
+            raise base.requests.ConnectionError("timeline down")
+        assert json["offset"] == len(self.text)
+        self.text += json["text"]
+        return SimpleNamespace(raise_for_status=lambda: None)
+
+
+def _ticking(step):
+    now = [0.0]
+
+    def clock():
+        now[0] += step
+        return now[0]
+
+    return clock
+
+
+def test_stream_is_throttled_and_complete(monkeypatch):
+    timeline = _Timeline()
+    monkeypatch.setattr(base, "get_timeline_client", lambda: timeline)
+    chunks = [f"w{i} " for i in range(10)]
+    # Each clock read advances 0.25s, so updates are spaced a second apart.
+    text = stream_to_card({"id": "card"}, 1, iter(chunks), interval=1.0, clock=_ticking(0.25))
+    assert text == timeline.text == "".join(chunks)
+    assert 1 < len(timeline.requests) < len(chunks)
+    assert all(path == "/v1/timeline/items/card/blocks/1/append" for path, _ in timeline.requests)
+
+
+def test_failed_update_is_folded_into_the_next(monkeypatch):
+    timeline = _Timeline(fail_first=1)
+    monkeypatch.setattr(base, "get_timeline_client", lambda: timeline)
+    stream_to_card({"id": "card"}, 1, iter(["a", "b", "c"]), interval=0)
+    assert timeline.text == "abc"
+    assert [body for _, body in timeline.requests][1] == {"text": "ab", "offset": 0}
+
+
+def test_broken_stream_keeps_what_arrived(monkeypatch):
+    timeline = _Timeline()
+    monkeypatch.setattr(base, "get_timeline_client", lambda: timeline)
+
+    def chunks():
+        yield "partial"
+        raise RuntimeError("grok dropped")
+
+    try:
+        stream_to_card({"id": "card"}, 1, chunks(), interval=60)
+    except RuntimeError:
+        pass
+    assert timeline.text == "partial"
+
+
+def test_card_first_then_reply_from_the_finished_brief(monkeypatch):
+    streamed = []
+    monkeypatch.setattr(research, "grok_stream", lambda prompt: iter(["NVDA fell ", "on guidance."]))
+    monkeypatch.setattr(
+        research, "stream_to_card", lambda item, block, chunks: streamed.append(block) or "".join(chunks)
+    )
+    reply = ResearchAgent().handle_mention(MentionContext(text="@Research why is $NVDA down?", mention_id=7))
+    assert reply.text == ""
+    assert [block["label"] for block in reply.card["blocks"]] == ["Question", "Brief"]
+    assert reply.card["blocks"][research.BRIEF_BLOCK]["text"] == ""
+
+    assert reply.after_card({"id": "card"}) == "NVDA fell on guidance."
+    assert streamed == [research.BRIEF_BLOCK]
+
+
+def test_offline_without_grok(monkeypatch):
+    monkeypatch.setattr(research, "grok_stream", lambda prompt: None)
+    reply = ResearchAgent().handle_mention(MentionContext(text="@Research hi"))
+    assert reply.card is None and "offline" in reply.text
@@ -1,15 +1,19 @@
+from types import SimpleNamespace
+
+import requests
+
 from agents.base import MentionContext
 from agents.registry import build_team, find_member, get_team, route_mention
 from agents.router import find_target
 
 
 def test_route_to_tradedesk_by_handle():
-    member = route_mention(MentionContext(text="@MyXstack @Tradedesk $TSLA buy 100"))
+    (member,) = route_mention(MentionContext(text="@MyXstack @Tradedesk $TSLA buy 100"))
     assert member.profile.id == "tradedesk"
 
 
 def test_route_is_case_insensitive():
-    member = route_mention(MentionContext(text="hey @tradedesk sell $BTC"))
+    (member,) = route_mention(MentionContext(text="hey @tradedesk sell $BTC"))
     assert member.profile.id == "tradedesk"
 
 
@@ -20,12 +24,12 @@ def test_route_requires_word_boundary():
 
 
 def test_route_falls_back_to_general_agent():
-    member = route_mention(MentionContext(text="@MyXstack what's the weather?"))
+    (member,) = route_mention(MentionContext(text="@MyXstack what's the weather?"))
     assert member.profile.id == "x-agent"
 
 
 def test_route_to_bot():
-    member = route_mention(MentionContext(text="@TickerBot $NVDA"))
+    (member,) = route_mention(MentionContext(text="@TickerBot $NVDA"))
     assert member.profile.id == "tickerbot"
     assert member.profile.kind == "bot"
 
@@ -46,7 +50,31 @@ def test_multi_handle_routes_to_earliest_tag():
     assert member.profile.id == "tradedesk"
 
 
+def test_route_returns_every_tagged_member_in_tag_order():
+    members = route_mention(MentionContext(text="@Research @Tradedesk @research $NVDA buy 10"))
+    assert [m.profile.id for m in members] == ["research", "tradedesk"]
+
+
 def test_find_member():
     assert find_member("tradedesk").profile.name == "Trade Desk"
     assert find_member("nope") is None
     assert find_member(None) is None
+
+
+def test_registration_retries_a_timeline_server_that_is_still_booting(monkeypatch):
+    from agents import registry
+
+    calls = []
+
+    def post(path, op, json, attempts):
+        calls.append(json["id"])
+        response = requests.Response()
+        # Routes not mounted yet, then the database not ready, then up.
+        response.status_code = {1: 404, 2: 500}.get(len(calls), 200)
+        return response
+
+    monkeypatch.setattr(registry, "get_team", lambda: get_team()[:1])
+    monkeypatch.setattr(registry, "get_timeline_client", lambda: SimpleNamespace(post=post))
+    monkeypatch.setattr(registry.time, "sleep", lambda seconds: None)
+    registry.register_team()
+    assert calls == ["tradedesk"] * 3
@@ -487,3 +487,125 @@ def test_re_running_the_migration_does_not_move_created_at(db_url, tmp_path, mon
     first = timeline_store.get_item("a")["created_at"]
     migrate()
     assert timeline_store.get_item("a")["created_at"] == first
+
+
+def test_an_existing_messages_table_gains_the_inbox_index(db_url):
+    from sqlalchemy import inspect
+
+    from storage_db import _add_missing_indexes, a2a_messages, get_engine
+
+    engine = get_engine()
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX ix_a2a_messages_inbox_seq")
+    _add_missing_indexes(engine)
+    # Already there: a no-op, not an error.
+    _add_missing_indexes(engine)
+    names = {index["name"] for index in inspect(engine).get_indexes(a2a_messages.name)}
+    assert "ix_a2a_messages_inbox_seq" in names
+
+
+def test_inbox_cursor_reads_only_newer_messages(db_url):
+    for n in range(5):
+        a2a_store.add_message({"id": f"m{n}", "from": "ui", "to": "reader", "content": str(n)})
+    a2a_store.add_message({"id": "other", "from": "ui", "to": "someone-else"})
+
+    first = a2a_store.list_messages("reader", after="", limit=2)
+    assert [m["id"] for m in first] == ["m0", "m1"]
+    rest = a2a_store.list_messages("reader", after=first[-1]["cursor"])
+    assert [m["id"] for m in rest] == ["m2", "m3", "m4"]
+    assert a2a_store.list_messages("reader", after=rest[-1]["cursor"]) == []
+    # The unpaged read is unchanged: the whole inbox, newest first.
+    assert [m["id"] for m in a2a_store.list_messages("reader")][0] == "m4"
+
+    with pytest.raises(a2a_store.CursorError):
+        a2a_store.list_messages("reader", after="not-a-cursor")
+
+
+def test_inbox_cursor_follows_commit_order_not_timestamps(db_url, monkeypatch):
+    from datetime import datetime, timedelta, timezone
+
+    from storage_db import write_connection
+
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    stamps = iter([start + timedelta(seconds=60), start])
+    monkeypatch.setattr(a2a_store, "utc_now", lambda: next(stamps))
+
+    a2a_store.add_message({"id": "first", "from": "ui", "to": "reader"})
+    read = a2a_store.list_messages("reader", after="")
+    assert [m["id"] for m in read] == ["first"]
+    # Stamped a minute earlier, e.g. before a long lock wait, but committed
+    # after the reader moved past "first": still read.
+    with write_connection() as conn:
+        a2a_store.add_message({"id": "stamped-earlier", "from": "ui", "to": "reader"}, conn=conn)
+    late = a2a_store.list_messages("reader", after=read[-1]["cursor"])
+    assert [m["id"] for m in late] == ["stamped-earlier"]
+    assert a2a_store.list_messages("reader", after=late[-1]["cursor"]) == []
+    # A cursor is the sequence number alone, however busy the inbox gets.
+    assert late[-1]["cursor"].isdigit() and "seq" not in late[-1]
+
+
+def test_a_cursor_saved_before_messages_were_numbered_still_resumes(db_url, monkeypatch):
+    from datetime import datetime, timedelta, timezone
+
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    stamps = iter([start, start + timedelta(seconds=1), start + timedelta(seconds=2)])
+    monkeypatch.setattr(a2a_store, "utc_now", lambda: next(stamps))
+    for message_id in ("old", "handled", "new"):
+        a2a_store.add_message({"id": message_id, "from": "ui", "to": "reader"})
+    legacy = f"{(start + timedelta(seconds=1)).isoformat()}|handled"
+    # The cursor's own message is read once more rather than risk a skip.
+    assert [m["id"] for m in a2a_store.list_messages("reader", after=legacy)] == ["handled", "new"]
+
+
+def test_messages_written_before_the_sequence_are_numbered_on_startup(db_url):
+    from sqlalchemy import update
+
+    from storage_db import _number_messages, a2a_messages, get_engine
+
+    for message_id in ("a", "b"):
+        a2a_store.add_message({"id": message_id, "from": "ui", "to": "reader"})
+    engine = get_engine()
+    with engine.begin() as conn:
+        conn.execute(update(a2a_messages).values(seq=None))
+    assert a2a_store.list_messages("reader", after="") == []
+    _number_messages(engine)
+    _number_messages(engine)
+    messages = a2a_store.list_messages("reader", after="")
+    assert [m["id"] for m in messages] == ["a", "b"]
+    a2a_store.add_message({"id": "c", "from": "ui", "to": "reader"})
+    assert [m["id"] for m in a2a_store.list_messages("reader", after=messages[-1]["cursor"])] == ["c"]
+
+
+def test_inbox_waiters_wake_on_commit_and_never_on_rollback(db_url):
+    from inbox_wait import WAITERS
+    from storage_db import write_connection
+
+    seen = WAITERS.version("approver")
+    with write_connection() as conn:
+        a2a_store.add_message({"from": "ui", "to": "approver"}, conn=conn)
+        # Not yet: a woken reader would find nothing committed.
+        assert WAITERS.version("approver") == seen
+    assert WAITERS.version("approver") == seen + 1
+
+    with pytest.raises(RuntimeError):
+        with write_connection() as conn:
+            a2a_store.add_message({"from": "ui", "to": "approver"}, conn=conn)
+            raise RuntimeError("claim lost")
+    assert WAITERS.version("approver") == seen + 1
+    # The rolled-back callback did not linger on the pooled connection.
+    with write_connection() as conn:
+        pass
+    assert WAITERS.version("approver") == seen + 1
+
+
+def test_a_waiting_read_picks_up_another_process_write_by_polling(db_url, monkeypatch):
+    import inbox_wait
+
+    # A write from another process never touches this process's WAITERS;
+    # on SQLite the short poll finds it.
+    monkeypatch.setattr(inbox_wait, "WAIT_POLL_SECONDS", 0.05)
+    monkeypatch.setattr(a2a_store, "after_commit", lambda conn, callback: None)
+    if get_engine().dialect.name == "postgresql":
+        pytest.skip("Postgres wakes waiters through LISTEN/NOTIFY, not the short poll")
+    threading.Timer(0.2, lambda: a2a_store.add_message({"id": "late", "from": "ui", "to": "reader"})).start()
+    assert [m["id"] for m in a2a_store.wait_for_messages("reader", after="", timeout=5)] == ["late"]
@@ -0,0 +1,98 @@
+"""Thread context: batched root/parent lookup, cached, handed to members."""
+
+import asyncio
+
+import tweepy
+
+import listener
+import thread_context
+from agents.base import MentionContext, thread_prompt
+
+
+def _tweet(tweet_id, text, conversation_id=None, parent=None, author_id=7):
+    payload = {
+        "id": str(tweet_id),
+        "text": text,
+        "author_id": str(author_id),
+        "edit_history_tweet_ids": [str(tweet_id)],
+    }
+    if conversation_id:
+        payload["conversation_id"] = str(conversation_id)
+    if parent:
+        payload["referenced_tweets"] = [{"type": "replied_to", "id": str(parent)}]
+    return tweepy.Tweet(payload)
+
+
+class _Client:
+    def __init__(self, posts, fail=False):
+        self.posts = {post.id: post for post in posts}
+        self.lookups = []
+        self.fail = fail
+
+    def get_tweets(self, ids, tweet_fields):
+        self.lookups.append(list(ids))
+        if self.fail:
+            raise RuntimeError("429 Too Many Requests")
+        return tweepy.Response([self.posts[int(i)] for i in ids if int(i) in self.posts], None, None, {})
+
+
+def test_one_lookup_for_a_page_and_cached_after():
+    root = _tweet(10, "Is $TSLA a buy?", author_id=1)
+    parent = _tweet(11, "Depends on deliveries", conversation_id=10, parent=10, author_id=2)
+    mentions = [
+        _tweet(20, "@Research what do you think?", conversation_id=10, parent=11),
+        _tweet(21, "@Research same question", conversation_id=10, parent=10),
+    ]
+    client = _Client([root, parent])
+    thread_context.prefetch(client, mentions)
+    assert client.lookups == [["10", "11"]]
+
+    assert [post["text"] for post in thread_context.thread_for(mentions[0])] == [root.text, parent.text]
+    # The parent is the root: listed once.
+    assert [post["id"] for post in thread_context.thread_for(mentions[1])] == ["10"]
+
+    # Everything is cached now, including the mentions themselves.
+    reply = _tweet(22, "@Research and now?", conversation_id=10, parent=20)
+    thread_context.prefetch(client, [reply])
+    assert len(client.lookups) == 1
+    assert thread_context.thread_for(reply)[1]["text"] == "@Research what do you think?"
+
+
+def test_lookups_are_batched_by_one_hundred(monkeypatch):
+    monkeypatch.setattr(thread_context, "LOOKUP_BATCH", 2)
+    client = _Client([])
+    thread_context.prefetch(client, [_tweet(100 + i, "@bot hi", conversation_id=i + 1) for i in range(5)])
+    assert [len(ids) for ids in client.lookups] == [2, 2, 1]
+
+
+def test_failed_lookup_leaves_the_mention_without_context():
+    mention = _tweet(20, "@bot hi", conversation_id=10)
+    thread_context.prefetch(_Client([], fail=True), [mention])
+    assert thread_context.thread_for(mention) == []
+    assert listener.mention_context(mention).thread == []
+
+
+def test_standalone_post_needs_no_lookup():
+    client = _Client([])
+    thread_context.prefetch(client, [_tweet(20, "@bot hi", conversation_id=20)])
+    assert client.lookups == []
+
+
+def test_async_prefetch_fills_the_same_cache():
+    class _AsyncClient(_Client):
+        async def get_tweets(self, ids, tweet_fields):
+            return _Client.get_tweets(self, ids, tweet_fields)
+
+    mention = _tweet(20, "@bot hi", conversation_id=10)
+    asyncio.run(thread_context.prefetch_async(_AsyncClient([_tweet(10, "root")]), [mention]))
+    assert [post["text"] for post in thread_context.thread_for(mention)] == ["root"]
+
+
+def test_mention_context_carries_the_thread_into_the_prompt():
+    mention = _tweet(20, "@bot is it?", conversation_id=10)
+    thread_context.prefetch(_Client([_tweet(10, "The rocket launches Friday", author_id=3)]), [mention])
+    context = listener.mention_context(mention)
+    prompt = thread_prompt(context)
+    assert "[3] The rocket launches Friday" in prompt
+    assert prompt.endswith("The post you were mentioned in:\n")
+    assert thread_prompt(MentionContext(text="hi")) == ""
@@ -0,0 +1,177 @@
+"""Pooled timeline client: narrow retries, the retry budget, and counters."""
+
+import asyncio
+
+import httpx
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+import timeline_client
+from timeline_client import AsyncTimelineClient, RetryBudget, TimelineClient
+
+
+class _FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def close(self):
+        pass
+
+
+def _client(monkeypatch, outcomes, budget=None):
+    client = TimelineClient("http://timeline.test", {"Authorization": "Bearer t"}, budget=budget)
+    calls = []
+
+    def fake_request(method, url, **kwargs):
+        calls.append((method, url))
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return _FakeResponse(outcome)
+
+    monkeypatch.setattr(client.session, "request", fake_request)
+    monkeypatch.setattr(timeline_client.time, "sleep", lambda _s: None)
+    return client, calls
+
+
+def test_auth_header_is_applied_once_on_the_session():
+    client = TimelineClient("http://timeline.test/", {"Authorization": "Bearer t"})
+    assert client.session.headers["Authorization"] == "Bearer t"
+    assert client.base_url == "http://timeline.test"
+
+
+def test_proxy_unavailable_is_retried(monkeypatch):
+    client, calls = _client(monkeypatch, [503, 200])
+    response = client.get("/v1/x", op="probe")
+    assert response.status_code == 200
+    assert calls == [("GET", "http://timeline.test/v1/x")] * 2
+    stats = client.stats()["probe"]
+    assert stats["count"] == 1
+    assert stats["retries"] == 1
+    assert stats["errors"] == 0
+
+
+def test_connection_error_is_retried_then_raised(monkeypatch):
+    client, calls = _client(monkeypatch, [requests.ConnectionError(), requests.ConnectionError()])
+    with pytest.raises(requests.ConnectionError):
+        client.get("/v1/x", op="probe")
+    assert len(calls) == 2
+    assert client.stats()["probe"]["errors"] == 1
+
+
+def _refused():
+    reason = NewConnectionError(None, "Connection refused")
+    return requests.ConnectionError(MaxRetryError(None, "/v1/x", reason))
+
+
+def test_a_post_is_retried_only_when_it_never_left(monkeypatch):
+    client, calls = _client(monkeypatch, [_refused(), requests.ConnectTimeout(), 201])
+    assert client.post("/v1/x", op="probe", json={}, attempts=3).status_code == 201
+    assert len(calls) == 3
+
+    # Reset after the body went out, or a proxy that timed out waiting on
+    # the app: either may have created the card already.
+    client, calls = _client(monkeypatch, [requests.ConnectionError("Connection reset by peer")])
+    with pytest.raises(requests.ConnectionError):
+        client.post("/v1/x", op="probe", json={})
+    assert len(calls) == 1
+    client, calls = _client(monkeypatch, [504])
+    assert client.post("/v1/x", op="probe", json={}).status_code == 504
+    assert len(calls) == 1
+    client, calls = _client(monkeypatch, [502, 201])
+    assert client.post("/v1/x", op="probe", json={}).status_code == 201
+
+
+def test_client_errors_are_not_retried(monkeypatch):
+    client, calls = _client(monkeypatch, [404])
+    assert client.get("/v1/x", op="probe").status_code == 404
+    assert len(calls) == 1
+    assert client.stats()["probe"]["errors"] == 1
+
+
+def test_read_timeout_is_not_retried(monkeypatch):
+    # The server may already have acted on the request.
+    client, calls = _client(monkeypatch, [requests.ReadTimeout()])
+    with pytest.raises(requests.ReadTimeout):
+        client.post("/v1/x", op="probe", json={})
+    assert len(calls) == 1
+
+
+def test_exhausted_budget_stops_retries(monkeypatch):
+    client, calls = _client(monkeypatch, [503], budget=RetryBudget(ratio=0.0, reserve=0.0))
+    assert client.get("/v1/x", op="probe").status_code == 503
+    assert len(calls) == 1
+
+
+def test_budget_refills_from_traffic():
+    budget = RetryBudget(ratio=0.5, reserve=1.0)
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    budget.deposit()
+    assert budget.withdraw()
+
+
+def test_shared_client_is_reused_per_url_and_token(monkeypatch):
+    monkeypatch.setenv("TIMELINE_API_URL", "http://one.test")
+    monkeypatch.setenv("TIMELINE_API_TOKEN", "a")
+    first = timeline_client.get_timeline_client()
+    assert timeline_client.get_timeline_client() is first
+    monkeypatch.setenv("TIMELINE_API_TOKEN", "b")
+    assert timeline_client.get_timeline_client() is not first
+
+
+def test_pools_are_sized_to_their_callers(monkeypatch):
+    monkeypatch.setattr(timeline_client, "_CLIENTS", {})
+    monkeypatch.setattr(timeline_client, "POOL_SIZE", 16)
+    monkeypatch.setenv("TIMELINE_API_URL", "http://timeline.test")
+    existing = timeline_client.get_timeline_client()
+    timeline_client.size_timeline_pools(40)
+    assert existing.pool_size == 40
+    assert existing.session.get_adapter("http://timeline.test")._pool_maxsize == 40
+    assert TimelineClient("http://other.test").pool_size == 40
+
+    # An explicit TIMELINE_HTTP_POOL_SIZE is left alone.
+    monkeypatch.setattr(timeline_client, "_POOL_SIZE_SETTING", "8")
+    monkeypatch.setattr(timeline_client, "POOL_SIZE", 8)
+    timeline_client.size_timeline_pools(40)
+    assert TimelineClient("http://other.test").pool_size == 8
+
+
+def test_async_client_retries_and_counts(monkeypatch):
+    statuses = [503, 201]
+    seen = []
+
+    def respond(request):
+        seen.append(request.headers.get("Authorization"))
+        return httpx.Response(statuses.pop(0))
+
+    async def go():
+        client = AsyncTimelineClient(
+            "http://timeline.test", {"Authorization": "Bearer t"}, transport=httpx.MockTransport(respond)
+        )
+        response = await client.post("/v1/x", op="async_probe", json={}, backoff=0)
+        await client.aclose()
+        return client, response
+
+    client, response = asyncio.run(go())
+    assert response.status_code == 201
+    assert seen == ["Bearer t", "Bearer t"]
+    assert client.stats()["async_probe"]["retries"] == 1
+    assert timeline_client.timeline_stats()["async_probe"]["count"] >= 1
+
+
+def test_async_post_is_not_retried_after_a_gateway_timeout():
+    statuses = [504, 201]
+
+    transport = httpx.MockTransport(lambda request: httpx.Response(statuses.pop(0)))
+
+    async def go():
+        client = AsyncTimelineClient("http://timeline.test", {}, transport=transport)
+        response = await client.post("/v1/x", op="async_probe", json={}, backoff=0)
+        await client.aclose()
+        return response
+
+    assert asyncio.run(go()).status_code == 504
+    assert statuses == [201]
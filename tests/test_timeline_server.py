@@ -6,6 +6,8 @@ nothing leaks between tests or into a developer's real `~/.xmcp/xmcp.db`.
 
 import importlib
 import os
+import threading
+import time
 
 import pytest
 from fastapi.testclient import TestClient
@@ -91,6 +93,49 @@ def test_unknown_block_type_is_rejected(client):
     assert response.status_code == 422
 
 
+# --- streamed blocks -------------------------------------------------------
+
+
+def _append(client, item_id, text, offset, index=1):
+    return client.post(
+        f"/v1/timeline/items/{item_id}/blocks/{index}/append",
+        json={"text": text, "offset": offset},
+    )
+
+
+def test_text_streams_into_a_block_and_the_body(client):
+    item = _create(
+        client,
+        body="",
+        blocks=[{"type": "text", "label": "Question", "text": "why?"}, {"type": "text", "label": "Brief", "text": ""}],
+    )
+    assert _append(client, item["id"], "Because ", 0).json() == {"id": item["id"], "block": 1, "length": 8}
+    assert _append(client, item["id"], "reasons.", 8).json()["length"] == 16
+
+    card = client.get(f"/v1/timeline/items/{item['id']}").json()
+    assert card["blocks"][1]["text"] == "Because reasons."
+    assert card["body"].endswith("Brief:\nBecause reasons.")
+
+
+def test_a_repeated_append_applies_once(client):
+    item = _create(client, blocks=[{"type": "text", "text": ""}, {"type": "text", "text": ""}])
+    assert _append(client, item["id"], "abc", 0).status_code == 200
+    # A retry of the same request after it landed.
+    assert _append(client, item["id"], "abc", 0).json()["length"] == 3
+    assert client.get(f"/v1/timeline/items/{item['id']}").json()["blocks"][1]["text"] == "abc"
+
+
+def test_append_at_the_wrong_offset_or_block_is_refused(client):
+    item = _create(
+        client,
+        blocks=[{"type": "facts", "facts": [{"key": "a", "value": "b"}]}, {"type": "text", "text": "abc"}],
+    )
+    assert _append(client, item["id"], "x", 1).status_code == 409
+    assert _append(client, item["id"], "x", 0, index=0).status_code == 409
+    assert _append(client, item["id"], "x", 0, index=5).status_code == 409
+    assert _append(client, "missing", "x", 0).status_code == 404
+
+
 # --- action resolution -----------------------------------------------------
 
 
@@ -134,6 +179,45 @@ def test_action_id_on_a_missing_card_is_404(client):
     assert response.status_code == 404
 
 
+def test_inbox_reads_resume_from_a_cursor(client):
+    for n in range(3):
+        client.post("/v1/a2a/messages", json={"from": "ui", "to": "reader", "content": str(n)})
+
+    page = client.get("/v1/a2a/agents/reader/messages", params={"after": "", "limit": 2}).json()
+    assert [m["content"] for m in page["messages"]] == ["0", "1"]
+    # Each message carries the cursor past it; the page's is the last one's.
+    assert page["next_cursor"] == page["messages"][-1]["cursor"] != page["messages"][0]["cursor"]
+    page = client.get("/v1/a2a/agents/reader/messages", params={"after": page["next_cursor"]}).json()
+    assert [m["content"] for m in page["messages"]] == ["2"]
+    # Nothing new: the cursor stays put.
+    empty = client.get("/v1/a2a/agents/reader/messages", params={"after": page["next_cursor"]}).json()
+    assert empty["messages"] == [] and empty["next_cursor"] == page["next_cursor"]
+
+    assert client.get("/v1/a2a/agents/reader/messages", params={"after": "junk"}).status_code == 400
+    assert client.get("/v1/a2a/agents/reader/messages", params={"limit": 0}).status_code == 422
+    assert "next_cursor" not in client.get("/v1/a2a/agents/reader/messages").json()
+
+
+def test_a_long_poll_returns_as_soon_as_a_message_lands(client):
+    cursor = client.get("/v1/a2a/agents/waiter/messages", params={"after": ""}).json()["next_cursor"]
+    timer = threading.Timer(
+        0.2, lambda: client.post("/v1/a2a/messages", json={"from": "ui", "to": "waiter", "content": "go"})
+    )
+    started = time.monotonic()
+    timer.start()
+    page = client.get("/v1/a2a/agents/waiter/messages", params={"after": cursor, "wait": 10}).json()
+    # Woken by the commit, not by the timeout (or a one-second poll).
+    assert time.monotonic() - started < 0.9
+    assert [m["content"] for m in page["messages"]] == ["go"]
+    assert page["next_cursor"] != cursor
+
+    started = time.monotonic()
+    params = {"after": page["next_cursor"], "wait": 0.3}
+    empty = client.get("/v1/a2a/agents/waiter/messages", params=params)
+    assert empty.json()["messages"] == [] and time.monotonic() - started >= 0.3
+    assert client.get("/v1/a2a/agents/waiter/messages", params={"wait": 1}).status_code == 400
+
+
 def _dispatched_actions(client):
     messages = client.get("/v1/a2a/agents/mcp-orchestrator/messages").json()["messages"]
     return [m["metadata"].get("action") for m in messages if m["type"] == "timeline_action"]
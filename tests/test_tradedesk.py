@@ -1,5 +1,11 @@
+import threading
+
+import pytest
+
 from agents.base import MentionContext
 from agents.broker import PaperBroker
+from agents.cache import TTLCache
+from agents.team import tradedesk
 from agents.team.tradedesk import TradeDeskAgent, parse_trade_command
 
 
@@ -62,6 +68,109 @@ def test_unparseable_mention_returns_usage(monkeypatch):
     assert "$TICKER" in reply.text
 
 
+def test_card_is_not_held_for_market_context(monkeypatch):
+    monkeypatch.setenv("TRADEDESK_USE_GROK", "1")
+    prompts, appended = [], []
+    monkeypatch.setattr(tradedesk, "grok_chat", lambda prompt: prompts.append(prompt) or "Up 2% today.")
+    monkeypatch.setattr(tradedesk, "append_card_blocks", lambda item, blocks: appended.append((item["id"], blocks)))
+    agent = TradeDeskAgent(broker=PaperBroker("/dev/null"))
+
+    reply = agent.handle_mention(MentionContext(text="$TSLA buy 10"))
+    # The proposal is ready before Grok is asked anything.
+    assert prompts == []
+    assert [block["label"] for block in reply.card["blocks"]][-1] != "Market context (Grok)"
+
+    reply.after_card({"id": "card-1", **reply.card})
+    assert len(prompts) == 1
+    assert appended == [("card-1", [tradedesk.context_block("Up 2% today.")])]
+
+
+def test_cached_market_context_goes_on_the_card_directly(monkeypatch):
+    monkeypatch.setenv("TRADEDESK_USE_GROK", "1")
+    prompts = []
+    monkeypatch.setattr(tradedesk, "grok_chat", lambda prompt: prompts.append(prompt) or "Up 2% today.")
+    monkeypatch.setattr(tradedesk, "append_card_blocks", lambda item, blocks: True)
+    agent = TradeDeskAgent(broker=PaperBroker("/dev/null"))
+    agent.handle_mention(MentionContext(text="$TSLA buy 10")).after_card({"id": "card-1"})
+
+    reply = agent.handle_mention(MentionContext(text="buy $tsla 5"))
+    assert reply.card["blocks"][-1] == tradedesk.context_block("Up 2% today.")
+    assert reply.after_card is None
+    # A different side is a different context.
+    assert agent.handle_mention(MentionContext(text="$TSLA sell 1")).after_card is not None
+    assert len(prompts) == 1
+
+
+def test_no_follow_up_without_grok(monkeypatch):
+    monkeypatch.setenv("TRADEDESK_USE_GROK", "0")
+    agent = TradeDeskAgent(broker=PaperBroker("/dev/null"))
+    assert agent.handle_mention(MentionContext(text="$TSLA buy 10")).after_card is None
+
+
+def test_failed_market_context_is_not_cached(monkeypatch):
+    answers = iter(["", "Flat."])
+    monkeypatch.setattr(tradedesk, "grok_chat", lambda prompt: next(answers))
+    agent = TradeDeskAgent(broker=PaperBroker("/dev/null"))
+    assert agent.market_context("TSLA", "buy") == ""
+    assert agent.market_context("TSLA", "buy") == "Flat."
+
+
+def test_cache_expires_after_ttl():
+    now = [0.0]
+    cache = TTLCache("test_ttl", 60, clock=lambda: now[0])
+    calls = []
+    compute = lambda: calls.append(1) or len(calls)
+    assert cache.get_or_compute("k", compute) == 1
+    now[0] = 59
+    assert cache.get_or_compute("k", compute) == 1
+    now[0] = 61
+    assert cache.get_or_compute("k", compute) == 2
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TTLCache("test_lru", 60, max_entries=2)
+    cache.get_or_compute("a", lambda: "A")
+    cache.get_or_compute("b", lambda: "B")
+    cache.get_or_compute("a", lambda: "A2")
+    cache.get_or_compute("c", lambda: "C")
+    assert cache.get_or_compute("a", lambda: "A3") == "A"
+    assert cache.get_or_compute("b", lambda: "B2") == "B2"
+
+
+def test_concurrent_misses_share_one_call():
+    cache = TTLCache("test_single_flight", 60)
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return "context"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", slow))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while cache.stats()["coalesced"] < 4:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ["context"] * 5
+    assert len(calls) == 1
+
+
+def test_errors_propagate_and_are_not_cached():
+    cache = TTLCache("test_errors", 60)
+
+    def boom():
+        raise RuntimeError("grok down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("k", boom)
+    assert cache.get_or_compute("k", lambda: "ok") == "ok"
+
+
 def test_approve_executes_paper_trade(tmp_path):
     broker = PaperBroker(str(tmp_path / "trades.json"))
     agent = TradeDeskAgent(broker=broker)
@@ -0,0 +1,110 @@
+"""Account Activity webhook: CRC, signatures, persistence, and hand-off."""
+
+import json
+import os
+import queue
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import mention_store
+import webhook
+from mention_sources import BatchResult, WebhookSource
+from storage_db import get_engine, metadata, reset_engine_for_tests
+
+SECRET = "consumer-secret"
+BOT_ID = "1000"
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    url = os.getenv("TEST_DATABASE_URL") or f"sqlite:///{tmp_path / 'xmcp.db'}"
+    monkeypatch.setenv("DATABASE_URL", url)
+    monkeypatch.setenv("X_API_SECRET", SECRET)
+    reset_engine_for_tests()
+    engine = get_engine()
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    monkeypatch.setattr(webhook, "INBOX", queue.Queue())
+
+    app = FastAPI()
+    app.include_router(webhook.router)
+    yield TestClient(app)
+    reset_engine_for_tests()
+
+
+def _event(tweet_id, author_id="42", mentions=(BOT_ID,)):
+    return {
+        "id_str": str(tweet_id),
+        "text": f"@bot question {tweet_id}",
+        "created_at": "Wed Oct 10 20:19:24 +0000 2018",
+        "user": {"id_str": author_id},
+        "entities": {"user_mentions": [{"id_str": m} for m in mentions]},
+    }
+
+
+def _deliver(client, events, secret=SECRET):
+    body = json.dumps({"for_user_id": BOT_ID, "tweet_create_events": events}).encode()
+    return client.post(
+        webhook.WEBHOOK_PATH,
+        content=body,
+        headers={webhook.SIGNATURE_HEADER: webhook.sign(secret, body)},
+    )
+
+
+def test_crc_challenge_is_answered_with_the_keyed_hmac(client):
+    response = client.get(webhook.WEBHOOK_PATH, params={"crc_token": "challenge"})
+    assert response.status_code == 200
+    assert response.json() == {"response_token": webhook.sign(SECRET, b"challenge")}
+
+
+def test_crc_refuses_without_a_secret(client, monkeypatch):
+    monkeypatch.setenv("X_API_SECRET", "")
+    response = client.get(webhook.WEBHOOK_PATH, params={"crc_token": "challenge"})
+    assert response.status_code == 503
+
+
+def test_unsigned_and_missigned_deliveries_are_rejected(client):
+    assert client.post(webhook.WEBHOOK_PATH, json={"tweet_create_events": []}).status_code == 401
+    assert _deliver(client, [_event(1)], secret="wrong").status_code == 401
+    assert mention_store.list_pending() == []
+
+
+def test_mentions_are_persisted_and_queued_once(client):
+    response = _deliver(client, [_event(1), _event(2)])
+    assert response.json() == {"ok": True, "accepted": 2}
+    # X redelivers at least once; the second copy must be a no-op.
+    assert _deliver(client, [_event(1)]).json()["accepted"] == 0
+
+    pending = mention_store.list_pending()
+    assert [row["id"] for row in pending] == ["1", "2"]
+    assert pending[0]["payload"]["created_at"] == "2018-10-10T20:19:24.000Z"
+    assert webhook.INBOX.qsize() == 2
+
+
+def test_own_posts_and_non_mentions_are_ignored(client):
+    events = [_event(1, author_id=BOT_ID), _event(2, mentions=("999",))]
+    assert _deliver(client, events).json()["accepted"] == 0
+
+
+def test_source_hands_off_and_replays_pending(client):
+    _deliver(client, [_event(1)])
+    handled = []
+    stop = threading.Event()
+    outcomes = [False, True]
+
+    def handle(batch):
+        handled.append([m.id for m in batch])
+        done = outcomes.pop(0)
+        if not outcomes:
+            stop.set()
+        return BatchResult(done, len(batch), frozenset(m.id for m in batch) if done else frozenset())
+
+    source = WebhookSource(webhook.INBOX, retry_seconds=0.05)
+    source.run(lambda: ([], False), handle, stop)
+
+    # The failed first attempt stays pending and is replayed from the store.
+    assert handled == [[1], [1]]
+    assert mention_store.list_pending() == []
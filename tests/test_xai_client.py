@@ -0,0 +1,85 @@
+"""Warm xAI client cache: channel reuse and reconnect-on-failure."""
+
+from types import SimpleNamespace
+
+import grpc
+import pytest
+import xai_sdk
+
+import xai_client
+
+
+class _Unavailable(grpc.RpcError):
+    def code(self):
+        return grpc.StatusCode.UNAVAILABLE
+
+
+class _FakeChat:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def append(self, _message):
+        pass
+
+    def stream(self):
+        if self.owner.fail_next:
+            self.owner.fail_next -= 1
+            raise _Unavailable()
+        for part in ("hello ", "world"):
+            yield None, SimpleNamespace(content=part)
+
+
+class _FakeClient:
+    instances = []
+    fail_next = 0
+
+    def __init__(self, api_key, timeout=None):
+        self.closed = False
+        self.chat = SimpleNamespace(create=lambda **_kw: _FakeChat(_FakeClient))
+        _FakeClient.instances.append(self)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_sdk(monkeypatch):
+    _FakeClient.instances = []
+    _FakeClient.fail_next = 0
+    monkeypatch.setattr(xai_sdk, "Client", _FakeClient)
+    monkeypatch.setenv("XAI_API_KEY", "key")
+    xai_client.close_all()
+    yield _FakeClient
+    xai_client.close_all()
+
+
+def test_no_api_key_means_no_client(monkeypatch):
+    monkeypatch.setenv("XAI_API_KEY", " ")
+    assert xai_client.get_grok_client() is None
+
+
+def test_channel_is_reused_across_calls(fake_sdk):
+    client = xai_client.get_grok_client()
+    assert client.chat("q1") == "hello world"
+    assert xai_client.get_grok_client().chat("q2") == "hello world"
+    assert xai_client.get_grok_client() is client
+    assert len(fake_sdk.instances) == 1
+
+
+def test_cache_is_keyed_by_model_and_mcp_server(fake_sdk):
+    a = xai_client.get_grok_client(model="m1")
+    assert xai_client.get_grok_client(model="m2") is not a
+    assert xai_client.get_grok_client(model="m1", server_url="http://other/mcp") is not a
+
+
+def test_unavailable_channel_is_replaced_and_retried(fake_sdk):
+    fake_sdk.fail_next = 1
+    assert xai_client.get_grok_client().chat("q") == "hello world"
+    assert len(fake_sdk.instances) == 2
+    assert fake_sdk.instances[0].closed
+
+
+def test_persistent_failure_surfaces(fake_sdk):
+    fake_sdk.fail_next = 2
+    with pytest.raises(grpc.RpcError):
+        xai_client.get_grok_client().chat("q")
@@ -0,0 +1,99 @@
+"""Conversation context for mentions: the thread's root and parent posts.
+
+A mention is usually a reply, and the question only makes sense with the
+post it answers. Before a batch of mentions is processed, `prefetch` looks
+up the conversation root and the replied-to parent of every mention with
+one `get_tweets(ids=[...])` call per 100 ids, and `thread_for` then hands
+them to `MentionContext.thread` -- members see the thread without a Grok
+tool-call round trip per mention to fetch it.
+
+Posts are kept in an LRU (THREAD_CACHE_SIZE posts, for THREAD_CACHE_TTL_SECONDS)
+keyed by tweet id, because threads get mentioned repeatedly; mentions are
+cached as they pass, since one mention is often the next one's parent. A
+failed lookup only costs the context -- the mention is processed without it.
+"""
+
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from agents.cache import TTLCache
+
+THREAD_CACHE_SIZE = max(1, int(os.getenv("THREAD_CACHE_SIZE", "5000")))
+THREAD_CACHE_TTL_SECONDS = float(os.getenv("THREAD_CACHE_TTL_SECONDS", "3600"))
+# "0" skips the lookup; members then see only the mention.
+THREAD_CONTEXT_ENABLED = os.getenv("THREAD_CONTEXT_ENABLED", "1").strip() != "0"
+# get_tweets takes at most 100 ids per call.
+LOOKUP_BATCH = 100
+POST_FIELDS = ["author_id", "conversation_id", "created_at", "text"]
+
+_POSTS = TTLCache("thread_posts", THREAD_CACHE_TTL_SECONDS, max_entries=THREAD_CACHE_SIZE)
+
+
+def _post(tweet: Any) -> Dict[str, Any]:
+    return {
+        "id": str(tweet.id),
+        "author_id": str(tweet.author_id) if getattr(tweet, "author_id", None) else None,
+        "text": tweet.text,
+    }
+
+
+def context_ids(mention: Any) -> Tuple[Optional[str], Optional[str]]:
+    """(conversation root id, replied-to parent id) of a mention; either is
+    None when it is the mention itself or unknown."""
+    own = str(mention.id)
+    root = getattr(mention, "conversation_id", None)
+    root = str(root) if root and str(root) != own else None
+    parent = None
+    for reference in getattr(mention, "referenced_tweets", None) or []:
+        kind = reference["type"] if isinstance(reference, dict) else reference.type
+        if kind == "replied_to":
+            parent = str(reference["id"] if isinstance(reference, dict) else reference.id)
+    return root, (parent if parent != root else None)
+
+
+def remember(tweets: Iterable[Any]) -> None:
+    for tweet in tweets:
+        _POSTS.put(str(tweet.id), _post(tweet))
+
+
+def missing_ids(mentions: Iterable[Any]) -> List[str]:
+    """Context ids of `mentions` not in the cache, in first-seen order."""
+    mentions = list(mentions)
+    remember(mentions)
+    wanted: Dict[str, None] = {}
+    for mention in mentions:
+        for post_id in context_ids(mention):
+            if post_id and post_id not in wanted and _POSTS.peek(post_id) is None:
+                wanted[post_id] = None
+    return list(wanted)
+
+
+def _batches(ids: List[str]) -> List[List[str]]:
+    return [ids[i : i + LOOKUP_BATCH] for i in range(0, len(ids), LOOKUP_BATCH)]
+
+
+def prefetch(client: Any, mentions: Iterable[Any]) -> None:
+    """Look up and cache the thread context of a batch of mentions."""
+    if not THREAD_CONTEXT_ENABLED:
+        return
+    try:
+        for ids in _batches(missing_ids(mentions)):
+            remember(client.get_tweets(ids=ids, tweet_fields=POST_FIELDS).data or [])
+    except Exception as exc:
+        print(f"Could not fetch thread context: {exc}", flush=True)
+
+
+async def prefetch_async(client: Any, mentions: Iterable[Any]) -> None:
+    """`prefetch` over tweepy's AsyncClient."""
+    if not THREAD_CONTEXT_ENABLED:
+        return
+    try:
+        for ids in _batches(missing_ids(mentions)):
+            remember((await client.get_tweets(ids=ids, tweet_fields=POST_FIELDS)).data or [])
+    except Exception as exc:
+        print(f"Could not fetch thread context: {exc}", flush=True)
+
+
+def thread_for(mention: Any) -> List[Dict[str, Any]]:
+    """The cached root and parent posts of a mention, oldest first."""
+    return [post for post in (_POSTS.peek(post_id) for post_id in context_ids(mention) if post_id) if post]
@@ -0,0 +1,352 @@
+"""Shared HTTP client for the timeline / A2A API.
+
+The listener, the dispatcher and the team members all talk to the timeline
+server. Calling `requests.post` directly opens a fresh TCP (and, behind a TLS
+proxy, TLS) connection per call, which is a measurable share of per-mention
+latency. Every caller goes through one pooled `requests.Session` per
+(base URL, token) instead, with the auth header applied once.
+
+Retries are deliberately narrow, and every retry spends from a budget that
+refills as a fraction of ordinary traffic. A timeline server that is down
+therefore sees at most a small multiple of normal load, not a retry storm
+from every worker at once.
+
+What is retried depends on whether sending the request twice is harmless.
+GETs are retried on any connection error and on a proxy's 502/503/504. A
+POST or PATCH (a card push, an A2A message, an action claim) may already
+have been acted on when a connection drops after the body went out, or when
+a proxy gives up waiting (504). Retrying it could create a duplicate
+approval card. So those are retried only when the request provably never
+left: the connection was refused or timed out while connecting, or the
+proxy had no upstream to hand it to (502/503).
+"""
+
+import asyncio
+import os
+import threading
+import time
+import weakref
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+DEFAULT_TIMEOUT_SECONDS = float(os.getenv("TIMELINE_HTTP_TIMEOUT_SECONDS", "10"))
+# Keep-alive connections per pool. Unset, a process sizes its pools to the
+# threads (or requests in flight) that call them, with size_timeline_pools;
+# 16 until it does.
+_POOL_SIZE_SETTING = os.getenv("TIMELINE_HTTP_POOL_SIZE", "").strip()
+POOL_SIZE = int(_POOL_SIZE_SETTING) if _POOL_SIZE_SETTING else 16
+# Each request deposits this fraction of a retry into the budget.
+RETRY_BUDGET_RATIO = float(os.getenv("TIMELINE_RETRY_BUDGET_RATIO", "0.2"))
+# Retries available up front (and the budget's ceiling), so a cold process
+# can still ride out the timeline server booting.
+RETRY_BUDGET_RESERVE = float(os.getenv("TIMELINE_RETRY_BUDGET_RESERVE", "10"))
+
+_RETRY_STATUSES = {502, 503, 504}
+# A 504 means the proxy did forward the request; only safe methods repeat it.
+_UNSENT_STATUSES = {502, 503}
+_SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def _retry_statuses(method: str) -> set:
+    return _RETRY_STATUSES if method.upper() in _SAFE_METHODS else _UNSENT_STATUSES
+
+
+def _never_sent(exc: requests.ConnectionError) -> bool:
+    """Whether the request failed before a connection existed to send it on
+    (refused, unresolvable, or timed out connecting)."""
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    reason = getattr(exc.args[0], "reason", None) if exc.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def timeline_headers() -> Dict[str, str]:
+    """Auth header for internal calls to the timeline/A2A API.
+
+    Empty when TIMELINE_API_TOKEN is unset, which keeps local development
+    working against an unauthenticated server."""
+    token = os.getenv("TIMELINE_API_TOKEN", "").strip()
+    return {"Authorization": f"Bearer {token}"} if token else {}
+
+
+def timeline_url() -> str:
+    return os.getenv("TIMELINE_API_URL", "http://127.0.0.1:8080").rstrip("/")
+
+
+class RetryBudget:
+    """Token bucket that caps retries at a fraction of request volume."""
+
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, reserve: float = RETRY_BUDGET_RESERVE):
+        self.ratio = ratio
+        self.reserve = reserve
+        self._balance = reserve
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._balance = min(self.reserve, self._balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+
+class _CallStats:
+    def __init__(self) -> None:
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._stats_lock = threading.Lock()
+
+    def _record(self, op: str, elapsed: float, *, error: bool, retries: int) -> None:
+        with self._stats_lock:
+            entry = self._stats.setdefault(
+                op,
+                {"count": 0, "errors": 0, "retries": 0, "total_seconds": 0.0, "max_seconds": 0.0},
+            )
+            entry["count"] += 1
+            entry["errors"] += int(error)
+            entry["retries"] += retries
+            entry["total_seconds"] += elapsed
+            entry["max_seconds"] = max(entry["max_seconds"], elapsed)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-op call counts, errors, retries and latency totals."""
+        with self._stats_lock:
+            return {op: dict(entry) for op, entry in self._stats.items()}
+
+
+class TimelineClient(_CallStats):
+    """Keep-alive connection pool to one timeline server.
+
+    `op` names the call site ("push_card", "get_messages", ...) and keys the
+    latency counters returned by `stats()`.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        headers: Optional[Dict[str, str]] = None,
+        *,
+        pool_size: Optional[int] = None,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS,
+        budget: Optional[RetryBudget] = None,
+    ):
+        super().__init__()
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.budget = budget or RetryBudget()
+        self.session = requests.Session()
+        self.resize(POOL_SIZE if pool_size is None else pool_size)
+        self.session.headers.update(headers or {})
+
+    def resize(self, pool_size: int) -> None:
+        """Keep up to `pool_size` idle connections. It should be at least the
+        number of threads calling concurrently, or extra connections are
+        opened and dropped on every burst."""
+        self.pool_size = pool_size
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        op: str,
+        attempts: int = 2,
+        backoff: float = 0.5,
+        **kwargs: Any,
+    ) -> requests.Response:
+        """Send one request, retrying transient failures within the budget.
+
+        Like `requests`, a 4xx/5xx response is returned rather than raised
+        once retries are exhausted; callers decide whether that is fatal.
+        Transport errors propagate as `requests.RequestException`.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        self.budget.deposit()
+        safe = method.upper() in _SAFE_METHODS
+        statuses = _retry_statuses(method)
+        started = time.monotonic()
+        retries = 0
+        try:
+            for attempt in range(max(1, attempts)):
+                last = attempt >= attempts - 1
+                try:
+                    response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+                except requests.ConnectionError as exc:
+                    # A read timeout is not a ConnectionError: the server may
+                    # have acted on the request, so it is never retried here.
+                    # Nor is a reset after an unsafe request was sent.
+                    if last or not (safe or _never_sent(exc)) or not self.budget.withdraw():
+                        raise
+                else:
+                    if response.status_code not in statuses or last or not self.budget.withdraw():
+                        self._record(
+                            op,
+                            time.monotonic() - started,
+                            error=response.status_code >= 400,
+                            retries=retries,
+                        )
+                        return response
+                    response.close()
+                retries += 1
+                time.sleep(backoff * 2**attempt)
+        except requests.RequestException:
+            self._record(op, time.monotonic() - started, error=True, retries=retries)
+            raise
+        raise AssertionError("unreachable")  # pragma: no cover
+
+    def get(self, path: str, *, op: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", path, op=op, **kwargs)
+
+    def post(self, path: str, *, op: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", path, op=op, **kwargs)
+
+    def patch(self, path: str, *, op: str, **kwargs: Any) -> requests.Response:
+        return self.request("PATCH", path, op=op, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class AsyncTimelineClient(_CallStats):
+    """`TimelineClient` for the asyncio listener, on `httpx.AsyncClient`.
+
+    Same retry policy and counters. An httpx client belongs to the event
+    loop that first uses it, so the async listener makes its own (see
+    `async_listener.main`) rather than sharing a process-wide one; its
+    counters still show up in `timeline_stats()`.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+        *,
+        pool_size: Optional[int] = None,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS,
+        budget: Optional[RetryBudget] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        super().__init__()
+        self.base_url = (base_url or timeline_url()).rstrip("/")
+        self.budget = budget or RetryBudget()
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=timeline_headers() if headers is None else headers,
+            timeout=timeout,
+            limits=httpx.Limits(max_keepalive_connections=POOL_SIZE if pool_size is None else pool_size),
+            transport=transport,
+        )
+        _ASYNC_CLIENTS.add(self)
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        op: str,
+        attempts: int = 2,
+        backoff: float = 0.5,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        """See `TimelineClient.request`; transport errors propagate as
+        `httpx.HTTPError`."""
+        self.budget.deposit()
+        statuses = _retry_statuses(method)
+        started = time.monotonic()
+        retries = 0
+        try:
+            for attempt in range(max(1, attempts)):
+                last = attempt >= attempts - 1
+                try:
+                    response = await self.client.request(method, path, **kwargs)
+                except (httpx.ConnectError, httpx.ConnectTimeout):
+                    # Both fail before the request is written, so any method
+                    # may repeat them; a reset mid-request is a ReadError.
+                    if last or not self.budget.withdraw():
+                        raise
+                else:
+                    if response.status_code not in statuses or last or not self.budget.withdraw():
+                        self._record(
+                            op,
+                            time.monotonic() - started,
+                            error=response.status_code >= 400,
+                            retries=retries,
+                        )
+                        return response
+                    await response.aclose()
+                retries += 1
+                await asyncio.sleep(backoff * 2**attempt)
+        except httpx.HTTPError:
+            self._record(op, time.monotonic() - started, error=True, retries=retries)
+            raise
+        raise AssertionError("unreachable")  # pragma: no cover
+
+    async def get(self, path: str, *, op: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", path, op=op, **kwargs)
+
+    async def post(self, path: str, *, op: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", path, op=op, **kwargs)
+
+    async def patch(self, path: str, *, op: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("PATCH", path, op=op, **kwargs)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+_CLIENTS: Dict[Tuple[str, str], TimelineClient] = {}
+_CLIENTS_LOCK = threading.Lock()
+_ASYNC_CLIENTS: "weakref.WeakSet[AsyncTimelineClient]" = weakref.WeakSet()
+
+
+def get_timeline_client() -> TimelineClient:
+    """The process-wide client for the configured timeline server.
+
+    Keyed on the URL and token read from the environment on every call, as
+    the direct `requests` calls did, so a changed setting (or a test's
+    monkeypatch) gets its own pool instead of silently reusing a stale one.
+    """
+    headers = timeline_headers()
+    key = (timeline_url(), headers.get("Authorization", ""))
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = TimelineClient(key[0], headers)
+            _CLIENTS[key] = client
+        return client
+
+
+def size_timeline_pools(callers: int) -> None:
+    """Size every timeline pool in this process, and those created later,
+    for `callers` concurrent callers. TIMELINE_HTTP_POOL_SIZE, when set,
+    wins."""
+    global POOL_SIZE
+    if _POOL_SIZE_SETTING:
+        return
+    with _CLIENTS_LOCK:
+        POOL_SIZE = max(1, callers)
+        for client in _CLIENTS.values():
+            client.resize(POOL_SIZE)
+
+
+def timeline_stats() -> Dict[str, Dict[str, float]]:
+    """Latency counters summed across every pool in this process."""
+    totals: Dict[str, Dict[str, float]] = {}
+    with _CLIENTS_LOCK:
+        clients: list = list(_CLIENTS.values()) + list(_ASYNC_CLIENTS)
+    for client in clients:
+        for op, entry in client.stats().items():
+            total = totals.setdefault(op, {key: 0 for key in entry})
+            for key, value in entry.items():
+                total[key] = max(total[key], value) if key == "max_seconds" else total[key] + value
+    return totals
@@ -3,16 +3,26 @@ import secrets
 from pathlib import Path
 from typing import Any, Dict, List, Literal, Optional, Union
 
-from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, ConfigDict, Field
 
-from a2a_store import add_message, get_agent, list_agents, list_messages, register_agent
+from a2a_store import (
+    CursorError,
+    add_message,
+    get_agent,
+    list_agents,
+    list_messages,
+    register_agent,
+    wait_for_messages,
+)
 from cards import Block, CardAction, DuplicateActionIdError, normalize_actions, resolve_action
 from storage_db import write_connection
 from timeline_store import (
+    BlockAppendError,
     add_item,
+    append_block_text,
     claim_action,
     delete_item,
     get_item,
@@ -23,6 +33,8 @@ from timeline_store import (
 app = FastAPI(title="xMCP Timeline Service")
 
 UI_DIR = Path(__file__).resolve().parent / "ui"
+# Largest inbox page one request may ask for.
+MESSAGE_PAGE_LIMIT = 500
 
 
 def _cors_origins() -> List[str]:
@@ -155,6 +167,12 @@ class TimelineItemUpdate(BaseModel):
     metadata: Optional[Dict[str, Any]] = None
 
 
+class BlockTextAppend(BaseModel):
+    text: str
+    # Length the caller expects the block to have before this text.
+    offset: int = Field(ge=0)
+
+
 class AgentCreate(BaseModel):
     id: Optional[str] = None
     name: str
@@ -288,6 +306,19 @@ def patch_item(item_id: str, updates: TimelineItemUpdate) -> Dict[str, Any]:
     return item
 
 
+@v1.post("/timeline/items/{item_id}/blocks/{index}/append")
+def append_to_block(item_id: str, index: int, payload: BlockTextAppend) -> Dict[str, Any]:
+    """Stream text into a card: only the new text crosses the wire, and the
+    response is a length, not the card."""
+    try:
+        result = append_block_text(item_id, index, payload.text, payload.offset)
+    except BlockAppendError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    if result is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return result
+
+
 @v1.delete("/timeline/items/{item_id}")
 def remove_item(item_id: str) -> Dict[str, Any]:
     deleted = delete_item(item_id)
@@ -317,9 +348,34 @@ def create_agent(payload: AgentCreate) -> Dict[str, Any]:
 
 
 @v1.get("/a2a/agents/{agent_id}/messages")
-def get_agent_messages(agent_id: str) -> Dict[str, Any]:
-    messages = list_messages(agent_id)
-    return {"messages": messages, "count": len(messages)}
+def get_agent_messages(
+    agent_id: str,
+    after: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MESSAGE_PAGE_LIMIT),
+    wait: float = Query(0, ge=0),
+) -> Dict[str, Any]:
+    """The agent's inbox, newest first. With `after` ("" for the start, then
+    each response's `next_cursor`) it is an incremental read instead: only
+    messages past the cursor, oldest first, each with the `cursor` just past
+    it. Cursors are opaque to readers; they only send them back.
+
+    `wait` makes an incremental read a long poll: with nothing past the
+    cursor, the response is held until a message arrives or `wait` seconds
+    (at most A2A_WAIT_MAX_SECONDS) pass. Each held request occupies a worker
+    thread, which is fine for the handful of dispatchers that use it."""
+    if wait and after is None:
+        raise HTTPException(status_code=400, detail="wait needs an after cursor")
+    try:
+        if wait:
+            messages = wait_for_messages(agent_id, after=after or "", limit=limit, timeout=wait)
+        else:
+            messages = list_messages(agent_id, after=after, limit=limit)
+    except CursorError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    payload: Dict[str, Any] = {"messages": messages, "count": len(messages)}
+    if after is not None:
+        payload["next_cursor"] = messages[-1]["cursor"] if messages else after
+    return payload
 
 
 @v1.post("/a2a/messages")
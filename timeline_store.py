@@ -114,6 +114,46 @@ def update_item(item_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any
         return normalize_card(serialize_record(current))
 
 
+class BlockAppendError(ValueError):
+    """An append that cannot apply: no such text block, or the block is not
+    at the length the caller expected and does not already end with it."""
+
+
+def append_block_text(item_id: str, index: int, text: str, offset: int) -> Optional[Dict[str, Any]]:
+    """Append `text` to text block `index`, which the caller expects to be
+    `offset` characters long -- the cheap path for a card whose content is
+    streamed in.
+
+    The offset makes the append idempotent: a retried request whose first
+    attempt landed finds the text already at `offset` and changes nothing.
+    Returns {"id", "block", "length"}, or None if the item does not exist.
+    """
+    with write_connection() as conn:
+        # Same read-merge-write lock as update_item.
+        row = conn.execute(
+            select(timeline_items).where(timeline_items.c.id == item_id).with_for_update()
+        ).fetchone()
+        if not row:
+            return None
+
+        blocks = list(row_to_dict(row).get("blocks") or [])
+        if not 0 <= index < len(blocks) or (blocks[index] or {}).get("type") != "text":
+            raise BlockAppendError(f"Card has no text block {index}")
+        current = blocks[index].get("text") or ""
+        if current[offset : offset + len(text)] == text and len(current) >= offset + len(text):
+            return {"id": item_id, "block": index, "length": len(current)}
+        if len(current) != offset:
+            raise BlockAppendError(f"Block {index} is {len(current)} characters long, not {offset}")
+
+        blocks[index] = {**blocks[index], "text": current + text}
+        conn.execute(
+            update(timeline_items)
+            .where(timeline_items.c.id == item_id)
+            .values(blocks=blocks, body=derive_body(blocks), updated_at=utc_now())
+        )
+        return {"id": item_id, "block": index, "length": len(current) + len(text)}
+
+
 def delete_item(item_id: str) -> bool:
     with write_connection() as conn:
         result = conn.execute(delete(timeline_items).where(timeline_items.c.id == item_id))
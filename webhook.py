@@ -0,0 +1,128 @@
+"""X Account Activity webhook ingestion for mentions.
+
+X pushes account events to a registered HTTPS endpoint instead of the
+listener polling the mentions endpoint, which removes both the polling
+latency and the per-poll quota cost. Two requests arrive here:
+
+- GET with `crc_token`: the Challenge-Response Check X runs on registration
+  and periodically after. The answer is an HMAC-SHA256 of the token keyed
+  with the app's consumer secret, proving we hold it.
+- POST with an event batch, signed the same way in the
+  `x-twitter-webhooks-signature` header. Unsigned or mis-signed deliveries
+  are rejected before the body is even parsed -- this route is necessarily
+  public, and anyone can POST to it.
+
+Each mention in `tweet_create_events` is persisted (see mention_store) and
+only then acknowledged, so a crash after the ack cannot lose it; X's
+redeliveries are deduplicated by tweet id. New mentions are handed to the
+listener's `WebhookSource` through an in-process inbox, and from there take
+the same `process_mention` path as polled ones.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import queue
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+
+from mention_store import record_mention
+
+WEBHOOK_PATH = "/webhooks/x"
+SIGNATURE_HEADER = "x-twitter-webhooks-signature"
+
+# v1.1 timestamp format used by Account Activity payloads.
+_V1_TIME_FORMAT = "%a %b %d %H:%M:%S %z %Y"
+
+# Mention payloads (v2 tweet dicts) waiting for the listener's WebhookSource.
+INBOX: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+
+router = APIRouter()
+
+
+def _consumer_secret() -> str:
+    return os.getenv("X_API_SECRET", "").strip()
+
+
+def sign(secret: str, message: bytes) -> str:
+    digest = hmac.new(secret.encode("utf-8"), message, hashlib.sha256).digest()
+    return "sha256=" + base64.b64encode(digest).decode("ascii")
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    if not secret or not signature:
+        return False
+    return hmac.compare_digest(sign(secret, body), signature)
+
+
+def to_mention(event: Dict[str, Any], for_user_id: str) -> Optional[Dict[str, Any]]:
+    """Convert a v1.1 `tweet_create_events` entry into a v2 tweet dict, or
+    None if it is not a mention of `for_user_id`.
+
+    The feed also carries the account's own posts and retweets, which must
+    not be answered. v1.1 has no conversation id; the mention is then its
+    own conversation, as for any mention the listener sees without one.
+    """
+    user = event.get("user") or {}
+    if str(user.get("id_str", "")) == for_user_id or event.get("retweeted_status"):
+        return None
+    mentioned = {
+        str(m.get("id_str", "")) for m in (event.get("entities") or {}).get("user_mentions") or []
+    }
+    if for_user_id not in mentioned:
+        return None
+    text = (event.get("extended_tweet") or {}).get("full_text") or event.get("text", "")
+    tweet_id = str(event["id_str"])
+    mention = {
+        "id": tweet_id,
+        "text": text,
+        "author_id": str(user.get("id_str", "")),
+        "edit_history_tweet_ids": [tweet_id],
+    }
+    try:
+        created_at = datetime.strptime(event["created_at"], _V1_TIME_FORMAT)
+        # The v2 shape, which tweepy.Tweet parses: always UTC, milliseconds.
+        mention["created_at"] = created_at.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    except (KeyError, TypeError, ValueError):
+        pass
+    return mention
+
+
+def ingest(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Persist every new mention in a delivery and queue it for the listener.
+
+    Returns the mentions that were new."""
+    for_user_id = str(payload.get("for_user_id", ""))
+    fresh = []
+    for event in payload.get("tweet_create_events") or []:
+        mention = to_mention(event, for_user_id)
+        if mention and record_mention(mention, source="webhook"):
+            INBOX.put(mention)
+            fresh.append(mention)
+    return fresh
+
+
+@router.get(WEBHOOK_PATH)
+def crc_check(crc_token: str) -> Dict[str, str]:
+    secret = _consumer_secret()
+    if not secret:
+        raise HTTPException(status_code=503, detail="Webhook is not configured (X_API_SECRET unset)")
+    return {"response_token": sign(secret, crc_token.encode("utf-8"))}
+
+
+@router.post(WEBHOOK_PATH)
+async def receive_events(request: Request) -> Dict[str, Any]:
+    body = await request.body()
+    if not verify_signature(_consumer_secret(), body, request.headers.get(SIGNATURE_HEADER)):
+        raise HTTPException(status_code=401, detail="Missing or invalid webhook signature")
+    try:
+        payload = await request.json()
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail="Body is not JSON") from exc
+    # The store is synchronous; keep it off the event loop.
+    fresh = await run_in_threadpool(ingest, payload)
+    return {"ok": True, "accepted": len(fresh)}
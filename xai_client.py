@@ -0,0 +1,138 @@
+"""Process-wide, warm xAI clients for Grok calls.
+
+Building an `xai_sdk.Client` opens a new gRPC channel, so constructing one
+per call paid a TLS handshake (and the MCP tool set's setup) on every
+mention. The listener's team members and the dispatcher instead share one
+client per (api key, model, MCP server URL), created on first use and kept
+for the life of the process. gRPC channels are thread-safe, so concurrent
+mention workers stream over the same channel.
+
+A channel that fails (UNAVAILABLE -- the server went away, a proxy dropped
+the connection) is closed and replaced, and the call is retried once on
+the fresh channel, but only if nothing has been streamed yet: a retry after
+partial output would hand the caller a duplicated prefix.
+
+xai_sdk is imported lazily so modules that only *may* call Grok (and the
+tests that exercise them without it) don't need the SDK installed.
+"""
+
+import os
+import threading
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+ClientKey = Tuple[str, str, str]
+
+DEFAULT_MODEL = "grok-4-1-fast"
+DEFAULT_MCP_SERVER_URL = "http://127.0.0.1:8000/mcp"
+
+
+def _is_channel_failure(exc: BaseException) -> bool:
+    try:
+        import grpc
+    except ImportError:  # pragma: no cover - grpc ships with xai_sdk
+        return False
+    return isinstance(exc, grpc.RpcError) and exc.code() == grpc.StatusCode.UNAVAILABLE
+
+
+class GrokClient:
+    """One warm channel to xAI, bound to a model and an MCP server."""
+
+    def __init__(self, api_key: str, model: str, server_url: str, timeout: Optional[float] = None):
+        self.api_key = api_key
+        self.model = model
+        self.server_url = server_url
+        self.timeout = timeout
+        self._client: Any = None
+        self._tools: Any = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> Any:
+        with self._lock:
+            if self._client is None:
+                from xai_sdk import Client
+                from xai_sdk.tools import mcp
+
+                self._client = Client(api_key=self.api_key, timeout=self.timeout)
+                self._tools = [mcp(server_url=self.server_url)]
+            return self._client
+
+    def _reset(self, broken: Any) -> None:
+        with self._lock:
+            # Another worker may already have replaced it.
+            if self._client is not broken:
+                return
+            self._client = None
+        try:
+            broken.close()
+        except Exception:
+            pass
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """Yield the response's content chunks as they arrive."""
+        from xai_sdk.chat import user
+
+        for attempt in range(2):
+            client = self._connect()
+            streamed = False
+            try:
+                chat = client.chat.create(model=self.model, tools=self._tools)
+                chat.append(user(prompt))
+                for _, chunk in chat.stream():
+                    if chunk.content:
+                        streamed = True
+                        yield chunk.content
+                return
+            except Exception as exc:
+                if not _is_channel_failure(exc):
+                    raise
+                self._reset(client)
+                if streamed or attempt == 1:
+                    raise
+
+    def chat(self, prompt: str) -> str:
+        return "".join(self.stream(prompt)).strip()
+
+    def close(self) -> None:
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+
+_CLIENTS: Dict[ClientKey, GrokClient] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def get_grok_client(
+    api_key: Optional[str] = None,
+    model: Optional[str] = None,
+    server_url: Optional[str] = None,
+) -> Optional[GrokClient]:
+    """The shared client for this configuration, or None without an API key.
+
+    Unspecified settings are read from the environment (XAI_API_KEY,
+    XAI_MODEL, MCP_SERVER_URL). XAI_TIMEOUT_SECONDS is a hard per-call
+    deadline so one stalled call can't pin a mention worker.
+    """
+    api_key = (api_key if api_key is not None else os.getenv("XAI_API_KEY", "")).strip()
+    if not api_key:
+        return None
+    model = model or os.getenv("XAI_MODEL", DEFAULT_MODEL)
+    server_url = server_url or os.getenv("MCP_SERVER_URL", DEFAULT_MCP_SERVER_URL)
+    key = (api_key, model, server_url)
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            timeout = float(os.getenv("XAI_TIMEOUT_SECONDS", "120"))
+            client = GrokClient(api_key, model, server_url, timeout=timeout)
+            _CLIENTS[key] = client
+        return client
+
+
+def close_all() -> None:
+    """Close every cached channel (for shutdown and tests)."""
+    with _CLIENTS_LOCK:
+        clients = list(_CLIENTS.values())
+        _CLIENTS.clear()
+    for client in clients:
+        client.close()